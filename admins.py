@@ -0,0 +1,86 @@
+# admins.py
+"""Admin roles with an in-memory cache.
+
+Admins live in the ``admins`` table; ADMIN_USER_ID (and any ADMIN_USER_IDS)
+from the environment are always owners, so a fresh database still has
+someone who can add the rest. Handlers check ``admins.is_admin(user_id)``
+against a cached set instead of querying on every update. The set is
+reloaded on changes made here and periodically to pick up changes made by
+other processes.
+"""
+import logging
+
+from config import ADMIN_USER_ID, ADMIN_USER_IDS
+
+OWNER, ADMIN = "owner", "admin"
+
+SELECT_ADMINS = "SELECT user_id, role FROM admins"
+UPSERT_ADMIN = '''INSERT INTO admins (user_id, role, added_by) VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET role = excluded.role'''
+DELETE_ADMIN = "DELETE FROM admins WHERE user_id = ? AND role != 'owner'"
+
+log = logging.getLogger(__name__)
+
+
+def _env_owners():
+    ids = [ADMIN_USER_ID] + (ADMIN_USER_IDS or "").split(",")
+    return {int(value) for value in ids if value and value.strip().lstrip("-").isdigit()}
+
+
+def _load(conn):
+    return dict(conn.execute(SELECT_ADMINS).fetchall())
+
+
+def _seed(conn, owners):
+    conn.executemany(UPSERT_ADMIN, [(user_id, OWNER, None) for user_id in owners])
+
+
+def _add(conn, user_id, role, added_by):
+    conn.execute(UPSERT_ADMIN, (user_id, role, added_by))
+
+
+def _remove(conn, user_id):
+    return conn.execute(DELETE_ADMIN, (user_id,)).rowcount > 0
+
+
+class AdminDirectory:
+    def __init__(self, repository):
+        self.repository = repository
+        self._owners = _env_owners()
+        self._roles = {user_id: OWNER for user_id in self._owners}
+
+    async def start(self):
+        """Make sure the environment's owners are in the table, then load everyone"""
+        if self._owners:
+            await self.repository.run_write(_seed, sorted(self._owners))
+        await self.refresh()
+
+    async def refresh(self):
+        roles = await self.repository.run_read(_load)
+        roles.update({user_id: OWNER for user_id in self._owners})
+        self._roles = roles
+
+    def is_admin(self, user_id) -> bool:
+        return user_id is not None and int(user_id) in self._roles
+
+    def is_owner(self, user_id) -> bool:
+        return user_id is not None and self._roles.get(int(user_id)) == OWNER
+
+    def ids(self):
+        return sorted(self._roles)
+
+    def roles(self):
+        return dict(self._roles)
+
+    async def add(self, user_id, added_by, role=ADMIN):
+        await self.repository.run_write(_add, int(user_id), role, added_by)
+        log.info("Admin added", extra={"admin_id": user_id, "role": role})
+        await self.refresh()
+
+    async def remove(self, user_id) -> bool:
+        """Remove a non-owner admin; returns False for owners and unknown users"""
+        removed = await self.repository.run_write(_remove, int(user_id))
+        if removed:
+            log.info("Admin removed", extra={"admin_id": user_id})
+            await self.refresh()
+        return removed
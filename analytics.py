@@ -0,0 +1,159 @@
+# analytics.py
+"""Incrementally maintained order statistics behind the admin /stats command.
+
+Rather than scanning ``orders`` on every /stats, the write helpers in
+database.py bump small summary tables in the same transaction as the change
+they describe:
+
+* ``stats_daily_package`` - orders, approvals, completions and paid revenue
+  per package, keyed by the UTC day the order was placed
+* ``stats_funnel`` - checkout steps reached per day, from picking a package
+  to pressing "Payment Done"
+* ``stats_latency`` - bucketed histograms of time to approval and to
+  completion, from which percentiles are read
+
+Reading a report touches a bounded number of rows whatever the order count.
+"""
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+from catalog import LAMPORTS_PER_SOL
+from lifecycle import APPROVED
+from models import parse_timestamp
+
+FUNNEL_STEPS = ("package_chosen", "details_received", "details_confirmed", "payment_done")
+REPORT_DAYS = 7
+# Upper bounds (seconds) of the latency buckets; the last one catches the rest
+LATENCY_BUCKETS = (60, 300, 900, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+                   24 * 3600, 48 * 3600, 72 * 3600, 7 * 86400, 2 ** 31)
+
+BUMP_DAILY = '''INSERT INTO stats_daily_package (day, package, orders, approved, completed, revenue_lamports)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day, package) DO UPDATE SET
+                    orders = orders + excluded.orders,
+                    approved = approved + excluded.approved,
+                    completed = completed + excluded.completed,
+                    revenue_lamports = revenue_lamports + excluded.revenue_lamports'''
+BUMP_FUNNEL = '''INSERT INTO stats_funnel (day, step, count) VALUES (date('now'), ?, 1)
+                ON CONFLICT (day, step) DO UPDATE SET count = count + 1'''
+BUMP_LATENCY = '''INSERT INTO stats_latency (metric, le, count) VALUES (?, ?, 1)
+                ON CONFLICT (metric, le) DO UPDATE SET count = count + 1'''
+SELECT_DAILY = '''SELECT day, package, orders, approved, completed, revenue_lamports FROM stats_daily_package
+                WHERE day >= date('now', ?) ORDER BY day DESC, package'''
+SELECT_FUNNEL = '''SELECT step, SUM(count) FROM stats_funnel WHERE day >= date('now', ?) GROUP BY step'''
+SELECT_LATENCY = "SELECT metric, le, count FROM stats_latency ORDER BY metric, le"
+
+
+def day_of(timestamp):
+    """UTC day key (``YYYY-MM-DD``) the daily table is bucketed by"""
+    return parse_timestamp(timestamp).date().isoformat()
+
+
+def latency_bucket(started, finished=None):
+    """Upper bound of the LATENCY_BUCKETS bucket the time from ``started`` to ``finished`` (default now) falls in"""
+    finished = parse_timestamp(finished) or datetime.now(timezone.utc)
+    seconds = (finished - parse_timestamp(started)).total_seconds()
+    return LATENCY_BUCKETS[min(bisect_left(LATENCY_BUCKETS, max(seconds, 0)), len(LATENCY_BUCKETS) - 1)]
+
+
+def record_created(conn, created_at, package):
+    conn.execute(BUMP_DAILY, (day_of(created_at), package, 1, 0, 0, 0))
+
+
+def record_approved(conn, created_at, package, sol_amount, approved_at=None):
+    """Count an approval (and its revenue) against the day the order was placed"""
+    lamports = round((sol_amount or 0) * LAMPORTS_PER_SOL)
+    conn.execute(BUMP_DAILY, (day_of(created_at), package, 0, 1, 0, lamports))
+    _record_latency(conn, "approval", created_at, approved_at)
+
+
+def record_completed(conn, created_at, package, approved_at, completed_at=None):
+    conn.execute(BUMP_DAILY, (day_of(created_at), package, 0, 0, 1, 0))
+    if approved_at:
+        _record_latency(conn, "completion", approved_at, completed_at)
+
+
+def record_cancelled(conn, order, from_status):
+    """Take back the approval (and its revenue) of an approved order that was cancelled"""
+    if from_status == APPROVED:
+        lamports = round((order.sol_amount or 0) * LAMPORTS_PER_SOL)
+        conn.execute(BUMP_DAILY, (day_of(order.created_at), order.package, 0, -1, 0, -lamports))
+
+
+def record_funnel(conn, step):
+    conn.execute(BUMP_FUNNEL, (step,))
+
+
+def _record_latency(conn, metric, started, finished=None):
+    conn.execute(BUMP_LATENCY, (metric, latency_bucket(started, finished)))
+
+
+def percentile(buckets, pct):
+    """Upper bound of the bucket holding the ``pct`` percentile of ``[(le, count), ...]``"""
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    rank = total * pct / 100
+    seen = 0
+    for le, count in buckets:
+        seen += count
+        if seen >= rank:
+            return le
+    return buckets[-1][0]
+
+
+def read_report(conn, days=REPORT_DAYS):
+    since = f"-{days - 1} days"
+    return build_report(days, conn.execute(SELECT_DAILY, (since,)).fetchall(),
+                        conn.execute(SELECT_FUNNEL, (since,)).fetchall(), conn.execute(SELECT_LATENCY))
+
+
+def build_report(days, daily, funnel, latency_rows):
+    """The report dict format_report renders, from the rows of the three summary queries"""
+    latency = {}
+    for metric, le, count in latency_rows:
+        latency.setdefault(metric, []).append((le, count))
+    return {
+        "days": days,
+        "daily": [tuple(row) for row in daily],
+        "funnel": {step: count for step, count in funnel},
+        "latency": {metric: {pct: percentile(buckets, pct) for pct in (50, 90, 99)}
+                    for metric, buckets in latency.items()},
+    }
+
+
+def _duration(seconds):
+    if seconds is None:
+        return "–"
+    if seconds >= LATENCY_BUCKETS[-1]:
+        return "∞"
+    if seconds >= 86400:
+        return f"{seconds / 86400:g}d"
+    if seconds >= 3600:
+        return f"{seconds / 3600:g}h"
+    return f"{seconds / 60:g}m"
+
+
+def format_report(report):
+    lines = [f"📊 *Stats* (last {report['days']} days, UTC)", ""]
+
+    lines.append("📦 *Orders per package*")
+    if not report["daily"]:
+        lines.append("No orders yet.")
+    for day, package, orders, approved, completed, lamports in report["daily"]:
+        lines.append(f"`{day}` {package}: {orders} orders, {approved} paid, {completed} done, "
+                     f"{lamports / LAMPORTS_PER_SOL:g} SOL")
+
+    funnel = report["funnel"]
+    chosen, paid = funnel.get("package_chosen", 0), funnel.get("payment_done", 0)
+    lines += ["", "🔁 *Checkout funnel*",
+              " → ".join(f"{step.replace('_', ' ')} {funnel.get(step, 0)}" for step in FUNNEL_STEPS)]
+    if chosen:
+        lines.append(f"Conversion: {paid / chosen:.0%}")
+
+    lines += ["", "⏱ *Latency* (bucket upper bounds)"]
+    for metric in ("approval", "completion"):
+        pcts = report["latency"].get(metric, {})
+        lines.append(f"{metric.capitalize()}: p50 ≤ {_duration(pcts.get(50))}, "
+                     f"p90 ≤ {_duration(pcts.get(90))}, p99 ≤ {_duration(pcts.get(99))}")
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+"""Compare durable order inserts/sec: per-call sqlite commits vs group commit.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_group_commit --orders 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from database import OrderRepository, init_db
+
+
+def per_call_inserts(path, n):
+    """Today's path: open, insert, commit (fsync) and close for every order"""
+    for i in range(n):
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA synchronous=FULL")
+        c = conn.cursor()
+        c.execute('''INSERT INTO orders
+                    (user_id, package, coin_details, sol_amount, status)
+                    VALUES (?, ?, ?, ?, ?)''',
+                  (i, "🥈 BASIC LAUNCH", "Coin Name: BENCH", 0.1, "pending"))
+        conn.commit()
+        conn.close()
+    return n
+
+
+async def group_commit_inserts(path, n, concurrency):
+    """Repository path: concurrent callers share commits through the writer"""
+    repo = OrderRepository(path)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await repo.save_order(i, "🥈 BASIC LAUNCH", "Coin Name: BENCH", 0.1)
+
+    try:
+        await asyncio.gather(*(one(i) for i in range(n)))
+        return repo._writer.commits
+    finally:
+        repo.close()
+
+
+def fresh_db(directory, name, journal_mode="WAL"):
+    path = os.path.join(directory, name)
+    init_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The legacy database never enabled WAL, so measure it in rollback-journal mode
+        path = fresh_db(directory, "per_call.db", journal_mode="DELETE")
+        start = time.perf_counter()
+        per_call_inserts(path, args.orders)
+        elapsed = time.perf_counter() - start
+        print(f"per-call:     {args.orders} orders, {args.orders} commits "
+              f"in {elapsed:.2f}s -> {args.orders / elapsed:,.0f} orders/s, "
+              f"{args.orders / elapsed:,.0f} commits/s")
+
+        path = fresh_db(directory, "group_commit.db")
+        start = time.perf_counter()
+        commits = asyncio.run(group_commit_inserts(path, args.orders, args.concurrency))
+        elapsed = time.perf_counter() - start
+        print(f"group commit: {args.orders} orders, {commits} commits "
+              f"in {elapsed:.2f}s -> {args.orders / elapsed:,.0f} orders/s, "
+              f"{commits / elapsed:,.0f} commits/s "
+              f"({args.orders / commits:.1f} orders per commit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""In-process stand-in for the Telegram Bot API, for benchmarks.
+
+Plug it into the real Application via
+``Application.builder().request(api).get_updates_request(api)``. Every call
+the bot makes is answered locally (after an optional simulated round-trip)
+and timestamped, and callers can wait for the first call addressed to a
+given chat or callback query to measure end-to-end handler latency.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict
+
+from telegram.request import BaseRequest
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "MoonBuilder", "username": "moonbuilder_bot",
+            "can_join_groups": False, "can_read_all_group_messages": False,
+            "supports_inline_queries": False}
+
+
+class FakeBotApi(BaseRequest):
+    def __init__(self, api_latency=0.0):
+        self.api_latency = api_latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1000)
+        self._waiters = defaultdict(list)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def expect(self, key):
+        """Future resolved with the time of the next call for ``key``.
+
+        Keys are ``("chat", chat_id)`` for messages sent to a chat and
+        ``("callback", query_id)`` for answered callback queries.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[key].append(future)
+        return future
+
+    def _notify(self, key, now):
+        for future in self._waiters.pop(key, []):
+            if not future.done():
+                future.set_result(now)
+
+    def _message(self, params, **extra):
+        chat_id = params.get("chat_id") or 0
+        return {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"}, "from": BOT_USER,
+                "text": params.get("text", ""), **extra}
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            return self._message(params)
+        if method == "sendPhoto":
+            file_id = f"photo-{next(self._message_ids)}"
+            return self._message(params, photo=[{"file_id": file_id, "file_unique_id": file_id,
+                                                 "width": 290, "height": 290}])
+        if method == "sendDocument":
+            return self._message(params, document={"file_id": "doc", "file_unique_id": "doc"})
+        if method == "getUpdates":
+            return []
+        return True
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        now = time.perf_counter()
+
+        if params.get("chat_id") is not None:
+            self._notify(("chat", int(params["chat_id"])), now)
+        if "callback_query_id" in params:
+            self._notify(("callback", str(params["callback_query_id"])), now)
+
+        self.calls[api_method] += 1
+        result = self._result(api_method, params)
+        return 200, json.dumps({"ok": True, "result": result}).encode()
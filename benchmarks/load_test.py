@@ -0,0 +1,235 @@
+"""Load-test the whole bot with synthetic customers and admins.
+
+Builds the real Application from main.py against the in-process FakeBotApi
+and a throwaway database, then feeds updates straight into its update
+processor (no webhook HTTP in between, so thousands of users fit on one
+machine):
+
+* ``--users`` customers walk /start -> package -> details -> confirm ->
+  payment_done (the recorded checkout in updates/), arriving over ``--ramp``
+  seconds;
+* ``--admins`` admins work the pending queue in parallel while that runs:
+  open the order (claiming it), approve it, then /complete it with a link.
+
+Reports updates/s, end-to-end latency per step (queueing included), handler
+latency from the bot's own HANDLER_SECONDS histogram, and database
+contention: group-commit batch sizes, writer queue depth, commit and write
+latency. ``--max-p99-ms`` makes it a regression check that exits 1 when the
+end-to-end p99 is over budget.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --users 2000 --admins 4
+
+With ``DATABASE_URL=postgresql://...`` set it runs against that Postgres
+database instead (which should be empty: the completed-order count covers
+the whole table).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.replay_updates import load_updates, percentile, personalize
+
+FIRST_ADMIN_ID = 4242
+FIRST_USER_ID = 20_000_000
+
+
+def callback_update(user_id, update_id, data):
+    return {"update_id": update_id, "callback_query": {
+        "id": f"{user_id}-{update_id}", "chat_instance": "load", "data": data,
+        "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+        "message": {"message_id": 1, "date": int(time.time()), "text": "📋 Pending Orders",
+                    "chat": {"id": user_id, "type": "private"}}}}
+
+
+def message_update(user_id, update_id, text):
+    message = {"message_id": update_id, "date": int(time.time()), "text": text,
+               "chat": {"id": user_id, "type": "private"},
+               "from": {"id": user_id, "is_bot": False, "first_name": "Admin"}}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+def histogram_percentile(histogram, labels, pct):
+    """Upper bound of the bucket holding the ``pct`` percentile, in seconds"""
+    series = histogram._series.get(labels)
+    if not series or not series[2]:
+        return 0.0
+    target, seen = series[2] * pct / 100, 0
+    for bound, count in zip(histogram.buckets + (float("inf"),), series[0]):
+        seen += count
+        if seen >= target:
+            return bound
+    return float("inf")
+
+
+def milliseconds(seconds):
+    return "   >max" if seconds == float("inf") else f"{seconds * 1000:7.1f}"
+
+
+async def run(args):
+    # Imported late: config reads the environment prepared in main()
+    from telegram import Update
+
+    import main as bot
+    from benchmarks.fake_bot_api import FakeBotApi
+
+    bot.init_db()
+    api = FakeBotApi(api_latency=args.api_latency)
+    application = bot.build_application(api)
+    await application.initialize()
+    await application.start()
+    await bot.post_init(application)
+
+    recording = load_updates(args.updates)
+    update_ids = iter(range(1, 10**9))
+    latencies = defaultdict(list)   # step label -> end-to-end seconds
+    queue_depths = []
+    order_ids = asyncio.Queue()
+    customers_done = asyncio.Event()
+
+    async def feed(update_data, label):
+        update = Update.de_json(update_data, application.bot)
+        started = time.perf_counter()
+        await application.update_processor.process_update(update, application.process_update(update))
+        latencies[label].append(time.perf_counter() - started)
+
+    async def customer(user_id, delay):
+        await asyncio.sleep(delay)
+        for recorded in recording:
+            update, _ = personalize(recorded, user_id, next(update_ids))
+            label = update["message"]["text"].split("\n")[0][:20] if "message" in update else update["callback_query"]["data"]
+            await feed(update, label)
+
+    async def dispatcher():
+        """Hands every new pending order to exactly one admin, like a shared queue view"""
+        seen = set()
+        while True:
+            finished = customers_done.is_set()
+            for order in await bot.orders.get_all_pending_orders():
+                if order.id not in seen:
+                    seen.add(order.id)
+                    order_ids.put_nowait(order.id)
+            if finished:
+                break
+            await asyncio.sleep(args.poll_interval)
+        for _ in range(args.admins):
+            order_ids.put_nowait(None)
+
+    async def admin(admin_id):
+        handled = 0
+        while (order_id := await order_ids.get()) is not None:
+            await feed(callback_update(admin_id, next(update_ids), f"view_order_{order_id}"), "view_order")
+            await feed(callback_update(admin_id, next(update_ids), f"approve_{order_id}"), "approve")
+            await feed(message_update(admin_id, next(update_ids), "/complete"), "/complete")
+            await feed(message_update(admin_id, next(update_ids), str(order_id)), "order id")
+            await feed(message_update(admin_id, next(update_ids), f"https://moon.example/{order_id}"), "website link")
+            handled += 1
+        return handled
+
+    async def sample_writer_queue():
+        while True:
+            queue_depths.append(bot.orders.stats().get("write_queue", 0))
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample_writer_queue())
+    admins = [asyncio.create_task(admin(FIRST_ADMIN_ID + i)) for i in range(args.admins)]
+    dispatch = asyncio.create_task(dispatcher())
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(customer(FIRST_USER_ID + i, args.ramp * i / args.users) for i in range(args.users)))
+        customers_done.set()
+        await dispatch
+        handled = await asyncio.gather(*admins)
+        elapsed = time.perf_counter() - started
+    finally:
+        sampler.cancel()
+        await application.stop()
+        await bot.post_stop(application)
+        completed = sum([1 async for _ in bot.orders.iter_orders(status="completed")])
+        await application.shutdown()
+        await bot.post_shutdown(application)
+
+    report(args, bot, api, application, latencies, queue_depths, handled, completed, elapsed)
+    everything = [value for values in latencies.values() for value in values]
+    if args.max_p99_ms and percentile(everything, 99) * 1000 > args.max_p99_ms:
+        sys.exit(f"p99 {percentile(everything, 99) * 1000:.1f} ms is over the {args.max_p99_ms:g} ms budget")
+
+
+def report(args, bot, api, application, latencies, queue_depths, handled, completed, elapsed):
+    from metrics import DB_BATCH_SIZE, DB_COMMIT_SECONDS, DB_SECONDS, HANDLER_SECONDS
+
+    everything = [value for values in latencies.values() for value in values]
+    print(f"{len(everything)} updates from {args.users} users and {args.admins} admins in {elapsed:.2f}s "
+          f"-> {len(everything) / elapsed:,.0f} updates/s (concurrent_updates={bot.CONCURRENT_UPDATES})")
+    print(f"orders completed {completed}/{args.users} (per admin: {handled})")
+    print(f"end-to-end p50 {percentile(everything, 50) * 1000:.1f} ms, "
+          f"p99 {percentile(everything, 99) * 1000:.1f} ms, max {max(everything) * 1000:.1f} ms")
+    for label, values in latencies.items():
+        print(f"  {label!r:24} n={len(values):<6} p50 {percentile(values, 50) * 1000:7.1f} ms  "
+              f"p99 {percentile(values, 99) * 1000:7.1f} ms")
+
+    print("Handlers (bucket upper bounds):")
+    for (name,), series in sorted(HANDLER_SECONDS._series.items(), key=lambda item: -item[1][1]):
+        print(f"  {name:24} n={series[2]:<6} mean {series[1] / series[2] * 1000:7.1f} ms  "
+              f"p50 ≤{milliseconds(histogram_percentile(HANDLER_SECONDS, (name,), 50))} ms  "
+              f"p99 ≤{milliseconds(histogram_percentile(HANDLER_SECONDS, (name,), 99))} ms")
+
+    stats = bot.orders.stats()
+    batches = DB_BATCH_SIZE._series.get(())
+    commits = DB_COMMIT_SECONDS._series.get(())
+    print("Database:")
+    if "writes" in stats:
+        print(f"  {stats['writes']} writes in {stats['commits']} commits"
+              + (f", mean batch {batches[1] / batches[2]:.1f}" if batches else ""))
+    if "pool_size" in stats:
+        print(f"  connection pool {stats['pool_size']} ({stats['pool_idle']} idle)")
+    if commits:
+        print(f"  commit mean {commits[1] / commits[2] * 1000:.1f} ms, "
+              f"p99 ≤{milliseconds(histogram_percentile(DB_COMMIT_SECONDS, (), 99))} ms")
+    if queue_depths:
+        print(f"  writer queue depth mean {sum(queue_depths) / len(queue_depths):.1f}, max {max(queue_depths)}")
+    slowest = sorted(((labels, s) for labels, s in DB_SECONDS._series.items() if s[2]),
+                     key=lambda item: -item[1][1] / item[1][2])[:5]
+    for (statement, kind), series in slowest:
+        print(f"  {kind:5} {statement:24} n={series[2]:<6} mean {series[1] / series[2] * 1000:6.2f} ms")
+    print(f"  order cache hits {stats['cache_hits']}, misses {stats['cache_misses']}")
+    print(f"Update processor: {application.update_processor.stats()}")
+    print(f"Notifier: {bot.notifier.stats()}")
+    print(f"Bot API calls: {dict(api.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", default=os.path.join(os.path.dirname(__file__), "updates", "checkout.jsonl"))
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which customers arrive")
+    parser.add_argument("--concurrent-updates", type=int, default=32)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="simulated Bot API round-trip (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="how often admins refresh the queue (s)")
+    parser.add_argument("--max-p99-ms", type=float, help="exit 1 if the end-to-end p99 exceeds this")
+    args = parser.parse_args()
+
+    admin_ids = [str(FIRST_ADMIN_ID + i) for i in range(args.admins)]
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "DATABASE_NAME": os.path.join(directory, "orders.db"),
+            "BOT_TOKEN": "123456:load",
+            "ADMIN_USER_ID": admin_ids[0] if admin_ids else "",
+            "ADMIN_USER_IDS": ",".join(admin_ids[1:]),
+            "SOLANA_WALLET_ADDRESS": "MoonWa11et1111111111111111111111111111111111",
+            "CONCURRENT_UPDATES": str(args.concurrent_updates),
+        })
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
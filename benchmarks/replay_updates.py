@@ -0,0 +1,149 @@
+"""Replay recorded Update JSON against the bot's webhook and measure latency.
+
+Starts the real Application from main.py in webhook mode on localhost, with
+a fake Bot API behind it and a throwaway database, then replays a recorded
+conversation for many simulated users at once. Each user walks the
+recording in order; latency is measured from POSTing an update to the first
+Bot API call its handler makes for that user (reply, answer, edit).
+
+Run from the repository root:
+
+    python -m benchmarks.replay_updates --sessions 200 --concurrent-updates 32
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+SECRET = "replay-secret"
+ADMIN_ID = 4242
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def personalize(update, user_id, update_id):
+    """Rewrite a recorded update so it appears to come from ``user_id``"""
+    update = copy.deepcopy(update)
+    update["update_id"] = update_id
+    if "message" in update:
+        update["message"]["from"]["id"] = user_id
+        update["message"]["chat"]["id"] = user_id
+        return update, ("chat", user_id)
+    query = update["callback_query"]
+    query["id"] = f"{user_id}-{update_id}"
+    query["from"]["id"] = user_id
+    query["message"]["chat"]["id"] = user_id
+    return update, ("callback", query["id"])
+
+
+async def replay(args):
+    # Imported late: config reads the environment prepared in main()
+    import httpx
+
+    import main as bot
+    from benchmarks.fake_bot_api import FakeBotApi
+
+    bot.init_db()
+    api = FakeBotApi(api_latency=args.api_latency)
+    application = bot.build_application(api)
+    url = f"http://127.0.0.1:{args.port}/telegram"
+
+    await application.initialize()
+    await application.updater.start_webhook(
+        listen="127.0.0.1", port=args.port, url_path="telegram",
+        secret_token=SECRET, webhook_url=url)
+    await application.start()
+    await bot.post_init(application)
+
+    recording = load_updates(args.updates)
+    latencies = {}
+    update_ids = iter(range(1, 10**9))
+
+    async def session(client, user_id):
+        for step, recorded in enumerate(recording):
+            update, key = personalize(recorded, user_id, next(update_ids))
+            answered = api.expect(key)
+            started = time.perf_counter()
+            response = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+            response.raise_for_status()
+            finished = await asyncio.wait_for(answered, args.timeout)
+            latencies.setdefault(step, []).append(finished - started)
+
+    try:
+        async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.sessions)) as client:
+            rejected = await client.post(url, json=recording[0])
+            print(f"request without secret token -> HTTP {rejected.status_code}")
+
+            started = time.perf_counter()
+            await asyncio.gather(*(session(client, 10_000_000 + i) for i in range(args.sessions)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await bot.post_stop(application)
+        await application.shutdown()
+        await bot.post_shutdown(application)
+
+    everything = [value for values in latencies.values() for value in values]
+    print(f"{len(everything)} updates from {args.sessions} users in {elapsed:.2f}s "
+          f"-> {len(everything) / elapsed:,.0f} updates/s "
+          f"(concurrent_updates={bot.CONCURRENT_UPDATES})")
+    print(f"latency p50 {percentile(everything, 50) * 1000:.1f} ms, "
+          f"p90 {percentile(everything, 90) * 1000:.1f} ms, "
+          f"p99 {percentile(everything, 99) * 1000:.1f} ms")
+    for step, values in sorted(latencies.items()):
+        update = recording[step]
+        label = update["message"]["text"].split("\n")[0][:20] if "message" in update else update["callback_query"]["data"]
+        print(f"  step {step + 1} {label!r:24} p50 {percentile(values, 50) * 1000:7.1f} ms  "
+              f"p99 {percentile(values, 99) * 1000:7.1f} ms")
+    print(f"Update processor: {application.update_processor.stats()}")
+    print(f"Bot API calls: {dict(api.calls)}")
+    print("Slowest handlers (mean):")
+    for name, mean in slowest_handlers(bot):
+        print(f"  {name:24} {mean * 1000:7.2f} ms")
+
+
+def slowest_handlers(bot, top=5):
+    from metrics import HANDLER_SECONDS
+    means = [(labels[0], s[1] / s[2]) for labels, s in HANDLER_SECONDS._series.items() if s[2]]
+    return sorted(means, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", default=os.path.join(os.path.dirname(__file__), "updates", "checkout.jsonl"))
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--concurrent-updates", type=int, default=32)
+    parser.add_argument("--api-latency", type=float, default=0.02, help="simulated Bot API round-trip (s)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "DATABASE_NAME": os.path.join(directory, "orders.db"),
+            "BOT_TOKEN": "123456:replay",
+            "ADMIN_USER_ID": str(ADMIN_ID),
+            "SOLANA_WALLET_ADDRESS": "MoonWa11et1111111111111111111111111111111111",
+            "CONCURRENT_UPDATES": str(args.concurrent_updates),
+        })
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# cache.py
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = 1024
+CACHE_TTL = 60  # seconds; a safety net, writes invalidate entries explicitly
+
+
+class TTLCache:
+    """Small LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Only used from the event loop, so there is no locking. Readers take
+    ``version`` before a lookup that goes to the database and pass it to
+    ``put``: if anything was invalidated in between, the possibly stale row
+    is not cached.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires at, value)
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value, version=None):
+        if version is not None and version != self.version:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
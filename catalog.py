@@ -0,0 +1,70 @@
+# catalog.py
+"""Package catalog built once at import from config.PACKAGES.
+
+Handlers look packages up by key or callback_data in O(1) instead of scanning
+the config list, prices are parsed once into exact lamport integers, and the
+keyboards that never change are built here and shared by every request
+(PTB's InlineKeyboardMarkup is immutable once created).
+"""
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import PACKAGES
+
+LAMPORTS_PER_SOL = 1_000_000_000
+
+
+def parse_lamports(price: str) -> int:
+    """'0.1 SOL' -> 100000000, without going through a float"""
+    lamports = Decimal(price.upper().replace("SOL", "").strip()) * LAMPORTS_PER_SOL
+    if lamports != lamports.to_integral_value():
+        raise ValueError(f"Price {price!r} is finer than one lamport")
+    return int(lamports)
+
+
+@dataclass(frozen=True)
+class Package:
+    __slots__ = ("key", "title", "price", "features", "callback_data", "lamports")
+    key: str
+    title: str
+    price: str
+    features: tuple
+    callback_data: str
+    lamports: int
+
+    @property
+    def sol(self) -> str:
+        """Exact SOL amount as text, e.g. '0.1' or '2'"""
+        return format((Decimal(self.lamports) / LAMPORTS_PER_SOL).normalize(), "f")
+
+    @property
+    def sol_amount(self) -> float:
+        return self.lamports / LAMPORTS_PER_SOL
+
+
+CATALOG = tuple(
+    Package(
+        key=pkg["key"],
+        title=pkg["title"],
+        price=pkg["price"],
+        features=tuple(pkg["features"]),
+        callback_data=pkg["callback_data"],
+        lamports=parse_lamports(pkg["price"]),
+    )
+    for pkg in PACKAGES
+)
+PACKAGES_BY_KEY = {pkg.key: pkg for pkg in CATALOG}
+PACKAGES_BY_CALLBACK = {pkg.callback_data: pkg for pkg in CATALOG}
+PACKAGE_CALLBACK_PATTERN = "^(" + "|".join(map(re.escape, PACKAGES_BY_CALLBACK)) + ")$"
+
+PACKAGE_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton(f"{pkg.title} - {pkg.price}", callback_data=pkg.callback_data)]
+    for pkg in CATALOG
+])
+ADMIN_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("See Pending Orders", callback_data="see_pending_orders")],
+    [InlineKeyboardButton("▶️ Take Next Order", callback_data="take_next_order")],
+])
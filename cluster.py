@@ -0,0 +1,265 @@
+# cluster.py
+"""Run the bot as several worker processes behind one webhook.
+
+    Telegram ──> router (BOT_MODE=cluster) ──> workers 0..WORKERS-1 (BOT_MODE=worker)
+                 shards by user id             one shared orders.db
+
+The router is the only process Telegram talks to. It checks the secret
+token, picks a worker from the update's user id (so each user's
+conversation stays on one worker and in order) and forwards the JSON over
+keep-alive localhost HTTP. It also starts the workers and restarts any that
+exit; while a worker is down its users' updates get a 503 and Telegram
+redelivers them, so one crash doesn't stop the bot.
+
+Workers run the normal Application, fed by a small local ingress instead of
+PTB's webhook server (which would re-register the webhook on every start).
+Singleton jobs run on whichever worker holds the lease (see leader.py).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+from telegram import Bot, Update
+
+from config import (
+    BOT_TOKEN, WEBHOOK_LISTEN, WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL, WORKER_BASE_PORT,
+    WORKER_ID, WORKERS,
+)
+
+WORKER_HOST = "127.0.0.1"
+FORWARD_PATIENCE = 10   # seconds to keep retrying a worker that is (re)starting
+STOP_TIMEOUT = 30       # seconds a worker gets to shut down before it is killed
+MAX_RESTART_DELAY = 30
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+log = logging.getLogger(__name__)
+
+
+def shard_key(data):
+    """The id PerUserUpdateProcessor serializes on: the sender, else the chat, else the update"""
+    for value in data.values():
+        if isinstance(value, dict):
+            for field in ("from", "user", "chat"):
+                if isinstance(value.get(field), dict) and "id" in value[field]:
+                    return value[field]["id"]
+    return data.get("update_id", 0)
+
+
+async def read_request(reader):
+    """Parse one HTTP/1.1 request; returns ``(method, path, headers, body)`` or None once the peer is done"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, path, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return method, path, headers, body
+
+
+class HttpServer(ABC):
+    """Minimal keep-alive HTTP server; subclasses implement ``handle``"""
+
+    def __init__(self, host, port, path, secret):
+        self.host = host
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.secret = secret
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _check(self, method, path, headers):
+        if method != "POST" or path.split("?")[0].rstrip("/") != self.path:
+            return "404 Not Found"
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret or ""):
+            return "403 Forbidden"
+        return None
+
+    async def _serve(self, reader, writer):
+        try:
+            while (request := await read_request(reader)) is not None:
+                method, path, headers, body = request
+                status = self._check(method, path, headers)
+                if status is None:
+                    status = await self.handle(body)
+                close = headers.get("connection", "").lower() == "close"
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n"
+                             f"{'Connection: close' if close else 'Connection: keep-alive'}\r\n\r\n".encode())
+                await writer.drain()
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @abstractmethod
+    async def handle(self, body):
+        """Process one authenticated POST body; returns the HTTP status line"""
+
+
+class UpdateIngress(HttpServer):
+    """Worker side: queue forwarded updates on the Application like PTB's webhook server does"""
+
+    def __init__(self, application, host, port, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        super().__init__(host, port, path, secret)
+        self.application = application
+
+    async def handle(self, body):
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except ValueError:
+            return "400 Bad Request"
+        await self.application.update_queue.put(update)
+        return "200 OK"
+
+
+class Router(HttpServer):
+    """Receives Telegram's webhook and forwards each update to its user's worker"""
+
+    def __init__(self, host, port, path, secret, worker_urls):
+        super().__init__(host, port, path, secret)
+        self.worker_urls = worker_urls
+        self._client = httpx.AsyncClient(limits=httpx.Limits(max_keepalive_connections=64))
+        self.forwarded = 0
+        self.rejected = 0
+
+    async def close(self):
+        await super().close()
+        await self._client.aclose()
+
+    async def handle(self, body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return "400 Bad Request"
+        url = self.worker_urls[shard_key(data) % len(self.worker_urls)]
+        deadline = time.monotonic() + FORWARD_PATIENCE
+        while True:
+            try:
+                response = await self._client.post(
+                    url, content=body, headers={SECRET_HEADER: self.secret, "Content-Type": "application/json"})
+                self.forwarded += 1
+                return f"{response.status_code} {response.reason_phrase}"
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    # Telegram retries the update later; by then the worker is back
+                    self.rejected += 1
+                    return "503 Service Unavailable"
+                await asyncio.sleep(0.5)
+
+
+class Supervisor:
+    """Starts the worker processes and restarts any that exit"""
+
+    def __init__(self, count=WORKERS):
+        self.count = count
+        self._processes = {}
+        self._tasks = []
+        self._stopping = False
+
+    def start(self):
+        self._tasks = [asyncio.get_running_loop().create_task(self._keep_running(n)) for n in range(self.count)]
+
+    async def _keep_running(self, worker_id):
+        delay = 1
+        env = {**os.environ, "BOT_MODE": "worker", "WORKER_ID": str(worker_id), "WORKERS": str(self.count)}
+        while not self._stopping:
+            started = time.monotonic()
+            process = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(sys.argv[0]), env=env)
+            self._processes[worker_id] = process
+            log.info("Started worker %d", worker_id, extra={"pid": process.pid})
+            code = await process.wait()
+            if self._stopping:
+                return
+            # Back off if it keeps dying straight away
+            delay = 1 if time.monotonic() - started > 60 else min(delay * 2, MAX_RESTART_DELAY)
+            log.warning("Worker %d exited with %s, restarting in %ds", worker_id, code, delay)
+            await asyncio.sleep(delay)
+
+    async def stop(self):
+        self._stopping = True
+        running = [process for process in self._processes.values() if process.returncode is None]
+        for process in running:
+            process.terminate()
+        for process in running:
+            try:
+                await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _stop_event():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+def worker_url(worker_id):
+    return f"http://{WORKER_HOST}:{WORKER_BASE_PORT + worker_id}/{WEBHOOK_PATH.strip('/')}"
+
+
+async def run_cluster():
+    """Router + supervised workers, until SIGINT/SIGTERM"""
+    if not (WEBHOOK_URL and WEBHOOK_SECRET):
+        raise SystemExit("Cluster mode needs WEBHOOK_URL and WEBHOOK_SECRET set")
+
+    stop = _stop_event()
+    supervisor = Supervisor(WORKERS)
+    router = Router(WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    [worker_url(n) for n in range(WORKERS)])
+    supervisor.start()
+    await router.start()
+    try:
+        async with Bot(BOT_TOKEN) as bot:
+            await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                                  allowed_updates=Update.ALL_TYPES)
+        log.info("Routing updates to %d workers", WORKERS)
+        await stop.wait()
+    finally:
+        await router.close()
+        await supervisor.stop()
+        log.info("Cluster stopped", extra={"forwarded": router.forwarded, "rejected": router.rejected})
+
+
+async def run_worker(application, port=None):
+    """Serve one shard: the Application with its usual lifecycle hooks, fed by UpdateIngress"""
+    stop = _stop_event()
+    ingress = UpdateIngress(application, WORKER_HOST, port or WORKER_BASE_PORT + WORKER_ID)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await ingress.start()
+    log.info("Worker %d ready", WORKER_ID)
+    try:
+        await stop.wait()
+    finally:
+        await ingress.close()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
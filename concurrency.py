@@ -0,0 +1,94 @@
+# concurrency.py
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# How many updates may be queued (waiting for their user or for a free slot)
+# per running slot before PTB stops handing us more.
+BACKLOG_FACTOR = 64
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates from different users concurrently, each user's in order.
+
+    Every update takes its user's (or chat's) lock before one of
+    ``max_running`` slots, so a user's second tap can't overtake their first
+    while other users keep flowing. Updates waiting on their own user's lock
+    don't hold a slot, so one busy user can't starve everybody else.
+    """
+
+    def __init__(self, max_running):
+        # PTB's own semaphore only bounds the backlog here; the real cap on
+        # concurrently running handlers is self._slots.
+        super().__init__(max(2, max_running * BACKLOG_FACTOR))
+        self.max_running = max_running
+        self._slots = asyncio.Semaphore(max_running)
+        self._locks = {}  # key -> [asyncio.Lock, number of updates holding or waiting]
+        self.running = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.processed = 0
+
+    @staticmethod
+    def _key(update):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user:
+            return ("user", update.effective_user.id)
+        if update.effective_chat:
+            return ("chat", update.effective_chat.id)
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        """Snapshot of queue depth and throughput counters"""
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "processed": self.processed,
+            "active_keys": len(self._locks),
+            "max_running": self.max_running,
+        }
+
+    async def _run(self, coroutine):
+        started = False
+        try:
+            async with self._slots:
+                self.waiting -= 1
+                started = True
+                self.running += 1
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+
+    async def do_process_update(self, update, coroutine):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        key = self._key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        # No await between here and queueing on the lock: asyncio.Lock is FIFO,
+        # so updates keep the order PTB handed them to us in.
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
@@ -1,148 +1,482 @@
 # database.py
+import asyncio
+import logging
 import sqlite3
-from datetime import datetime
-from config import DATABASE_NAME
-
-def init_db():
-    """Initialize the database with proper schema"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS orders
-                (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                 user_id INTEGER NOT NULL,
-                 package TEXT NOT NULL,
-                 coin_details TEXT NOT NULL,
-                 status TEXT DEFAULT 'pending',
-                 website_id TEXT,
-                 website_link TEXT,
-                 sol_amount REAL,
-                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
-
-def save_order(user_id, package, details, sol_amount, status="pending"):
-    """Save a new order with all required fields"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('''INSERT INTO orders 
-                (user_id, package, coin_details, sol_amount, status)
-                VALUES (?, ?, ?, ?, ?)''', 
-             (user_id, package, details, sol_amount, status))
-    order_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return order_id
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import analytics
+import search
+from cache import TTLCache
+from config import COMPLETION_SLA_HOURS, DATABASE_NAME, ORDER_CACHE_TTL, ORDER_CLAIM_MINUTES, PAYMENT_WINDOW_HOURS
+from group_commit import GroupCommitWriter
+from lifecycle import APPROVED, CANCELLED, COMPLETED, EXPIRED, PENDING, sql_sources
+from metrics import DB_SECONDS
+from migrations import migrate
+from models import ORDER_COLUMNS, Order
+from storage import Storage
 
-def get_order(order_id):
-    """Get complete order details"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute("SELECT * FROM orders WHERE id = ?", (order_id,))
-    order = c.fetchone()
-    conn.close()
-    
-    if order:
-        return {
-            'id': order[0],
-            'user_id': order[1],
-            'package': order[2],
-            'coin_details': order[3],
-            'status': order[4],
-            'website_id': order[5],
-            'website_link': order[6],  # Add this line
-            'sol_amount': order[7],
-            'created_at': order[8]
-        }
-    return None
-
-def update_order_status(order_id, status, website_id=None):
-    """Update order status and website ID"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    if website_id:
-        c.execute('''UPDATE orders 
-                   SET status = ?, website_id = ?
-                   WHERE id = ?''', 
-                 (status, website_id, order_id))
-    else:
-        c.execute('''UPDATE orders 
-                   SET status = ?
-                   WHERE id = ?''', 
-                 (status, order_id))
-    conn.commit()
-    conn.close()
-
-def get_order_by_id(order_id):
-    print(order_id)
-    """Get order by ID with proper error handling"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT * FROM orders WHERE id = ?''', (order_id,))
-    order = c.fetchone()
-    conn.close()
-    
-    if order:
-        return {
-            'id': order[0],
-            'user_id': order[1],
-            'package': order[2],
-            'coin_details': order[3],
-            'status': order[4],
-            'website_id': order[5],
-            'website_link': order[6], 
-            'sol_amount': order[7],
-            'created_at': order[8]
-        }
-    return None
-
-def get_all_pending_orders():
-    """Get all pending orders with proper formatting"""
-    conn = sqlite3.connect(DATABASE_NAME)
-    c = conn.cursor()
-    c.execute('''SELECT * FROM orders WHERE status = 'pending' ORDER BY created_at DESC''')
-    orders = []
-    for order in c.fetchall():
-        orders.append({
-            'id': order[0],
-            'user_id': order[1],
-            'package': order[2],
-            'coin_details': order[3],
-            'status': order[4],
-            'created_at': order[7]
-        })
-    conn.close()
-    return orders
+READER_POOL_SIZE = 4
+PAGE_SIZE = 10
+STREAM_CHUNK = 500  # rows per read when streaming orders
+SWEEP_LIMIT = 100   # orders handled per expiry/SLA sweep
+
+log = logging.getLogger(__name__)
+
+
+def connect(path=DATABASE_NAME, readonly=False, synchronous="NORMAL"):
+    """Open a connection tuned for the bot (WAL, busy timeout, statement cache)"""
+    # check_same_thread is off only so the owning repository can close
+    # connections on shutdown; each connection is still used by one thread.
+    conn = sqlite3.connect(path, timeout=30, cached_statements=256, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute("PRAGMA busy_timeout=30000")
+    if readonly:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
 
 
-def complete_order(order_id: int, website_url: str) -> bool:
-    """Mark an order as completed with website URL"""
+def init_db(path=DATABASE_NAME):
+    """Bring the database schema up to date (see migrations.py)"""
+    conn = connect(path)
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        # Update both status and website_link
-        c.execute('''UPDATE orders 
-                    SET status = 'completed', 
-                        website_link = ?
-                    WHERE id = ?''', 
-                 (website_url, order_id))
-        conn.commit()
-        return c.rowcount > 0
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        return False
+        migrate(conn)
     finally:
         conn.close()
 
-def get_user_id_by_order_id(order_id: int) -> int:
-    """Get user ID associated with a specific order"""
+
+# Statements are kept as module constants so every connection's statement
+# cache hands back the same prepared statement instead of re-parsing SQL.
+INSERT_ORDER = '''INSERT INTO orders
+                (user_id, package, coin_details, sol_amount, status, payment_reference, payment_due_at,
+                 coin_name, coin_key, contract, checkout_id)
+                VALUES (?, ?, ?, ?, ?, ?, datetime('now', ?), ?, ?, ?, ?)
+                ON CONFLICT (checkout_id) WHERE checkout_id IS NOT NULL DO NOTHING
+                RETURNING id, created_at'''
+SELECT_CHECKOUT = "SELECT id FROM orders WHERE checkout_id = ?"
+SELECT_ORDER = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?"
+SELECT_PENDING = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' ORDER BY created_at DESC, id DESC"
+SELECT_PENDING_FIRST = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending'
+                ORDER BY created_at DESC, id DESC LIMIT ?'''
+SELECT_PENDING_OLDER = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC LIMIT ?'''
+SELECT_PENDING_NEWER = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' AND (created_at, id) > (?, ?)
+                ORDER BY created_at ASC, id ASC LIMIT ?'''
+SELECT_ORDERS_AFTER = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_ORDERS_AFTER_BY_STATUS = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = ? AND id > ? ORDER BY id LIMIT ?"
+# An admin's claim on an order is a compare-and-set: it only succeeds while
+# nobody else holds an unexpired claim. Transitions made by an admin
+# (:actor) carry the same guard and take the claim over; the payment
+# verifier and the sweeps pass no actor and ignore claims.
+CLAIM_GUARD = "(:actor IS NULL OR claimed_by IS NULL OR claimed_by = :actor OR claimed_at <= datetime('now', :claim_ttl))"
+CLAIM_SET = ("claimed_by = COALESCE(:actor, claimed_by), "
+             "claimed_at = CASE WHEN :actor IS NULL THEN claimed_at ELSE CURRENT_TIMESTAMP END")
+# One guarded UPDATE per target status: it only matches a row whose current
+# status may move to the target (see lifecycle.py), so the state machine is
+# enforced by the database and a lost race simply returns no row.
+TRANSITION_TO = {
+    APPROVED: f'''UPDATE orders SET status = 'approved', website_id = COALESCE(:website_id, website_id),
+                tx_signature = COALESCE(:tx_signature, tx_signature), approved_at = CURRENT_TIMESTAMP,
+                due_at = datetime('now', :sla), updated_at = CURRENT_TIMESTAMP, {CLAIM_SET}
+                WHERE id = :id AND status IN ({sql_sources(APPROVED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    COMPLETED: f'''UPDATE orders SET status = 'completed', website_link = :website_link,
+                completed_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP, {CLAIM_SET}
+                WHERE id = :id AND status IN ({sql_sources(COMPLETED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    EXPIRED: f'''UPDATE orders SET status = 'expired', expired_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP, {CLAIM_SET}
+                WHERE id = :id AND status IN ({sql_sources(EXPIRED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    CANCELLED: f'''UPDATE orders SET status = 'cancelled', cancelled_at = CURRENT_TIMESTAMP,
+                updated_at = CURRENT_TIMESTAMP, {CLAIM_SET}
+                WHERE id = :id AND status IN ({sql_sources(CANCELLED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+}
+CLAIM_ORDER = f'''UPDATE orders SET claimed_by = :actor, claimed_at = CURRENT_TIMESTAMP
+                WHERE id = :id AND status IN ('pending', 'approved') AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}'''
+# The oldest pending order nobody holds, for "take next" on the admin queue.
+# Writes are serialized by SQLite, so no row locking is needed here.
+CLAIM_NEXT_ORDER = f'''UPDATE orders SET claimed_by = :actor, claimed_at = CURRENT_TIMESTAMP
+                WHERE id = (SELECT id FROM orders WHERE status = 'pending'
+                            AND (claimed_by IS NULL OR claimed_at <= datetime('now', :claim_ttl))
+                            ORDER BY created_at, id LIMIT 1)
+                RETURNING {ORDER_COLUMNS}'''
+RELEASE_ORDER = f'''UPDATE orders SET claimed_by = NULL, claimed_at = NULL
+                WHERE id = ? AND claimed_by = ? RETURNING {ORDER_COLUMNS}'''
+# The deadline sweeps name their partial index explicitly: without ANALYZE
+# statistics SQLite would otherwise prefer the (status, created_at) index
+# and walk every open order instead of just the overdue ones.
+EXPIRE_OVERDUE = f'''UPDATE orders SET status = 'expired', expired_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT id FROM orders INDEXED BY idx_orders_payment_due
+                             WHERE status = 'pending' AND payment_due_at <= CURRENT_TIMESTAMP
+                             AND payment_reference IS NOT NULL
+                             ORDER BY payment_due_at LIMIT ?)
+                RETURNING {ORDER_COLUMNS}'''
+CLAIM_SLA_WARNINGS = f'''UPDATE orders SET sla_pinged_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT id FROM orders INDEXED BY idx_orders_sla_due
+                             WHERE status = 'approved' AND sla_pinged_at IS NULL
+                             AND due_at <= datetime('now', ?) ORDER BY due_at LIMIT ?)
+                RETURNING {ORDER_COLUMNS}'''
+# Job cursors start at the newest order, so a fresh job doesn't replay history
+INIT_CURSOR = "INSERT OR IGNORE INTO job_cursors (name, position) SELECT ?, COALESCE(MAX(id), 0) FROM orders"
+SELECT_CURSOR = "SELECT position FROM job_cursors WHERE name = ?"
+UPDATE_CURSOR = "UPDATE job_cursors SET position = ? WHERE name = ?"
+SELECT_ORDERS_SINCE = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_USER_ID = "SELECT user_id FROM orders WHERE id = ?"
+SELECT_AWAITING_PAYMENT = f'''SELECT {ORDER_COLUMNS} FROM orders
+                WHERE status = 'pending' AND payment_reference IS NOT NULL'''
+
+
+def _save_order(conn, user_id, package, details, sol_amount, status="pending", payment_reference=None,
+                checkout_id=None):
+    coin_name, coin_key, contract = search.coin_columns(details)
+    # Only on-chain payments have a deadline: without a reference the customer
+    # has already confirmed payment and the order waits for an admin
+    payment_window = _hours(PAYMENT_WINDOW_HOURS) if payment_reference else None
+    row = conn.execute(
+        INSERT_ORDER, (user_id, package, details, sol_amount, status, payment_reference,
+                       payment_window, coin_name, coin_key, contract, checkout_id)).fetchone()
+    if row is None:
+        # This checkout already has its order
+        return _get_checkout_order_id(conn, checkout_id)
+    order_id, created_at = row
+    analytics.record_created(conn, created_at, package)
+    search.index_order(conn, order_id, coin_name, contract, details)
+    return order_id
+
+
+def _get_checkout_order_id(conn, checkout_id):
+    row = conn.execute(SELECT_CHECKOUT, (checkout_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _get_order_by_id(conn, order_id):
+    log.debug("Loading order", extra={"order_id": order_id})
+    row = conn.execute(SELECT_ORDER, (order_id,)).fetchone()
+    return Order.from_row(row) if row else None
+
+
+def _hours(hours):
+    return f"+{hours * 3600:.0f} seconds"
+
+
+def cancelled_from(order):
+    """Status a just-cancelled order had: only approval stamps ``approved_at``"""
+    return APPROVED if order.approved_at else PENDING
+
+
+def _claim_params(order_id, actor):
+    return {"id": order_id, "actor": actor, "claim_ttl": f"-{ORDER_CLAIM_MINUTES * 60:.0f} seconds"}
+
+
+def _transition(conn, order_id, status, actor=None, website_id=None, website_link=None, tx_signature=None):
+    """Move an order to ``status`` if the state machine (and any other admin's
+    claim) allows it; returns the updated Order or None"""
+    if status not in TRANSITION_TO:
+        raise ValueError(f"Unknown order status {status!r}")
+    params = _claim_params(order_id, actor)
+    params.update(website_id=website_id, website_link=website_link, tx_signature=tx_signature,
+                  sla=_hours(COMPLETION_SLA_HOURS))
+    row = conn.execute(TRANSITION_TO[status], params).fetchone()
+    if row is None:
+        return None
+    order = Order.from_row(row)
+    if status == APPROVED:
+        analytics.record_approved(conn, order.created_at, order.package, order.sol_amount, order.approved_at)
+    elif status == COMPLETED:
+        analytics.record_completed(conn, order.created_at, order.package, order.approved_at, order.completed_at)
+    elif status == CANCELLED:
+        analytics.record_cancelled(conn, order, cancelled_from(order))
+    return order
+
+
+def _claim_order(conn, order_id, actor):
+    row = conn.execute(CLAIM_ORDER, _claim_params(order_id, actor)).fetchone()
+    return Order.from_row(row) if row else None
+
+
+def _claim_next_order(conn, actor):
+    row = conn.execute(CLAIM_NEXT_ORDER, _claim_params(None, actor)).fetchone()
+    return Order.from_row(row) if row else None
+
+
+def _release_order(conn, order_id, actor):
+    row = conn.execute(RELEASE_ORDER, (order_id, actor)).fetchone()
+    return Order.from_row(row) if row else None
+
+
+def _expire_overdue(conn, limit):
+    return [Order.from_row(row) for row in conn.execute(EXPIRE_OVERDUE, (limit,)).fetchall()]
+
+
+def _claim_sla_warnings(conn, within_hours, limit):
+    rows = conn.execute(CLAIM_SLA_WARNINGS, (_hours(within_hours), limit)).fetchall()
+    return [Order.from_row(row) for row in rows]
+
+
+def _take_new_orders(conn, name, limit):
+    conn.execute(INIT_CURSOR, (name,))
+    position = conn.execute(SELECT_CURSOR, (name,)).fetchone()[0]
+    orders = [Order.from_row(row) for row in conn.execute(SELECT_ORDERS_SINCE, (position, limit))]
+    if orders:
+        conn.execute(UPDATE_CURSOR, (orders[-1].id, name))
+    return orders
+
+
+def _get_all_pending_orders(conn):
+    return [Order.from_row(row) for row in conn.execute(SELECT_PENDING)]
+
+
+def _get_pending_orders_page(conn, cursor=None, direction="next", limit=PAGE_SIZE):
+    # Fetch one extra row to learn whether another page exists in the
+    # direction we're moving without a separate COUNT query.
+    if cursor is None:
+        rows = conn.execute(SELECT_PENDING_FIRST, (limit + 1,)).fetchall()
+    elif direction == "next":
+        rows = conn.execute(SELECT_PENDING_OLDER, (*cursor, limit + 1)).fetchall()
+    else:
+        rows = conn.execute(SELECT_PENDING_NEWER, (*cursor, limit + 1)).fetchall()
+
+    return shape_page(rows, cursor, direction, limit)
+
+
+def shape_page(rows, cursor, direction, limit):
+    """``(orders, has_prev, has_next)`` from a page query that fetched ``limit + 1`` rows"""
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev" and cursor is not None:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+    return [Order.from_row(row) for row in rows], has_prev, has_next
+
+
+def _get_orders_after(conn, after_id, status, limit):
+    if status is None:
+        rows = conn.execute(SELECT_ORDERS_AFTER, (after_id, limit)).fetchall()
+    else:
+        rows = conn.execute(SELECT_ORDERS_AFTER_BY_STATUS, (status, after_id, limit)).fetchall()
+    return [Order.from_row(row) for row in rows]
+
+
+def _get_awaiting_payment(conn):
+    return [Order.from_row(row) for row in conn.execute(SELECT_AWAITING_PAYMENT)]
+
+
+def _get_user_id_by_order_id(conn, order_id):
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        c.execute("SELECT user_id FROM orders WHERE id = ?", (order_id,))
-        result = c.fetchone()
+        result = conn.execute(SELECT_USER_ID, (order_id,)).fetchone()
         return result[0] if result else None
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
+    except sqlite3.Error:
+        log.exception("Could not look up the order's user", extra={"order_id": order_id})
         return None
-    finally:
-        conn.close()
\ No newline at end of file
+
+
+def _log_failed_write(future):
+    if not future.cancelled() and future.exception() is not None:
+        log.error("Background write failed", exc_info=future.exception())
+
+
+class OrderRepository(Storage):
+    """Async access to the orders table in SQLite.
+
+    All writes go through a group-commit writer thread (SQLite allows a
+    single writer anyway) while reads are spread over a bounded pool of
+    read-only connections, so handlers await the database instead of
+    blocking the event loop on disk I/O. Write helpers never commit
+    themselves; the writer batches them into shared transactions.
+
+    Single-order lookups are served from an in-process TTL/LRU cache;
+    every method that changes an order invalidates (or refreshes) its entry.
+    """
+
+    def __init__(self, path=DATABASE_NAME, readers=READER_POOL_SIZE, cache_ttl=ORDER_CACHE_TTL):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # The writer fsyncs on every commit; group commit amortizes that
+        # cost across everything queued during the batch window.
+        self._writer = GroupCommitWriter(lambda: connect(path, synchronous="FULL"))
+        self._readers = ThreadPoolExecutor(
+            max_workers=readers, thread_name_prefix="db-reader",
+            initializer=self._open)
+        self.cache = TTLCache(ttl=cache_ttl)
+
+    async def start(self):
+        """Schema is migrated by init_db() before the bot starts; nothing to connect up front"""
+
+    async def shutdown(self):
+        await asyncio.to_thread(self.close)
+
+    def _open(self):
+        conn = connect(self.path, readonly=True)
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+
+    def _call(self, fn, args):
+        with DB_SECONDS.time(fn.__name__.lstrip("_"), "read"):
+            return fn(self._local.conn, *args)
+
+    async def run_read(self, fn, *args):
+        """Run ``fn(conn, *args)`` on a pooled read-only connection"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call, fn, args)
+
+    async def run_write(self, fn, *args):
+        """Run ``fn(conn, *args)`` in the writer's next group commit"""
+        return await self._writer.run(fn, *args)
+
+    async def save_order(self, user_id, package, details, sol_amount, status="pending", payment_reference=None,
+                         checkout_id=None):
+        """Save a new order with all required fields; a repeated ``checkout_id`` returns the order it already made"""
+        return await self.run_write(
+            _save_order, user_id, package, details, sol_amount, status, payment_reference, checkout_id)
+
+    async def get_checkout_order_id(self, checkout_id):
+        """Id of the order placed by ``checkout_id``, or None"""
+        return await self.run_read(_get_checkout_order_id, checkout_id)
+
+    async def get_order_by_id(self, order_id, fresh=False):
+        """Get order by ID with proper error handling.
+
+        ``fresh`` reads past the cache. Use it for a status that decides what an admin
+        may do next: with several workers, another process may have changed it.
+        """
+        order_id = int(order_id)
+        order = None if fresh else self.cache.get(order_id)
+        if order is None:
+            version = self.cache.version
+            order = await self.run_read(_get_order_by_id, order_id)
+            if order is not None:
+                self.cache.put(order_id, order, version)
+        return order
+
+    async def _write_order(self, order_id, fn, *args):
+        order = await self.run_write(fn, order_id, *args)
+        self.cache.invalidate(order_id)
+        if order is not None:
+            self.cache.put(order_id, order)
+        return order
+
+    async def transition(self, order_id, status, actor=None, **fields):
+        """Guarded status change (see lifecycle.py); returns the updated Order, or
+        None when the order doesn't exist, can't move to ``status`` from where it
+        is, or is claimed by an admin other than ``actor``"""
+        return await self._write_order(int(order_id), _transition, status, actor, *(
+            fields.get(name) for name in ("website_id", "website_link", "tx_signature")))
+
+    async def claim_order(self, order_id, admin_id):
+        """Take (or renew) an admin's claim on an open order; returns the Order, or
+        None when it's closed, missing or claimed by another admin"""
+        return await self._write_order(int(order_id), _claim_order, int(admin_id))
+
+    async def claim_next_order(self, admin_id):
+        """Claim the oldest pending order nobody is working on; returns it or None"""
+        order = await self.run_write(_claim_next_order, int(admin_id))
+        if order is not None:
+            self.cache.invalidate(order.id)
+            self.cache.put(order.id, order)
+        return order
+
+    async def release_order(self, order_id, admin_id):
+        """Drop ``admin_id``'s claim so another admin can pick the order up"""
+        return await self._write_order(int(order_id), _release_order, int(admin_id))
+
+    async def get_all_pending_orders(self):
+        """Get all pending orders with proper formatting"""
+        return await self.run_read(_get_all_pending_orders)
+
+    async def get_pending_orders_page(self, cursor=None, direction="next", limit=PAGE_SIZE):
+        """Get one page of pending orders, newest first.
+
+        ``cursor`` is ``Order.cursor`` of the row the page continues
+        from: ``direction="next"`` returns older orders after it and
+        ``"prev"`` the newer orders before it. Returns
+        ``(orders, has_prev, has_next)``.
+        """
+        return await self.run_read(_get_pending_orders_page, cursor, direction, limit)
+
+    async def iter_orders(self, status=None, chunk_size=STREAM_CHUNK):
+        """Stream every order (optionally only one status) in id order.
+
+        Reads keyset chunks of ``chunk_size`` rows, so memory stays flat and
+        no read transaction is held open between chunks.
+        """
+        after_id = 0
+        while True:
+            chunk = await self.run_read(_get_orders_after, after_id, status, chunk_size)
+            for order in chunk:
+                yield order
+            if len(chunk) < chunk_size:
+                return
+            after_id = chunk[-1].id
+
+    async def get_awaiting_payment(self):
+        """Get pending orders that carry a Solana Pay reference to look for on-chain"""
+        return await self.run_read(_get_awaiting_payment)
+
+    async def expire_overdue(self, limit=SWEEP_LIMIT):
+        """Expire pending orders past their payment deadline; returns the expired orders"""
+        expired = await self.run_write(_expire_overdue, limit)
+        for order in expired:
+            self.cache.invalidate(order.id)
+        return expired
+
+    async def claim_sla_warnings(self, within_hours, limit=SWEEP_LIMIT):
+        """Approved orders due within ``within_hours`` that haven't been flagged yet.
+
+        Each order is returned once: claiming stamps ``sla_pinged_at``.
+        """
+        orders = await self.run_write(_claim_sla_warnings, within_hours, limit)
+        for order in orders:
+            self.cache.invalidate(order.id)
+        return orders
+
+    async def take_new_orders(self, name, limit=SWEEP_LIMIT):
+        """Orders created since the ``name`` job last asked, each returned once across all workers"""
+        return await self.run_write(_take_new_orders, name, limit)
+
+    async def get_stats(self, days=analytics.REPORT_DAYS):
+        """Summary for /stats, read from the incrementally maintained tables"""
+        return await self.run_read(analytics.read_report, days)
+
+    def count_funnel_step(self, step):
+        """Count a checkout step for the funnel; fire-and-forget, rides the next group commit"""
+        self._writer.submit(analytics.record_funnel, step).add_done_callback(_log_failed_write)
+
+    async def search_orders(self, text, limit=search.SEARCH_LIMIT):
+        """Orders whose coin details contain every word of ``text``, best match first"""
+        query = search.match_query(text)
+        return await self.run_read(search.search_orders, query, limit) if query else []
+
+    async def find_duplicates(self, order_id):
+        """Ids of other open or completed orders for the same coin (by name or contract)"""
+        return await self.run_read(search.duplicates, int(order_id))
+
+    async def export(self, path, fmt="csv", since=None, until=None, status=None, compress=False):
+        """Stream the selected orders to ``path`` on a worker thread (see export.py)"""
+        from export import export_orders
+        return await asyncio.to_thread(export_orders, path, fmt, since, until, status, compress, self.path)
+
+    async def get_user_id_by_order_id(self, order_id: int) -> int:
+        """Get user ID associated with a specific order"""
+        return await self.run_read(_get_user_id_by_order_id, order_id)
+
+    def stats(self):
+        """Group-commit counters, writer backlog and order cache hits/misses"""
+        return {"commits": self._writer.commits, "writes": self._writer.writes, "write_queue": self._writer.backlog(),
+                **{f"cache_{key}": value for key, value in self.cache.stats().items()}}
+
+    def close(self):
+        """Wait for queued work and close every pooled connection"""
+        self._writer.close()
+        self._readers.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,195 @@
+# export.py
+"""Stream orders out of orders.db as CSV, JSON Lines or Parquet.
+
+Rows flow through a generator pipeline: one read-only connection, a cursor
+read with ``fetchmany`` in fixed-size chunks, and a writer that emits each
+chunk before the next is fetched, so memory stays flat however large the
+table is. CSV/JSONL can be gzipped; Parquet (needs the optional ``pyarrow``)
+writes one row group per chunk and compresses internally.
+
+Used by the admin ``/export`` command and from the shell:
+
+    python export.py --format csv --status completed --since 2025-01-01 --gzip -o orders.csv.gz
+"""
+import argparse
+import csv
+import gzip
+import json
+import sys
+from datetime import date, timedelta
+
+from config import DATABASE_NAME
+from database import connect
+from models import ORDER_COLUMNS
+
+FORMATS = ("csv", "jsonl", "parquet")
+FETCH_SIZE = 1000
+COLUMNS = tuple(column.strip() for column in ORDER_COLUMNS.split(","))
+# Parquet types follow the column names: ``*_at`` are timestamps, ``*_by`` and
+# these ids are integers, these amounts floats, and everything else text
+INTEGER_COLUMNS = {"id", "user_id"}
+FLOAT_COLUMNS = {"sol_amount"}
+
+
+class ExportError(Exception):
+    pass
+
+
+def build_query(since=None, until=None, status=None):
+    """SELECT for the filtered range; ``until`` is inclusive of the whole day"""
+    clauses, params = [], []
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since.isoformat())
+    if until:
+        clauses.append("created_at < ?")
+        params.append((until + timedelta(days=1)).isoformat())
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"SELECT {ORDER_COLUMNS} FROM orders{where} ORDER BY created_at, id", params
+
+
+def iter_chunks(conn, since=None, until=None, status=None, size=FETCH_SIZE):
+    """Yield lists of raw row tuples, ``size`` at a time, from a single cursor"""
+    query, params = build_query(since, until, status)
+    cursor = conn.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def write_csv(chunks, fh):
+    writer = csv.writer(fh)
+    writer.writerow(COLUMNS)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def write_jsonl(chunks, fh):
+    count = 0
+    for rows in chunks:
+        fh.writelines(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+        count += len(rows)
+    return count
+
+
+def parquet_schema(pa, columns=COLUMNS):
+    """Arrow schema for the exported ``columns``, typed by name (see INTEGER_COLUMNS)"""
+    def arrow_type(column):
+        if column.endswith("_at"):
+            return pa.timestamp("s", tz="UTC")
+        if column in INTEGER_COLUMNS or column.endswith("_by"):
+            return pa.int64()
+        if column in FLOAT_COLUMNS:
+            return pa.float64()
+        return pa.string()
+    return pa.schema([(column, arrow_type(column)) for column in columns])
+
+
+def write_parquet(chunks, path, compression="snappy"):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+    schema = parquet_schema(pa)
+    count = 0
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            # SQLite stores UTC without an offset: parse as naive, then label it UTC
+            arrays = [
+                pa.array(values, pa.string()).cast(pa.timestamp("s")).cast(field.type)
+                if pa.types.is_timestamp(field.type)
+                else pa.array(values, field.type)
+                for field, values in zip(schema, columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_orders(path, fmt="csv", since=None, until=None, status=None, compress=False, db_path=DATABASE_NAME):
+    """Write the selected orders to ``path``; returns how many rows were written"""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+    conn = connect(db_path, readonly=True)
+    try:
+        return write_chunks(iter_chunks(conn, since, until, status), path, fmt, compress)
+    finally:
+        conn.close()
+
+
+def write_chunks(chunks, path, fmt="csv", compress=False):
+    """Write an iterable of row-tuple chunks (in COLUMNS order) to ``path``; returns the row count"""
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        return write_parquet(chunks, path, compression="gzip" if compress else "snappy")
+    writer = write_csv if fmt == "csv" else write_jsonl
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8", newline="") as fh:
+        return writer(chunks, fh)
+
+
+def filename(fmt, compress=False, since=None, until=None, status=None):
+    parts = ["orders"] + [str(part) for part in (status, since, until) if part]
+    suffix = f".{fmt}" + (".gz" if compress and fmt != "parquet" else "")
+    return "_".join(parts) + suffix
+
+
+def parse_args(words):
+    """Parse ``/export`` arguments: ``[csv|jsonl|parquet] [gz] [status=...] [from=YYYY-MM-DD] [to=YYYY-MM-DD]``"""
+    options = {"fmt": "csv", "compress": False, "status": None, "since": None, "until": None}
+    for word in words:
+        key, _, value = word.partition("=")
+        try:
+            if word in FORMATS:
+                options["fmt"] = word
+            elif word in ("gz", "gzip"):
+                options["compress"] = True
+            elif key == "status" and value:
+                options["status"] = value
+            elif key in ("from", "since") and value:
+                options["since"] = date.fromisoformat(value)
+            elif key in ("to", "until") and value:
+                options["until"] = date.fromisoformat(value)
+            else:
+                raise ExportError(f"Don't understand {word!r}")
+        except ValueError:
+            raise ExportError(f"Bad date in {word!r}, use YYYY-MM-DD") from None
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export orders from orders.db")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--status")
+    parser.add_argument("--since", type=date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="last day, inclusive (YYYY-MM-DD)")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("-o", "--output")
+    args = parser.parse_args(argv)
+
+    output = args.output or filename(args.format, args.gzip, args.since, args.until, args.status)
+    try:
+        count = export_orders(output, args.format, args.since, args.until, args.status, args.gzip, args.database)
+    except ExportError as e:
+        sys.exit(str(e))
+    print(f"Exported {count} orders to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# group_commit.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import DB_BATCH_SIZE, DB_COMMIT_SECONDS, DB_SECONDS
+
+MAX_BATCH = 256
+MAX_DELAY = 0.002  # seconds to wait for more writes once a batch is open
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Single writer thread that coalesces queued writes into shared transactions.
+
+    Each write is a callable ``fn(conn, *args)`` run inside its own SAVEPOINT,
+    so one failing write doesn't poison the rest of the batch. Callers get a
+    future that resolves only after the batch's COMMIT has returned, i.e. once
+    the write is durable, so "Order #N Received" is never sent for an order
+    that could still be lost.
+    """
+
+    def __init__(self, connect, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.commits = 0
+        self.writes = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        """Queue a write and return a future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def backlog(self):
+        """Writes queued but not yet picked up by the writer thread"""
+        return self._queue.qsize()
+
+    async def run(self, fn, *args):
+        """Queue a write and wait until it has been committed"""
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def close(self):
+        """Flush everything already queued, then stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _next_batch(self):
+        """Block for the first write, then gather more until the window closes"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        conn = self._connect()
+        conn.isolation_level = None  # transactions are managed explicitly below
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, fn, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write")
+                started = time.perf_counter()
+                try:
+                    result = fn(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, result, None))
+                finally:
+                    DB_SECONDS.observe(time.perf_counter() - started, fn.__name__.lstrip("_"), "write")
+            started = time.perf_counter()
+            conn.execute("COMMIT")
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for future, fn, args in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        self.commits += 1
+        self.writes += len(outcomes)
+        DB_BATCH_SIZE.observe(len(outcomes))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,67 @@
+# leader.py
+"""Leader election through a lease row in the shared database.
+
+When several workers share orders.db (see cluster.py), jobs that must run
+exactly once — payment polling, expiry and SLA sweeps, new-order alerts —
+only run on the worker holding the ``jobs`` lease. The holder renews it every
+few seconds; if that worker dies, the lease lapses after LEASE_SECONDS and
+the next worker to try takes over. Acquire and renew are one conditional
+upsert, so two workers can never both hold it.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+
+from config import LEASE_SECONDS
+
+ACQUIRE = '''INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, datetime('now', ?))
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leases.holder = excluded.holder OR leases.expires_at <= CURRENT_TIMESTAMP
+                RETURNING holder'''
+RELEASE = "DELETE FROM leases WHERE name = ? AND holder = ?"
+
+log = logging.getLogger(__name__)
+
+
+def _acquire(conn, name, holder, seconds):
+    return conn.execute(ACQUIRE, (name, holder, f"+{seconds:.0f} seconds")).fetchone() is not None
+
+
+def _release(conn, name, holder):
+    conn.execute(RELEASE, (name, holder))
+
+
+class LeaderLease:
+    def __init__(self, repository, name="jobs", seconds=LEASE_SECONDS):
+        self.repository = repository
+        self.name = name
+        self.seconds = seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valid_until = 0.0
+
+    @property
+    def is_leader(self):
+        # Trust the lease only until a safety margin before it lapses, so a
+        # worker whose renewals stall stops running jobs before anyone else starts
+        return time.monotonic() < self._valid_until
+
+    async def renew(self):
+        """Acquire or extend the lease; returns whether this worker holds it"""
+        was_leader = self.is_leader
+        started = time.monotonic()
+        try:
+            held = await self.repository.run_write(_acquire, self.name, self.holder, self.seconds)
+        except Exception:
+            log.exception("Could not renew the %s lease", self.name)
+            held = False
+        self._valid_until = started + self.seconds * 2 / 3 if held else 0.0
+        if held != was_leader:
+            log.info("%s the %s lease", "Acquired" if held else "Lost", self.name, extra={"holder": self.holder})
+        return held
+
+    async def release(self):
+        if self._valid_until:
+            self._valid_until = 0.0
+            await self.repository.run_write(_release, self.name, self.holder)
@@ -0,0 +1,41 @@
+# lifecycle.py
+"""Order state machine.
+
+    pending ──> approved ──> completed
+       │           │
+       ├──> expired └──> cancelled
+       └──> cancelled
+
+Every status change goes through ``OrderRepository.transition``, which only
+updates a row whose current status is an allowed source for the target, so
+two admins (or an admin and the payment verifier) racing on one order can't
+both win, and a completed order can't be approved again. Each target status
+stamps its own ``<status>_at`` column. Approval also sets ``due_at`` (the
+completion SLA), and new orders with a Solana Pay reference get
+``payment_due_at``, after which an unpaid order expires. Both deadlines have partial indexes, so the JobQueue sweeps in
+main.py only read the rows that are actually due.
+"""
+PENDING, APPROVED, COMPLETED, EXPIRED, CANCELLED = "pending", "approved", "completed", "expired", "cancelled"
+
+TRANSITIONS = {
+    PENDING: (APPROVED, EXPIRED, CANCELLED),
+    APPROVED: (COMPLETED, CANCELLED),
+    COMPLETED: (),
+    EXPIRED: (),
+    CANCELLED: (),
+}
+
+# target status -> statuses it may be reached from
+SOURCES = {
+    target: tuple(source for source, targets in TRANSITIONS.items() if target in targets)
+    for target in TRANSITIONS
+}
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+def sql_sources(target):
+    """``'a', 'b'`` for an ``IN (...)`` guard on the target's allowed sources"""
+    return ", ".join(f"'{status}'" for status in SOURCES[target])
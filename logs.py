@@ -0,0 +1,146 @@
+# logs.py
+"""Structured, non-blocking logging.
+
+Modules log through ``logging.getLogger(__name__)`` as usual. ``setup_logging``
+routes every record through a queue to a listener thread, so a handler's log
+call costs a dict copy and a queue put while formatting and the stdout write
+happen off the event loop. Records come out as one JSON object per line,
+carrying the correlation fields (handler, user_id, chat_id, order_id) bound
+for the update being handled. High-volume DEBUG events are sampled.
+"""
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+from config import LOG_DEBUG_SAMPLE_EVERY, LOG_FORMAT, LOG_LEVEL
+
+_context = contextvars.ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "context"}
+
+
+def bind(**fields):
+    """Attach correlation fields to every record logged later in this update/task"""
+    _context.set({**_context.get(), **fields})
+
+
+def correlated(callback, name=None):
+    """Wrap a handler so its records carry the handler name, user and chat"""
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, *args, **kwargs):
+        fields = {"handler": name}
+        user = getattr(update, "effective_user", None)
+        chat = getattr(update, "effective_chat", None)
+        if user:
+            fields["user_id"] = user.id
+        if chat:
+            fields["chat_id"] = chat.id
+        token = _context.set(fields)
+        try:
+            return await callback(update, *args, **kwargs)
+        finally:
+            _context.reset(token)
+
+    return wrapper
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """Snapshots the message and correlation fields, leaving formatting to the listener"""
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        record.context = _context.get()
+        return record
+
+
+class DebugSampler(logging.Filter):
+    """Lets through the first and then every ``every``-th DEBUG record per call site"""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._seen = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        seen = self._seen[key] = self._seen.get(key, 0) + 1
+        if (seen - 1) % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {**getattr(record, "context", {}),
+                  **{k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}}
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_every=LOG_DEBUG_SAMPLE_EVERY, stream=None):
+    """Route all logging through a background queue listener (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records = queue.SimpleQueue()
+    handler = ContextQueueHandler(records)
+    handler.addFilter(DebugSampler(sample_every))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    # httpx logs every request at INFO; the Bot API metrics already cover that
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,3 +1,9 @@
+from startup import StartupTimer  # first, so the startup breakdown counts every other import
+import asyncio
+import logging
+import os
+import secrets
+import tempfile
 from datetime import datetime
 from telegram import Message, Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
 from telegram.ext import (
@@ -7,11 +13,38 @@ from telegram.ext import (
     MessageHandler,
     filters,
     ConversationHandler,
-    CallbackQueryHandler
+    CallbackQueryHandler,
+    TypeHandler,
 )
-from config import BOT_TOKEN, PACKAGES, WELCOME_MESSAGE, SOLANA_ADDRESS, ADMIN_USER_ID
-from database import get_order_by_id, init_db, save_order, update_order_status,get_all_pending_orders
-from utils import generate_payment_qr
+from telegram.request import HTTPXRequest
+from config import (
+    BOT_TOKEN, WELCOME_MESSAGE, SOLANA_ADDRESS, SOLANA_RPC_URL, PAYMENT_POLL_INTERVAL, ADMIN_REFRESH_INTERVAL,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, CONCURRENT_UPDATES,
+    METRICS_HOST, METRICS_PORT, PROFILE_HZ, PAYMENT_WINDOW_HOURS, COMPLETION_SLA_HOURS, SLA_WARNING_HOURS,
+    LIFECYCLE_CHECK_INTERVAL, WORKERS, WORKER_ID, LEASE_SECONDS, NEW_ORDER_POLL_INTERVAL, RATE_LIMIT,
+)
+
+from admins import AdminDirectory
+from cache import TTLCache
+from catalog import CATALOG, ADMIN_KEYBOARD, PACKAGE_CALLBACK_PATTERN, PACKAGE_KEYBOARD, PACKAGES_BY_CALLBACK, PACKAGES_BY_KEY
+from database import OrderRepository, init_db
+from lifecycle import APPROVED, CANCELLED, COMPLETED, can_transition
+from payments import PaymentVerifier, SolanaRpc, new_reference
+from persistence import SQLitePersistence
+from concurrency import PerUserUpdateProcessor
+from notifier import GLOBAL_RATE, Notifier
+from leader import LeaderLease
+import cluster
+import search
+from metrics import REGISTRY, InstrumentedRequest, MetricsServer, SamplingProfiler, instrument_handlers, timed
+from logs import bind, correlated, setup_logging
+from analytics import format_report
+from export import ExportError, filename as export_filename, parse_args as parse_export_args
+from storage import open_storage
+from throttle import SlidingWindowLimiter, Throttle
+from utils import prewarm_qr, send_payment_qr
+
+log = logging.getLogger(__name__)
 
 async def set_bot_commands(application):
     """Set command menu for the bot."""
@@ -19,6 +52,10 @@ async def set_bot_commands(application):
         BotCommand("start", "Start the bot 🚀"),
         BotCommand("approve", "Approve a pending order ✅ (Admin Only)"),
         BotCommand("complete", "Mark an order as completed 🎉"),
+        BotCommand("stats", "Sales, funnel and latency stats 📊 (Admin Only)"),
+        BotCommand("export", "Export orders as CSV/JSONL/Parquet 📤 (Admin Only)"),
+        BotCommand("admins", "List admins 👥 (Admin Only)"),
+        BotCommand("search", "Find orders by coin name, contract or link 🔎 (Admin Only)"),
     ]
     await application.bot.set_my_commands(commands)
 
@@ -27,63 +64,77 @@ CHOOSING_PACKAGE, ENTERING_DETAILS,CONFIRM_DETAILS, PAYMENT, PENDING_APPROVAL, W
 
 WAITING_ORDER_ID, WAITING_WEBSITE_LINK = 6, 7
 
+# Messages and keyboards that never change are built once and reused
+DETAILS_TEMPLATE = (
+    "📝 *Please fill in the details below.* If any information is not available, just leave it empty.\n\n"
+    "Coin Name: \n"
+    "Coin Tokenomics (e.g., supply, max supply, etc.): \n\n"
+    "Pump.fun link"
+    "Social Links:\n"
+    "Twitter: \n"
+    "Discord: \n"
+    "Telegram: \n"
+    "Other Relevant Links: \n\n"
+    "Once you're done, send the filled details in one message."
+)
+CONFIRM_DETAILS_KEYBOARD = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("✅ Confirm", callback_data="details_confirmed"),
+        InlineKeyboardButton("✏️ Edit", callback_data="edit_details")
+    ]
+])
+
+def payment_done_keyboard(checkout_id):
+    # The checkout id makes repeated taps on this button idempotent (see payment_confirmation)
+    return InlineKeyboardMarkup([[InlineKeyboardButton("✅ Payment Done", callback_data=f"payment_done_{checkout_id}")]])
+
+orders = open_storage()
+payment_verifier = PaymentVerifier(orders, SolanaRpc.from_config()) if SOLANA_RPC_URL else None
+notifier = Notifier(orders, GLOBAL_RATE / WORKERS, WORKER_ID, WORKERS)
+lease = LeaderLease(orders)
+admins = AdminDirectory(orders)
+# Orders placed by recent checkouts, so repeated "Payment Done" taps are answered without the database
+recent_checkouts = TTLCache(ttl=PAYMENT_WINDOW_HOURS * 3600)
+profiler = SamplingProfiler(PROFILE_HZ) if PROFILE_HZ else None
+metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT, profiler=profiler) if METRICS_PORT else None
+boot = StartupTimer()
+
 async def start(update: Update, context: CallbackContext):
     """Sends a welcome message and displays package options or approval button for admins."""
     user_name = update.message.from_user.full_name  # Get the user's full name
     user_id = update.message.from_user.id  # Get the user's Telegram ID
     
-    # Check if the user is the admin
-    if str(user_id) == str(ADMIN_USER_ID):
+    # Check if the user is an admin
+    if admins.is_admin(user_id):
         # If the user is the admin, show the approval button for pending orders
-        keyboard = [[InlineKeyboardButton("See Pending Orders", callback_data="see_pending_orders")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(f"Hello Admin {user_name}! 👑\n\nYou can see pending orders below:", reply_markup=reply_markup, parse_mode="Markdown")
+        await update.message.reply_text(f"Hello Admin {user_name}! 👑\n\nYou can see pending orders below:", reply_markup=ADMIN_KEYBOARD, parse_mode="Markdown")
     else:
         # Otherwise, show the regular package options
-        keyboard = [
-            [InlineKeyboardButton(f"{pkg['title']} - {pkg['price']}", callback_data=pkg["callback_data"])]
-            for pkg in PACKAGES
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(f"Hello {user_name}! 👋\n\n" + WELCOME_MESSAGE, reply_markup=reply_markup, parse_mode="Markdown")
+        await update.message.reply_text(f"Hello {user_name}! 👋\n\n" + WELCOME_MESSAGE, reply_markup=PACKAGE_KEYBOARD, parse_mode="Markdown")
 
 async def package_chosen(update: Update, context: CallbackContext):
     """Stores selected package and asks for coin details."""
     query = update.callback_query
     await query.answer()
     
-    # Get the full package details from config
-    selected_package = next(
-        pkg for pkg in PACKAGES 
-        if pkg['callback_data'] == query.data
-    )
+    # Get the full package details from the catalog
+    selected_package = PACKAGES_BY_CALLBACK[query.data]
     
+    orders.count_funnel_step("package_chosen")
+
     # Store both key and title for later use
     context.user_data['package'] = {
-        'key': selected_package['key'],
-        'title': selected_package['title']
+        'key': selected_package.key,
+        'title': selected_package.title
     }
 
     await query.message.reply_text(
-        f"📦 You selected: {selected_package['title']}\n\n"
+        f"📦 You selected: {selected_package.title}\n\n"
         "**Please copy the text below and fill it with your coin details.**",
         parse_mode="Markdown"
     )
 
-    template_message = (
-        "📝 *Please fill in the details below.* If any information is not available, just leave it empty.\n\n"
-        "Coin Name: \n"
-        "Coin Tokenomics (e.g., supply, max supply, etc.): \n\n"
-        "Pump.fun link"
-        "Social Links:\n"
-        "Twitter: \n"
-        "Discord: \n"
-        "Telegram: \n"
-        "Other Relevant Links: \n\n"
-        "Once you're done, send the filled details in one message."
-    )
-    
-    await query.message.reply_text(template_message)
+    await query.message.reply_text(DETAILS_TEMPLATE)
     return ENTERING_DETAILS
 
 async def receive_details(update: Update, context: CallbackContext):
@@ -101,6 +152,8 @@ async def receive_details(update: Update, context: CallbackContext):
             'received_at': datetime.now().isoformat()
         }
         
+        orders.count_funnel_step("details_received")
+
         # Show confirmation message
         confirmation_text = (
             "📝 *Please confirm your details:*\n\n"
@@ -108,16 +161,9 @@ async def receive_details(update: Update, context: CallbackContext):
             "Choose an option below:"
         )
         
-        keyboard = [
-            [
-                InlineKeyboardButton("✅ Confirm", callback_data="details_confirmed"),
-                InlineKeyboardButton("✏️ Edit", callback_data="edit_details")
-            ]
-        ]
-        
         await update.message.reply_text(
             confirmation_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=CONFIRM_DETAILS_KEYBOARD,
             parse_mode="Markdown"
         )
         
@@ -133,6 +179,7 @@ async def handle_confirmation(update: Update, context: CallbackContext):
     await query.answer()
     
     if query.data == "details_confirmed":
+        orders.count_funnel_step("details_confirmed")
         await query.edit_message_reply_markup()  
         return await proceed_to_payment(query.message, context)
     else:
@@ -147,32 +194,34 @@ async def proceed_to_payment(message: Message, context: CallbackContext):
         package_key = package_info.get('key')
         
         # Validate package
-        package = next(pkg for pkg in PACKAGES if pkg['key'] == package_key)
-        sol_amount = float(package['price'].replace(" SOL", ""))
+        package = PACKAGES_BY_KEY[package_key]
         
-        # Generate QR with order info
-        qr_code = generate_payment_qr(
+        # A Solana Pay reference lets the verifier find this transfer on-chain;
+        # keep it across edits so the customer pays against a single reference
+        reference = None
+        if payment_verifier:
+            reference = context.user_data.setdefault('payment_reference', new_reference())
+        checkout_id = context.user_data.setdefault('checkout_id', secrets.token_urlsafe(9))
+
+        # Send payment instructions (without a reference the QR is cached and reused after the first upload)
+        await send_payment_qr(
+            message,
             order_id=context.user_data.get('order_id', 'NEW'),
-            amount=sol_amount
-        )
-        
-        # Send payment instructions directly to the message
-        await message.reply_photo(
-            photo=qr_code,
-            caption=f"💸 Send *{sol_amount} SOL* to:\n`{SOLANA_ADDRESS}`",
+            amount=package.sol,
+            reference=reference,
+            caption=f"💸 Send *{package.sol} SOL* to:\n`{SOLANA_ADDRESS}`",
             parse_mode="Markdown"
         )
         
         # Create payment button
-        keyboard = [[InlineKeyboardButton("✅ Payment Done", callback_data="payment_done")]]
         await message.reply_text(
             "Click below after payment:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=payment_done_keyboard(checkout_id)
         )
         
         return PAYMENT
 
-    except StopIteration:
+    except KeyError:
         await message.reply_text("❌ Invalid package. Use /start to begin again.")
         return ConversationHandler.END
     except Exception as e:
@@ -181,8 +230,19 @@ async def proceed_to_payment(message: Message, context: CallbackContext):
 
 async def payment_confirmation(update: Update, context: CallbackContext):
     query = update.callback_query
+    # payment_done_<checkout id>; buttons sent before checkouts had ids carry none
+    checkout_id = query.data[len("payment_done_"):] or context.user_data.get('checkout_id')
+    order_id = recent_checkouts.get(checkout_id) if checkout_id else None
+    if order_id is None and checkout_id and 'coin_details' not in context.user_data:
+        # user_data is cleared once the order exists, so this tap is a repeat
+        # that memory no longer covers (e.g. from before a restart)
+        order_id = await orders.get_checkout_order_id(checkout_id)
+    if order_id is not None:
+        await query.answer(f"📦 Order #{order_id} was already received.")
+        return ConversationHandler.END
+
     await query.answer()
-    print('confirm payment confirmation')
+    log.debug("Payment marked as done")
     try:
         # Validate required data
         required_keys = ['package', 'coin_details']
@@ -192,18 +252,25 @@ async def payment_confirmation(update: Update, context: CallbackContext):
         
         # Get package details
         package_key = context.user_data['package'].get('key')
-        package = next(pkg for pkg in PACKAGES if pkg['key'] == package_key)
+        package = PACKAGES_BY_KEY.get(package_key)
+        if package is None:
+            raise KeyError(f"Unknown package {package_key}")
         
         # Get coin details
         coin_details = context.user_data['coin_details']['text']
         
         # Save to database
-        order_id = save_order(
+        order_id = await orders.save_order(
             user_id=query.from_user.id,
-            package=package['title'],
+            package=package.title,
             details=coin_details,
-            sol_amount=float(package['price'].replace(" SOL", ""))
+            sol_amount=package.sol_amount,
+            payment_reference=context.user_data.get('payment_reference'),
+            checkout_id=checkout_id
         )
+        if checkout_id:
+            recent_checkouts.put(checkout_id, order_id)
+        orders.count_funnel_step("payment_done")
         
         # Confirm payment
         await query.edit_message_text(
@@ -213,21 +280,25 @@ async def payment_confirmation(update: Update, context: CallbackContext):
         )
         
 
-        print(query.from_user.username,query.from_user.first_name)
-        # Notify admin
-        await context.bot.send_message(
-            chat_id=ADMIN_USER_ID,
-            text=f"🆕 New Order {order_id}\n"
-                f"Package: {package['title']}\n"
+        bind(order_id=order_id)
+        log.info("Order created", extra={"package": package.key, "username": query.from_user.username})
+        # Notify every admin (queued; folded into a digest per admin during spikes).
+        # With several workers the lease holder sends these instead, so each
+        # admin still gets one digest rather than one per worker.
+        if BOT_MODE != "worker":
+            notify_new_order(
+                f"🆕 New Order {order_id}\n"
+                f"Package: {package.title}\n"
                 f"User: @{query.from_user.username if query.from_user.username else query.from_user.first_name} (ID: {query.from_user.id})"
-        )
+                + duplicates_text(await orders.find_duplicates(order_id))
+            )
 
 
     except KeyError as e:
         await query.message.reply_text(f"❌ Missing data: {str(e)}. Start over with /start")
     except Exception as e:
         await query.message.reply_text("❌ Payment confirmation failed. Contact support.")
-        print(f"Payment error: {str(e)}")
+        log.exception("Payment confirmation failed")
     
     # Clear user data
     context.user_data.clear()
@@ -237,11 +308,21 @@ async def see_pending_orders(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
     
-    if str(query.from_user.id) != str(ADMIN_USER_ID):
+    if not admins.is_admin(query.from_user.id):
         await query.message.reply_text("🚫 Unauthorized.")
         return
 
-    pending_orders = get_all_pending_orders()
+    # Page callbacks carry the keyset cursor: pending_<next|prev>_<created_at>_<id>
+    cursor, direction = None, "next"
+    if query.data.startswith("pending_"):
+        _, direction, position = query.data.split("_", 2)
+        created_at, order_id = position.rsplit("_", 1)
+        cursor = (created_at, int(order_id))
+
+    pending_orders, has_prev, has_next = await orders.get_pending_orders_page(cursor, direction)
+    if not pending_orders and cursor is not None:
+        # The page emptied out under us (orders approved meanwhile); start over
+        pending_orders, has_prev, has_next = await orders.get_pending_orders_page()
     
     if not pending_orders:
         await query.edit_message_text("🎉 No pending orders!")
@@ -250,28 +331,25 @@ async def see_pending_orders(update: Update, context: CallbackContext):
     keyboard = []
 
     for order in pending_orders:
-        created_at = order['created_at']
-        
-        # 🛠️ Handle different types of timestamps
-        if isinstance(created_at, float) or isinstance(created_at, int):
-            # Convert Unix timestamp to datetime
-            order_time = datetime.fromtimestamp(created_at)
-        elif isinstance(created_at, str):
-            try:
-                order_time = datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                order_time = datetime.fromisoformat(created_at)  # Try ISO format
-        else:
-            order_time = datetime.now()  # Fallback to current time if unknown format
-
-        # Append button to the keyboard
+        # 🔒 marks orders another admin is working on
+        lock = "🔒 " if order.claimed_by_other(query.from_user.id) else ""
         keyboard.append([
             InlineKeyboardButton(
-                f"🆔 {order['id']} - {order_time.strftime('%d/%m %H:%M')}",
-                callback_data=f"view_order_{order['id']}"
+                f"{lock}🆔 {order.id} - {order.created_at.strftime('%d/%m %H:%M')}",
+                callback_data=f"view_order_{order.id}"
             )
         ])
 
+    # Add paging buttons
+    first, last = pending_orders[0], pending_orders[-1]
+    paging = []
+    if has_prev:
+        paging.append(InlineKeyboardButton("⬅️ Prev", callback_data="pending_prev_{}_{}".format(*first.cursor)))
+    if has_next:
+        paging.append(InlineKeyboardButton("Next ➡️", callback_data="pending_next_{}_{}".format(*last.cursor)))
+    if paging:
+        keyboard.append(paging)
+
     # Add back button
     keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="admin_back")])
     
@@ -281,32 +359,84 @@ async def see_pending_orders(update: Update, context: CallbackContext):
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode="Markdown"
     )
+def payment_received_text(order):
+    return (
+        f"🎉 *Payment Recieved!*\n\n"
+        f"🆔 Your Website ID: `{order.website_id}`\n"
+        f"⏳ Your website will be ready within {COMPLETION_SLA_HOURS:g} hours!\n\n"
+        f"📅 Expected completion: {order.due_at.strftime('%Y-%m-%d %H:%M')} UTC"
+    )
+
+def duplicates_text(order_ids):
+    """Warning line for orders submitted for the same coin, or nothing"""
+    if not order_ids:
+        return ""
+    return "\n⚠️ Same coin as order " + ", ".join(f"#{order_id}" for order_id in order_ids)
+
+def claimed_text(order):
+    return f"🔒 Order {order.id} is being handled by admin `{order.claimed_by}`"
+
 async def view_order(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
+    if not admins.is_admin(query.from_user.id):
+        await query.message.reply_text("🚫 Unauthorized.")
+        return
+
     order_id = query.data.split("_")[-1]
-    order = get_order_by_id(order_id)
+    # Opening an open order claims it, so other admins skip it meanwhile
+    order = await orders.claim_order(order_id, query.from_user.id) or await orders.get_order_by_id(order_id, fresh=True)
     
     if not order:
         await query.message.reply_text("❌ Order not found")
         return
+    await show_order(query, order)
+
+async def take_next_order(update: Update, context: CallbackContext):
+    """Claims the oldest pending order nobody is working on and opens it"""
+    query = update.callback_query
+    await query.answer()
+    if not admins.is_admin(query.from_user.id):
+        await query.message.reply_text("🚫 Unauthorized.")
+        return
+
+    order = await orders.claim_next_order(query.from_user.id)
+    if not order:
+        await query.edit_message_text(
+            "✅ Nothing left to pick up: every pending order is taken.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="admin_back")]]))
+        return
+    await show_order(query, order)
+
+async def show_order(query, order):
+    """Order details with the actions the admin behind ``query`` may take"""
+    order_id = order.id
+    claimed = order.claimed_by_other(query.from_user.id)
+    duplicates = await orders.find_duplicates(order_id)
     
     # Format order details
-    order_date = datetime.fromisoformat(order['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+    order_date = order.created_at.strftime('%Y-%m-%d %H:%M:%S')
     details = (
-        f"📄 *Order Details* 🆔 `{order['id']}`\n"
+        f"📄 *Order Details* 🆔 `{order.id}`\n"
         f"📅 *Date:* {order_date}\n"
-        f"💼 *Package:* {order['package']}\n"
-        f"👤 *User ID:* `{order['user_id']}`\n\n"
-        "📝 *Coin Details:*\n"
-        f"{order['coin_details']}"
+        f"💼 *Package:* {order.package}\n"
+        f"👤 *User ID:* `{order.user_id}`\n"
+        f"📌 *Status:* {order.status}\n"
+        + (claimed_text(order) + "\n" if claimed else "")
+        + (duplicates_text(duplicates).lstrip("\n") + "\n" if duplicates else "")
+        + "\n📝 *Coin Details:*\n"
+        f"{order.coin_details}"
     )
     
-    # Create action buttons
-    keyboard = [
-        [InlineKeyboardButton("✅ Approve Payment", callback_data=f"approve_{order_id}")],
-        [InlineKeyboardButton("🔙 Back to Orders", callback_data="see_pending_orders")]
-    ]
+    # Create action buttons for the moves the order can still make
+    keyboard = []
+    if not claimed:
+        if can_transition(order.status, APPROVED):
+            keyboard.append([InlineKeyboardButton("✅ Approve Payment", callback_data=f"approve_{order_id}")])
+        if can_transition(order.status, CANCELLED):
+            keyboard.append([InlineKeyboardButton("🗑 Cancel Order", callback_data=f"cancel_order_{order_id}")])
+            keyboard.append([InlineKeyboardButton("🔓 Release", callback_data=f"release_order_{order_id}")])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Orders", callback_data="see_pending_orders")])
     
     await query.edit_message_text(
         details,
@@ -314,48 +444,146 @@ async def view_order(update: Update, context: CallbackContext):
         parse_mode="Markdown"
     )
 
+async def refused_text(order_id, admin_id, action):
+    """Why a transition was refused: missing, claimed by another admin, or the wrong status"""
+    current = await orders.get_order_by_id(order_id, fresh=True)
+    if not current:
+        return "❌ Order not found"
+    if current.claimed_by_other(admin_id):
+        return claimed_text(current)
+    return f"⚠️ Order {order_id} is {current.status}, it can't be {action}"
+
 async def approve_order(update: Update, context: CallbackContext):
     query = update.callback_query
     await query.answer()
+    if not admins.is_admin(query.from_user.id):
+        await query.message.reply_text("🚫 Unauthorized.")
+        return
+
     order_id = query.data.split("_")[-1]
-    order = get_order_by_id(order_id)
+    bind(order_id=order_id)
+    
+    # Generate website ID (MLW-0001 format); the transition is refused if the
+    # order isn't pending any more (already approved, expired, cancelled...)
+    # or another admin has claimed it
+    website_id = f"MLW-{int(order_id):04d}"
+    order = await orders.transition(order_id, APPROVED, query.from_user.id, website_id=website_id)
     
     if not order:
-        await query.message.reply_text("❌ Order not found")
+        await query.message.reply_text(await refused_text(order_id, query.from_user.id, "approved"), parse_mode="Markdown")
         return
     
-    # Generate website ID (MLW-0001 format)
-    website_id = f"MLW-{int(order_id):04d}"
-    update_order_status(order_id, "approved", website_id)
-    
     # Notify admin
     await query.edit_message_text(
         f"✅ *Order Approved!*\n\n"
         f"🆔 Website ID: `{website_id}`\n"
-        f"📅 Due Date: {datetime.now().strftime('%Y-%m-%d 23:59:00')}",
+        f"📅 Due Date: {order.due_at.strftime('%Y-%m-%d %H:%M')} UTC",
         parse_mode="Markdown"
     )
     
     # Notify user
-    await context.bot.send_message(
-        chat_id=order['user_id'],
-        text=f"🎉 *Payment Recieved!*\n\n"
-            f"🆔 Your Website ID: `{website_id}`\n"
-            f"⏳ Your website will be ready within 24 hours!\n\n"
-            f"📅 Expected completion: {datetime.now().strftime('%Y-%m-%d 23:59:00')}",
-        parse_mode="Markdown"
-    )
+    notifier.send(order.user_id, payment_received_text(order), parse_mode="Markdown")
+
+async def cancel_order(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+    if not admins.is_admin(query.from_user.id):
+        await query.message.reply_text("🚫 Unauthorized.")
+        return
+
+    order_id = query.data.split("_")[-1]
+    bind(order_id=order_id)
+    order = await orders.transition(order_id, CANCELLED, query.from_user.id)
+    if not order:
+        await query.message.reply_text(await refused_text(order_id, query.from_user.id, "cancelled"), parse_mode="Markdown")
+        return
+
+    log.info("Order cancelled")
+    await query.edit_message_text(f"🗑 Order {order.id} cancelled.")
+    notifier.send(order.user_id, f"❌ Your order #{order.id} has been cancelled. Contact support if this is unexpected.")
+
+async def release_order(update: Update, context: CallbackContext):
+    query = update.callback_query
+    await query.answer()
+    if not admins.is_admin(query.from_user.id):
+        await query.message.reply_text("🚫 Unauthorized.")
+        return
+
+    order_id = query.data.split("_")[-1]
+    order = await orders.release_order(order_id, query.from_user.id)
+    await query.edit_message_text(
+        f"🔓 Order {order_id} released for other admins." if order else f"⚠️ You don't hold order {order_id}.",
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back to Orders", callback_data="see_pending_orders")]]))
+
+def notify_new_order(text):
+    for admin_id in admins.ids():
+        notifier.notify_new_order(admin_id, text)
+
+async def announce_new_orders(context: CallbackContext):
+    """Worker mode: alerts admins about orders placed on any worker."""
+    for order in await orders.take_new_orders("new_order_alerts"):
+        notify_new_order(f"🆕 New Order {order.id}\nPackage: {order.package}\nUser ID: {order.user_id}"
+                         + duplicates_text(await orders.find_duplicates(order.id)))
+
+async def renew_lease(context: CallbackContext):
+    await lease.renew()
+
+def leader_only(callback):
+    """Job wrapper: run ``callback`` only on the worker holding the lease"""
+    async def job(context: CallbackContext):
+        if lease.is_leader:
+            await callback(context)
+    job.__name__ = callback.__name__
+    return job
+
+def notify_admins(text, admin_ids=None):
+    """Queue ``text`` for every admin (or just ``admin_ids``)"""
+    for admin_id in admin_ids or admins.ids():
+        notifier.send(admin_id, text)
+
+async def verify_payments(context: CallbackContext):
+    """Approves orders whose Solana Pay transfer landed on-chain and notifies everyone."""
+    for order in await payment_verifier.poll():
+        notifier.send(order.user_id, payment_received_text(order), parse_mode="Markdown")
+        notify_admins(
+            f"💰 Order {order.id} paid on-chain and auto-approved\n"
+            f"Package: {order.package}\n"
+            f"Website ID: {order.website_id}\n"
+            f"Tx: {order.tx_signature}"
+        )
+
+async def expire_unpaid_orders(context: CallbackContext):
+    """Expires on-chain orders whose payment window has closed (reads only the due rows)."""
+    expired = await orders.expire_overdue()
+    for order in expired:
+        notifier.send(
+            order.user_id,
+            f"⌛ Order #{order.id} expired because no payment arrived within {PAYMENT_WINDOW_HOURS:g} hours.\n"
+            "Use /start to place a new order."
+        )
+    if expired:
+        log.info("Expired unpaid orders", extra={"count": len(expired)})
+
+async def remind_sla(context: CallbackContext):
+    """Pings once about each approved order nearing its completion deadline: the
+    admin who approved it, or every admin for orders approved on-chain."""
+    for order in await orders.claim_sla_warnings(SLA_WARNING_HOURS):
+        notify_admins(
+            f"⏰ Order {order.id} ({order.website_id}) is due {order.due_at.strftime('%Y-%m-%d %H:%M')} UTC\n"
+            f"Package: {order.package}\n"
+            "Complete it with /complete",
+            [order.claimed_by] if admins.is_admin(order.claimed_by) else None,
+        )
 
 async def complete_order(update: Update, context: CallbackContext):
-    print(f"Admin {update.effective_user.id} starting completion")
-    if str(update.effective_user.id) != str(ADMIN_USER_ID):
+    if not admins.is_admin(update.effective_user.id):
         await update.message.reply_text("🚫 Administrator only command")
         return ConversationHandler.END
         
+    log.info("Admin started order completion")
     await update.message.reply_text("📝 Enter the Order ID to complete:")
     return WAITING_ORDER_ID
 async def receive_order_id(update: Update, context: CallbackContext):
-    print("Admin receive_order_id triggered")
     order_id = update.message.text.strip()
     
     if not order_id.isdigit():
@@ -363,17 +591,24 @@ async def receive_order_id(update: Update, context: CallbackContext):
         return WAITING_ORDER_ID
 
     try:
-        order = get_order_by_id(int(order_id))
+        # Past the cache: in worker mode another process may have just changed the status
+        order = await orders.get_order_by_id(int(order_id), fresh=True)
         if not order:
             await update.message.reply_text("❌ Order not found. Try again:")
             return WAITING_ORDER_ID
+        if not can_transition(order.status, COMPLETED):
+            await update.message.reply_text(f"⚠️ Order {order.id} is {order.status}; only approved orders can be completed. Try again:")
+            return WAITING_ORDER_ID
+        if order.claimed_by_other(update.effective_user.id):
+            await update.message.reply_text(claimed_text(order) + ". Try another:", parse_mode="Markdown")
+            return WAITING_ORDER_ID
             
         context.user_data['completing_order'] = order_id
         await update.message.reply_text("🌐 Now send the website URL:")
         return WAITING_WEBSITE_LINK
 
     except Exception as e:
-        print(f"Order ID error: {str(e)}")
+        log.exception("Order lookup failed", extra={"order_id": order_id})
         await update.message.reply_text("❌ Database error. Try again.")
         return WAITING_ORDER_ID
     
@@ -381,6 +616,7 @@ async def receive_website_link(update: Update, context: CallbackContext):
     """Finalizes order completion and notifies user"""
     order_id = context.user_data['completing_order']
     website_url = update.message.text
+    bind(order_id=order_id)
     
     try:
         # First validate order ID is numeric
@@ -389,23 +625,17 @@ async def receive_website_link(update: Update, context: CallbackContext):
 
         order_id = int(order_id)
         
-        # Update database using the complete_order function
-        from database import complete_order, get_user_id_by_order_id
-        
-        if not complete_order(order_id, website_url):
-            raise ValueError("Failed to update database")
-
-        # Get user ID from order
-        user_id = get_user_id_by_order_id(order_id)
-        if not user_id:
-            raise ValueError("User not found for this order")
+        # Completing returns the updated order, so the user ID comes with it
+        order = await orders.complete_order(order_id, website_url, actor=update.effective_user.id)
+        if not order:
+            raise ValueError("Order is no longer approved or another admin has claimed it, so it can't be completed")
 
         # Notify user
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"🚀 Your website is ready!\n\n"
-                 f"🌐 {website_url}\n\n"
-                 f"Thank you for choosing MoonBuilder!"
+        notifier.send(
+            order.user_id,
+            f"🚀 Your website is ready!\n\n"
+            f"🌐 {website_url}\n\n"
+            f"Thank you for choosing MoonBuilder!"
         )
 
         # Confirm to admin
@@ -418,43 +648,262 @@ async def receive_website_link(update: Update, context: CallbackContext):
         await update.message.reply_text(f"❌ Error: {str(e)}")
     except Exception as e:
         await update.message.reply_text("❌ Critical error. Check logs.")
-        print(f"Completion error: {str(e)}")
+        log.exception("Order completion failed", extra={"order_id": order_id})
     
     context.user_data.clear()
     return ConversationHandler.END
+async def stats_command(update: Update, context: CallbackContext):
+    """Admin dashboard: orders and revenue per package/day, checkout funnel, latency percentiles"""
+    if not admins.is_admin(update.effective_user.id):
+        await update.message.reply_text("🚫 Administrator only command")
+        return
+
+    report = await orders.get_stats()
+    await update.message.reply_text(format_report(report), parse_mode="Markdown")
+
+async def search_command(update: Update, context: CallbackContext):
+    """/search <text>: orders whose coin details contain every word (coin name, ticker, contract, handle...)"""
+    if not admins.is_admin(update.effective_user.id):
+        await update.message.reply_text("🚫 Administrator only command")
+        return
+
+    text = " ".join(context.args)
+    if not text.strip():
+        await update.message.reply_text("Usage: /search <coin name, contract or link>")
+        return
+
+    results = await orders.search_orders(text)
+    if not results:
+        await update.message.reply_text(f"🤷 No orders match “{text}”.")
+        return
+
+    keyboard = [
+        [InlineKeyboardButton(
+            f"🆔 {order.id} - {search.coin_columns(order.coin_details)[0] or order.package} ({order.status})",
+            callback_data=f"view_order_{order.id}")]
+        for order in results
+    ]
+    await update.message.reply_text(f"🔎 {len(results)} orders match “{text}”:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def export_command(update: Update, context: CallbackContext):
+    """/export [csv|jsonl|parquet] [gz] [status=...] [from=YYYY-MM-DD] [to=YYYY-MM-DD]"""
+    if not admins.is_admin(update.effective_user.id):
+        await update.message.reply_text("🚫 Administrator only command")
+        return
+
+    try:
+        options = parse_export_args(context.args)
+    except ExportError as e:
+        await update.message.reply_text(f"❌ {e}")
+        return
+
+    await update.message.reply_text("⏳ Exporting orders...")
+    name = export_filename(**options)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, name)
+        try:
+            # Streams rows to disk on a worker thread; the event loop stays free
+            count = await orders.export(path, **options)
+        except ExportError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        if not count:
+            await update.message.reply_text("🤷 No orders match that filter.")
+            return
+
+        log.info("Exported orders", extra={"count": count, "export_format": options["fmt"]})
+        with open(path, "rb") as document:
+            await update.message.reply_document(document=document, filename=name, caption=f"📤 {count} orders")
+
+async def list_admins(update: Update, context: CallbackContext):
+    """/admins: who can work the order queue"""
+    if not admins.is_admin(update.effective_user.id):
+        await update.message.reply_text("🚫 Administrator only command")
+        return
+
+    lines = [f"{'👑' if role == 'owner' else '👤'} `{user_id}` ({role})" for user_id, role in sorted(admins.roles().items())]
+    await update.message.reply_text("👥 *Admins*\n\n" + "\n".join(lines), parse_mode="Markdown")
+
+async def change_admin(update: Update, context: CallbackContext):
+    """/addadmin <user_id> and /removeadmin <user_id> (owners only)"""
+    if not admins.is_owner(update.effective_user.id):
+        await update.message.reply_text("🚫 Owner only command")
+        return
+
+    command = update.message.text.split()[0].lstrip("/").split("@")[0]
+    if len(context.args) != 1 or not context.args[0].isdigit():
+        await update.message.reply_text(f"Usage: /{command} <user_id>")
+        return
+
+    user_id = int(context.args[0])
+    if command == "addadmin":
+        await admins.add(user_id, update.effective_user.id)
+        await update.message.reply_text(f"✅ {user_id} is now an admin.")
+    elif await admins.remove(user_id):
+        await update.message.reply_text(f"🗑 {user_id} is no longer an admin.")
+    else:
+        await update.message.reply_text(f"⚠️ {user_id} isn't a removable admin.")
+
+async def refresh_admins(context: CallbackContext):
+    """Picks up admins added or removed by other processes."""
+    await admins.refresh()
+
 async def cancel(update: Update, context: CallbackContext):
     """Cancels any ongoing operation"""
     await update.message.reply_text("❌ Operation cancelled.")
     context.user_data.clear()
     return ConversationHandler.END
-def main():
-    init_db()
-    application = Application.builder().token(BOT_TOKEN).build()
+async def post_init(application):
+    """Warm-up: starts what updates depend on concurrently and leaves the rest running in the background"""
+    boot.mark("initialize")
+    steps = {"storage": orders.start(), "admins": admins.start(), "notifier": notifier.start(application.bot)}
+    if metrics_server:
+        steps["metrics"] = metrics_server.start()
+    await boot.gather(steps)
+    if profiler:
+        profiler.start()
+    if metrics_server:
+        log.info("Serving metrics on http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+
+    deferred = {}
+    if not payment_verifier:
+        # Pre-rendering the payment QRs also pays for the qrcode/Pillow imports off the event loop.
+        # With the verifier every QR carries its checkout's reference, so there is nothing to warm
+        deferred["qr codes"] = asyncio.to_thread(prewarm_qr, [package.sol for package in CATALOG])
+    if BOT_MODE != "worker" or WORKER_ID == 0:
+        deferred["commands"] = set_bot_commands(application)  # one worker is enough
+    boot.defer(deferred)
+    boot.ready()
+
+async def post_stop(application):
+    """Lets queued notifications go out while the bot can still send them"""
+    await notifier.close()
+
+async def post_shutdown(application):
+    """Drain pending writes and release pooled connections and clients on shutdown"""
+    await lease.release()
+    await orders.shutdown()
+    if payment_verifier:
+        await payment_verifier.rpc.close()
+    if metrics_server:
+        await metrics_server.close()
+    if profiler:
+        profiler.stop()
+
+def build_application(request=None):
+    """Builds the Application with every handler and job registered.
+
+    ``request`` lets callers (e.g. the benchmarks) swap in their own Bot API
+    transport. Either way API calls go through InstrumentedRequest so their
+    latency shows up in /metrics; getUpdates long polls are left out.
+    """
+    builder = Application.builder().request(InstrumentedRequest(request or HTTPXRequest(connection_pool_size=256)))
+    if request is not None:
+        builder.get_updates_request(request)
+    application = (
+        builder
+        .token(BOT_TOKEN)
+        .persistence(SQLitePersistence(orders))
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
     admin_conv_handler = ConversationHandler(
         entry_points=[CommandHandler('complete', complete_order)],
         states={
             WAITING_ORDER_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_order_id)],
             WAITING_WEBSITE_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_website_link)]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name="admin_completion",
+        persistent=True
     )
+
     application.add_handler(admin_conv_handler)
+
+    # Anti-spam sees every update before the handlers below; admins are never throttled
+    if RATE_LIMIT:
+        application.add_handler(TypeHandler(Update, Throttle(SlidingWindowLimiter(), exempt=admins.is_admin)), group=-1)
     
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
-    application.add_handler(CallbackQueryHandler(package_chosen, pattern="basic_package|pro_package|custom_package"))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("admins", list_admins))
+    application.add_handler(CommandHandler(["addadmin", "removeadmin"], change_admin))
+    application.add_handler(CallbackQueryHandler(package_chosen, pattern=PACKAGE_CALLBACK_PATTERN))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, receive_details))
     application.add_handler(CallbackQueryHandler(handle_confirmation, pattern="^(details_confirmed|edit_details)$"))
-    application.add_handler(CallbackQueryHandler(payment_confirmation, pattern="^payment_done$"))
-    application.add_handler(CallbackQueryHandler(see_pending_orders, pattern="^see_pending_orders$"))
+    application.add_handler(CallbackQueryHandler(payment_confirmation, pattern="^payment_done(_[\\w-]+)?$"))
+    application.add_handler(CallbackQueryHandler(see_pending_orders, pattern="^(see_pending_orders|pending_(next|prev)_.+)$"))
     application.add_handler(CallbackQueryHandler(view_order, pattern="^view_order_"))
+    application.add_handler(CallbackQueryHandler(take_next_order, pattern="^take_next_order$"))
     application.add_handler(CallbackQueryHandler(approve_order, pattern="^approve_"))
+    application.add_handler(CallbackQueryHandler(cancel_order, pattern="^cancel_order_"))
+    application.add_handler(CallbackQueryHandler(release_order, pattern="^release_order_"))
     application.add_handler(CallbackQueryHandler(start, pattern="^admin_back$"))
 
+    instrument_handlers(application, lambda callback: timed(correlated(callback), callback.__name__))
+    REGISTRY.gauges("bot_updates", "Update processor state", application.update_processor.stats,
+                    counters=["processed"])
+    REGISTRY.gauges("bot_notifier", "Outbound notification counters", notifier.stats,
+                    counters=["sent", "retried", "failed"])
+    REGISTRY.gauges("bot_db", "Group-commit writer and order cache counters", orders.stats,
+                    counters=["commits", "writes", "cache_hits", "cache_misses"])
+
+    # Jobs that must run once however many workers there are go through the lease
+    jobs = application.job_queue
+    jobs.run_repeating(timed(renew_lease), interval=LEASE_SECONDS / 3, first=0)
+    if payment_verifier:
+        jobs.run_repeating(timed(leader_only(verify_payments)), interval=PAYMENT_POLL_INTERVAL, first=PAYMENT_POLL_INTERVAL)
+        # Manually approved orders have no payment deadline
+        jobs.run_repeating(timed(leader_only(expire_unpaid_orders)), interval=LIFECYCLE_CHECK_INTERVAL,
+                           first=LIFECYCLE_CHECK_INTERVAL)
+    jobs.run_repeating(timed(leader_only(remind_sla)), interval=LIFECYCLE_CHECK_INTERVAL, first=LIFECYCLE_CHECK_INTERVAL)
+    if BOT_MODE == "worker":
+        jobs.run_repeating(timed(leader_only(announce_new_orders)), interval=NEW_ORDER_POLL_INTERVAL, first=NEW_ORDER_POLL_INTERVAL)
+    jobs.run_repeating(timed(refresh_admins), interval=ADMIN_REFRESH_INTERVAL, first=ADMIN_REFRESH_INTERVAL)
+
+    return application
 
+def main():
+    setup_logging()
+    boot.mark("imports")
+    if isinstance(orders, OrderRepository):
+        # Before PTB loads persistence from it; the Postgres store creates its schema itself when it starts
+        init_db(orders.path)
+        boot.mark("schema")
+    if BOT_MODE == "cluster":
+        asyncio.run(cluster.run_cluster())
+        return
 
-    application.run_polling()
+    application = build_application()
+    if BOT_MODE == "worker":
+        asyncio.run(cluster.run_worker(application))
+        return
+
+    if BOT_MODE == "webhook":
+        if not (WEBHOOK_URL and WEBHOOK_SECRET):
+            raise SystemExit("Webhook mode needs WEBHOOK_URL and WEBHOOK_SECRET set")
+
+        # Telegram echoes the secret back in X-Telegram-Bot-Api-Secret-Token;
+        # PTB's webhook server rejects any request without it (403).
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
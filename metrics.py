@@ -0,0 +1,322 @@
+# metrics.py
+"""In-process metrics with a Prometheus text endpoint and a sampling profiler.
+
+Handlers, database helpers and Bot API calls record into the histograms and
+counters below; ``MetricsServer`` serves them at ``/metrics`` on a local
+port (plus ``/profile`` when the profiler runs) for Prometheus or curl.
+Everything is thread-safe because the database side records from its
+reader and writer threads.
+"""
+import asyncio
+import functools
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+from telegram.request import BaseRequest
+
+# Seconds; tuned for a chat bot where anything over a second is noticeable
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = {}  # prefix -> (help, collect, counter names)
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauges(self, prefix, help, collect, counters=()):
+        """Export ``collect()`` -> ``{name: number}`` as gauges named ``<prefix>_<name>``.
+
+        Names in ``counters`` only ever go up and are exported as counters named
+        ``<prefix>_<name>_total``. Registering a prefix again replaces its collector.
+        """
+        self._collectors[prefix] = (help, collect, frozenset(counters))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for prefix, (help, collect, counters) in self._collectors.items():
+            for key, value in collect().items():
+                kind = "counter" if key in counters else "gauge"
+                name = f"{prefix}_{key}_total" if key in counters else f"{prefix}_{key}"
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "Time spent in update handlers and jobs", ["handler"])
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Handlers and jobs that raised", ["handler"])
+DB_SECONDS = REGISTRY.histogram(
+    "bot_db_statement_seconds", "Time spent running a database helper", ["statement", "kind"])
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    "bot_db_commit_seconds", "Group-commit COMMIT duration (includes the fsync)")
+DB_BATCH_SIZE = REGISTRY.histogram(
+    "bot_db_commit_batch_size", "Writes per group commit", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+API_SECONDS = REGISTRY.histogram(
+    "bot_telegram_api_seconds", "Bot API request latency", ["method"])
+API_ERRORS = REGISTRY.counter(
+    "bot_telegram_api_errors_total", "Bot API requests that failed", ["method", "reason"])
+
+
+def timed(callback, name=None):
+    """Wrap a handler or job callback so its latency and failures are recorded"""
+    if getattr(callback, "__timed__", False):
+        return callback
+    name = name or callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except ApplicationHandlerStop:
+            raise  # flow control (e.g. the throttle dropping an update), not a failure
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    wrapper.__timed__ = True
+    return wrapper
+
+
+def _instrument_handler(handler, wrap):
+    if isinstance(handler, ConversationHandler):
+        nested = handler.entry_points + handler.fallbacks
+        for state_handlers in handler.states.values():
+            nested += state_handlers
+        for inner in nested:
+            _instrument_handler(inner, wrap)
+        return
+    if not getattr(handler.callback, "__timed__", False):
+        handler.callback = wrap(handler.callback)
+
+
+def instrument_handlers(application, wrap=timed):
+    """Apply ``wrap`` (timing by default) to every handler registered on
+    ``application``, including conversation states; ``wrap`` must return a
+    callback that went through ``timed``."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler, wrap)
+
+
+class InstrumentedRequest(BaseRequest):
+    """Wraps another BaseRequest and records per-method Bot API latency and errors"""
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    @property
+    def read_timeout(self):
+        return self._inner.read_timeout
+
+    async def initialize(self):
+        await self._inner.initialize()
+
+    async def shutdown(self):
+        await self._inner.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=BaseRequest.DEFAULT_NONE,
+                         write_timeout=BaseRequest.DEFAULT_NONE, connect_timeout=BaseRequest.DEFAULT_NONE,
+                         pool_timeout=BaseRequest.DEFAULT_NONE):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await self._inner.do_request(
+                url, method, request_data, read_timeout=read_timeout, write_timeout=write_timeout,
+                connect_timeout=connect_timeout, pool_timeout=pool_timeout)
+        except Exception as e:
+            API_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, api_method)
+        if code >= 400:
+            API_ERRORS.inc(api_method, str(code))
+        return code, payload
+
+
+class SamplingProfiler:
+    """Samples the event-loop thread's stack ``hz`` times a second.
+
+    Stacks are kept in folded form (``a;b;c count``), ready for flamegraph.pl
+    or speedscope. Sampling only reads ``sys._current_frames()``, so the
+    overhead stays a few microseconds per sample.
+    """
+
+    def __init__(self, hz=100, thread_id=None):
+        self.interval = 1.0 / hz
+        self.thread_id = thread_id
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling; by default the thread calling this (the event loop's)"""
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class MetricsServer:
+    """Tiny HTTP server for ``GET /metrics`` (and ``/profile``) on a local port"""
+
+    def __init__(self, host, port, registry=REGISTRY, profiler=None):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.profiler = profiler
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            path = request_line[1] if len(request_line) > 1 else ""
+            status, body = "200 OK", None
+            if path == "/metrics":
+                body = self.registry.render()
+            elif path == "/profile" and self.profiler:
+                body = self.profiler.folded()
+            else:
+                status, body = "404 Not Found", "not found\n"
+            data = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+            await writer.drain()
+        finally:
+            writer.close()
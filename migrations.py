@@ -0,0 +1,267 @@
+# migrations.py
+"""Versioned schema migrations for orders.db.
+
+The schema version lives in ``PRAGMA user_version``. Each migration is a
+list of steps (SQL strings or ``fn(conn)`` callables) applied in a single
+``BEGIN IMMEDIATE`` transaction together with the version bump, so a
+migration either lands completely or not at all. Several bot instances can
+start against the same file at once: the version is re-read after taking
+the write lock, and an instance that lost the race just skips the step.
+
+Keep migrations online-safe: WAL readers keep serving while a migration
+holds the write lock, so prefer steps that hold it briefly, e.g.
+``ALTER TABLE ... ADD COLUMN`` (a metadata-only change in SQLite) and one
+``CREATE INDEX IF NOT EXISTS`` per migration rather than table rewrites.
+"""
+import logging
+import re
+
+log = logging.getLogger(__name__)
+
+
+def add_column(table, column, definition):
+    """Step that adds a column unless a hand-edited database already has it"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return step
+
+
+# Migration 11's details parser, frozen as of that version: search.py may
+# parse differently later, but an old database must migrate the same way.
+_V11_LABELS = (
+    ("coin name", "name"), ("token name", "name"), ("name", "name"),
+    ("ticker", "ticker"), ("symbol", "ticker"),
+    ("coin tokenomics", "tokenomics"), ("tokenomics", "tokenomics"),
+    ("pump.fun", "pump_fun"), ("contract", "contract"), ("ca", "contract"), ("mint", "contract"),
+    ("twitter", "twitter"), ("x", "twitter"),
+    ("discord", "discord"),
+    ("telegram", "telegram"),
+    ("website", "website"), ("other relevant links", "other"), ("other", "other"),
+)
+_V11_SOLANA_ADDRESS = re.compile(r"(?<![1-9A-HJ-NP-Za-km-z])[1-9A-HJ-NP-Za-km-z]{32,44}(?![1-9A-HJ-NP-Za-km-z])")
+_V11_PUMP_FUN_URL = re.compile(r"(?:https?://)?(?:www\.)?pump\.fun/\S+", re.IGNORECASE)
+_V11_TERM = re.compile(r"\w+")
+_V11_LEADING_MARKS = re.compile(r"^\W+")
+
+
+def _v11_contract(text):
+    match = _V11_SOLANA_ADDRESS.search(text)
+    return match.group(0) if match else None
+
+
+def _v11_coin_columns(details):
+    """``(coin_name, coin_key, contract)`` for one order's details"""
+    fields = {}
+    for line in details.splitlines():
+        label, colon, value = line.partition(":")
+        label = _V11_LEADING_MARKS.sub("", label).strip().lower()
+        value = value.strip()
+        if colon and value and not value.startswith("//"):
+            field = next((field for prefix, field in _V11_LABELS
+                          if label == prefix or (len(prefix) > 2 and label.startswith(prefix))), None)
+            if field and field not in fields:
+                fields[field] = value
+                continue
+        if "pump_fun" not in fields and (link := _V11_PUMP_FUN_URL.search(line)):
+            fields["pump_fun"] = link.group(0)
+    contract = _v11_contract(fields.get("contract", "")) or _v11_contract(fields.get("pump_fun", "")) \
+        or _v11_contract(details)
+    name = fields.get("name") or fields.get("ticker")
+    key = "".join(_V11_TERM.findall((name or "").casefold())).replace("_", "") or None
+    return name, key, contract
+
+
+def index_coin_details(conn):
+    """Parse and index the coin details of orders saved before search existed"""
+    for order_id, details in conn.execute("SELECT id, coin_details FROM orders").fetchall():
+        coin_name, key, contract = _v11_coin_columns(details)
+        conn.execute("UPDATE orders SET coin_name = ?, coin_key = ?, contract = ? WHERE id = ?",
+                     (coin_name, key, contract, order_id))
+        conn.execute("INSERT INTO orders_fts (rowid, name, contract, details) VALUES (?, ?, ?, ?)",
+                     (order_id, coin_name or "", contract or "", details))
+
+
+MIGRATIONS = [
+    (1, "create orders table", [
+        '''CREATE TABLE IF NOT EXISTS orders
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 user_id INTEGER NOT NULL,
+                 package TEXT NOT NULL,
+                 coin_details TEXT NOT NULL,
+                 status TEXT DEFAULT 'pending',
+                 website_id TEXT,
+                 website_link TEXT,
+                 sol_amount REAL,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ]),
+    (2, "index pending orders by status and age", [
+        '''CREATE INDEX IF NOT EXISTS idx_orders_status_created
+                ON orders (status, created_at, id)''',
+    ]),
+    (3, "track when an order last changed", [
+        add_column("orders", "updated_at", "TIMESTAMP"),
+    ]),
+    (4, "solana pay references and transaction signatures", [
+        add_column("orders", "payment_reference", "TEXT"),
+        add_column("orders", "tx_signature", "TEXT"),
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_payment_reference
+                ON orders (payment_reference) WHERE payment_reference IS NOT NULL''',
+        # Only orders still waiting for an on-chain payment, so the verifier's
+        # poll never touches the rest of the table.
+        '''CREATE INDEX IF NOT EXISTS idx_orders_awaiting_payment
+                ON orders (id) WHERE status = 'pending' AND payment_reference IS NOT NULL''',
+    ]),
+    (5, "conversation state and user_data persistence", [
+        '''CREATE TABLE IF NOT EXISTS bot_persistence
+                (kind TEXT NOT NULL,
+                 name TEXT NOT NULL DEFAULT '',
+                 key TEXT NOT NULL,
+                 data BLOB NOT NULL,
+                 PRIMARY KEY (kind, name, key)) WITHOUT ROWID''',
+    ]),
+    (6, "outbox for undelivered notifications", [
+        '''CREATE TABLE IF NOT EXISTS outbox
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 chat_id INTEGER NOT NULL,
+                 text TEXT NOT NULL,
+                 parse_mode TEXT,
+                 attempts INTEGER NOT NULL DEFAULT 0,
+                 last_error TEXT,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ]),
+    (7, "transition timestamps and incremental analytics tables", [
+        add_column("orders", "approved_at", "TIMESTAMP"),
+        add_column("orders", "completed_at", "TIMESTAMP"),
+        # Orders and paid revenue per UTC day and package, kept current by
+        # the write helpers in database.py (see analytics.py)
+        '''CREATE TABLE IF NOT EXISTS stats_daily_package
+                (day TEXT NOT NULL,
+                 package TEXT NOT NULL,
+                 orders INTEGER NOT NULL DEFAULT 0,
+                 approved INTEGER NOT NULL DEFAULT 0,
+                 completed INTEGER NOT NULL DEFAULT 0,
+                 revenue_lamports INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (day, package)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS stats_funnel
+                (day TEXT NOT NULL,
+                 step TEXT NOT NULL,
+                 count INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (day, step)) WITHOUT ROWID''',
+        # Bucketed latency histograms; ``le`` is the bucket's upper bound in seconds
+        '''CREATE TABLE IF NOT EXISTS stats_latency
+                (metric TEXT NOT NULL,
+                 le INTEGER NOT NULL,
+                 count INTEGER NOT NULL DEFAULT 0,
+                 PRIMARY KEY (metric, le)) WITHOUT ROWID''',
+        # Seed the per-day table from the orders already in the database
+        '''INSERT OR IGNORE INTO stats_daily_package (day, package, orders, approved, completed, revenue_lamports)
+                SELECT date(created_at), package, COUNT(*),
+                       SUM(status IN ('approved', 'completed')), SUM(status = 'completed'),
+                       SUM(CASE WHEN status IN ('approved', 'completed')
+                                THEN CAST(round(sol_amount * 1000000000) AS INTEGER) ELSE 0 END)
+                FROM orders GROUP BY date(created_at), package''',
+    ]),
+    (8, "order lifecycle timestamps and deadlines", [
+        add_column("orders", "expired_at", "TIMESTAMP"),
+        add_column("orders", "cancelled_at", "TIMESTAMP"),
+        add_column("orders", "payment_due_at", "TIMESTAMP"),
+        add_column("orders", "due_at", "TIMESTAMP"),
+        add_column("orders", "sla_pinged_at", "TIMESTAMP"),
+        # Existing orders get the default 24h windows; only on-chain payments can run out
+        '''UPDATE orders SET payment_due_at = datetime(created_at, '+24 hours')
+                WHERE status = 'pending' AND payment_reference IS NOT NULL AND payment_due_at IS NULL''',
+        '''UPDATE orders SET due_at = datetime(COALESCE(approved_at, updated_at, created_at), '+24 hours')
+                WHERE status = 'approved' AND due_at IS NULL''',
+        # Only open orders are indexed, so the expiry and SLA sweeps read just
+        # the rows whose deadline has come instead of scanning the table
+        '''CREATE INDEX IF NOT EXISTS idx_orders_payment_due
+                ON orders (payment_due_at) WHERE status = 'pending' ''',
+        '''CREATE INDEX IF NOT EXISTS idx_orders_sla_due
+                ON orders (due_at) WHERE status = 'approved' AND sla_pinged_at IS NULL''',
+    ]),
+    (9, "admin roles and order claims", [
+        '''CREATE TABLE IF NOT EXISTS admins
+                (user_id INTEGER PRIMARY KEY,
+                 role TEXT NOT NULL DEFAULT 'admin',
+                 added_by INTEGER,
+                 added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        # The admin currently working an order, so several admins can share the queue
+        add_column("orders", "claimed_by", "INTEGER"),
+        add_column("orders", "claimed_at", "TIMESTAMP"),
+    ]),
+    (10, "leases and job cursors for multiple workers", [
+        '''CREATE TABLE IF NOT EXISTS leases
+                (name TEXT PRIMARY KEY,
+                 holder TEXT NOT NULL,
+                 expires_at TIMESTAMP NOT NULL)''',
+        # How far a singleton job (e.g. new-order alerts) has got through the orders
+        '''CREATE TABLE IF NOT EXISTS job_cursors
+                (name TEXT PRIMARY KEY,
+                 position INTEGER NOT NULL)''',
+    ]),
+    (11, "parsed coin details and full-text search", [
+        add_column("orders", "coin_name", "TEXT"),
+        add_column("orders", "coin_key", "TEXT"),
+        add_column("orders", "contract", "TEXT"),
+        # Contentless: the text lives in orders, the index only maps words to order ids
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5
+                (name, contract, details, content='', tokenize='unicode61 remove_diacritics 2')''',
+        index_coin_details,
+    ]),
+    (12, "find orders for the same coin by name", [
+        "CREATE INDEX IF NOT EXISTS idx_orders_coin_key ON orders (coin_key) WHERE coin_key IS NOT NULL",
+    ]),
+    (13, "find orders for the same coin by contract", [
+        "CREATE INDEX IF NOT EXISTS idx_orders_contract ON orders (contract) WHERE contract IS NOT NULL",
+    ]),
+    (14, "idempotent checkouts", [
+        # One order per checkout, however often "Payment Done" is pressed
+        add_column("orders", "checkout_id", "TEXT"),
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_checkout
+                ON orders (checkout_id) WHERE checkout_id IS NOT NULL''',
+    ]),
+    (15, "outbox rows owned by a worker", [
+        add_column("outbox", "worker", "INTEGER"),
+    ]),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply every migration newer than the database's user_version.
+
+    Returns the list of versions applied by this call.
+    """
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # transactions are managed explicitly below
+    applied = []
+    try:
+        for version, description, steps in migrations:
+            if version <= schema_version(conn):
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another instance may have migrated while we waited for the lock
+                if version <= schema_version(conn):
+                    conn.execute("ROLLBACK")
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            log.info("Applied migration %d: %s", version, description)
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
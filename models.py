@@ -0,0 +1,78 @@
+# models.py
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from config import ORDER_CLAIM_MINUTES
+
+# Explicit column list shared by every query that builds an Order, so the
+# positional mapping in Order.from_row can't drift from the schema.
+ORDER_COLUMNS = ("id, user_id, package, coin_details, status, website_id, website_link, sol_amount, "
+                 "created_at, updated_at, payment_reference, tx_signature, approved_at, completed_at, "
+                 "expired_at, cancelled_at, payment_due_at, due_at, sla_pinged_at, claimed_by, claimed_at")
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # what SQLite's CURRENT_TIMESTAMP stores (UTC)
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, timezone.utc)
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+
+def format_timestamp(value: datetime) -> str:
+    """Inverse of parse_timestamp, for binding a datetime back into a query"""
+    return value.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+@dataclass(frozen=True)
+class Order:
+    """One row of the orders table; timestamps are parsed to aware UTC datetimes"""
+    __slots__ = ("id", "user_id", "package", "coin_details", "status", "website_id", "website_link",
+                 "sol_amount", "created_at", "updated_at", "payment_reference", "tx_signature",
+                 "approved_at", "completed_at", "expired_at", "cancelled_at", "payment_due_at", "due_at",
+                 "sla_pinged_at", "claimed_by", "claimed_at")
+    id: int
+    user_id: int
+    package: str
+    coin_details: str
+    status: str
+    website_id: Optional[str]
+    website_link: Optional[str]
+    sol_amount: float
+    created_at: datetime
+    updated_at: Optional[datetime]
+    payment_reference: Optional[str]
+    tx_signature: Optional[str]
+    approved_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    expired_at: Optional[datetime]
+    cancelled_at: Optional[datetime]
+    payment_due_at: Optional[datetime]
+    due_at: Optional[datetime]
+    sla_pinged_at: Optional[datetime]
+    claimed_by: Optional[int]
+    claimed_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a row selected with ORDER_COLUMNS"""
+        return cls(*[parse_timestamp(value) if is_timestamp else value
+                     for value, is_timestamp in zip(row, _TIMESTAMP_MASK)])
+
+    @property
+    def cursor(self):
+        """Keyset position ``(created_at as stored, id)`` for paging"""
+        return format_timestamp(self.created_at), self.id
+
+    def claimed_by_other(self, admin_id, now=None):
+        """Whether another admin holds an unexpired claim (see OrderRepository.claim_order)"""
+        if self.claimed_by is None or self.claimed_by == int(admin_id):
+            return False
+        now = now or datetime.now(timezone.utc)
+        return (now - self.claimed_at).total_seconds() < ORDER_CLAIM_MINUTES * 60
+
+
+_TIMESTAMP_MASK = tuple(name.endswith("_at") for name in Order.__slots__)
@@ -0,0 +1,256 @@
+# notifier.py
+"""Rate-limited, retrying delivery of outbound bot messages.
+
+Handlers hand notifications (admin alerts, "payment received", "website
+ready") to the Notifier instead of awaiting ``bot.send_message`` inline, so a
+429 or a timeout never fails the handler. Each chat gets its own FIFO drained
+by one task, paced by a per-chat token bucket plus a bot-wide one matching
+Telegram's limits. Failed sends are retried with backoff (honouring
+``retry_after``).
+
+Each message gets an ``outbox`` row before its first send, and the row is
+deleted once the message is delivered or permanently rejected, so a crash
+doesn't lose it. Rows belong to the worker that wrote them and are re-queued,
+with their attempt count, when that worker starts again; messages still
+undelivered after MAX_ATTEMPTS tries wait there for the next start.
+New-order alerts are folded into a single digest message during spikes.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+GLOBAL_RATE = 30        # messages/second across all chats
+CHAT_RATE = 1           # messages/second to one chat ...
+CHAT_BURST = 3          # ... allowing a short burst
+MAX_ATTEMPTS = 5        # tries per run before a message waits in the outbox for the next start
+BASE_BACKOFF = 1.0      # seconds, doubled per failed attempt
+DIGEST_WINDOW = 30      # seconds during which new-order alerts are batched
+DIGEST_MAX_LINES = 30
+STOP_GRACE = 5          # seconds to keep delivering when the bot stops
+
+log = logging.getLogger(__name__)
+
+# Rows written before worker ids existed, or by workers the cluster no longer runs, go to whoever starts first
+CLAIM_OUTBOX = "UPDATE outbox SET worker = ? WHERE worker IS NULL OR worker >= ?"
+SELECT_OUTBOX = "SELECT id, chat_id, text, parse_mode, attempts FROM outbox WHERE worker = ? ORDER BY id"
+INSERT_OUTBOX = '''INSERT INTO outbox (chat_id, text, parse_mode, attempts, last_error, worker)
+                VALUES (?, ?, ?, ?, ?, ?)'''
+UPDATE_OUTBOX = "UPDATE outbox SET attempts = ?, last_error = ? WHERE id = ?"
+DELETE_OUTBOX = "DELETE FROM outbox WHERE id = ?"
+
+
+def _load_outbox(conn, worker, workers):
+    conn.execute(CLAIM_OUTBOX, (worker, workers))
+    return conn.execute(SELECT_OUTBOX, (worker,)).fetchall()
+
+
+def _add_outbox(conn, chat_id, text, parse_mode, worker):
+    return conn.execute(INSERT_OUTBOX, (chat_id, text, parse_mode, 0, None, worker)).lastrowid
+
+
+def _save_outbox(conn, messages):
+    conn.executemany(INSERT_OUTBOX, messages)
+
+
+def _update_outbox(conn, row_id, attempts, error):
+    conn.execute(UPDATE_OUTBOX, (attempts, error, row_id))
+
+
+def _delete_outbox(conn, row_id):
+    conn.execute(DELETE_OUTBOX, (row_id,))
+
+
+def _seconds(retry_after):
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+class TokenBucket:
+    """Reservation-style token bucket: callers wait their turn in FIFO order"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Take a token and return how long to wait before using it"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self):
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class Notifier:
+    def __init__(self, repository, global_rate=GLOBAL_RATE, worker=0, workers=1):
+        self.repository = repository
+        self.worker = worker
+        self.workers = workers
+        self.bot = None
+        # With several workers each gets a share of the bot-wide limit
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._chat_buckets = {}
+        self._queues = {}      # chat_id -> deque of [text, parse_mode, attempts, outbox row id]
+        self._drainers = {}    # chat_id -> task delivering that chat's queue
+        self._paused_until = 0.0
+        self._digests = {}     # chat_id -> buffered new-order lines
+        self._digest_tasks = {}
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def start(self, bot):
+        """Attach the bot and re-queue whatever this worker's previous run left in the outbox"""
+        self.bot = bot
+        for row_id, chat_id, text, parse_mode, attempts in await self.repository.run_write(
+                _load_outbox, self.worker, self.workers):
+            self._enqueue(chat_id, [text, parse_mode, attempts, row_id])
+
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self):
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed, "pending": self.pending()}
+
+    def send(self, chat_id, text, parse_mode=None):
+        """Queue a message; delivery happens in the background"""
+        if chat_id is None:
+            return
+        if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)  # ADMIN_USER_ID comes from the environment as a string
+        self._enqueue(chat_id, [text, parse_mode, 0, None])
+
+    def _enqueue(self, chat_id, message):
+        self._queues.setdefault(chat_id, deque()).append(message)
+        task = self._drainers.get(chat_id)
+        if task is None or task.done():
+            self._drainers[chat_id] = asyncio.get_running_loop().create_task(self._drain(chat_id))
+
+    def notify_new_order(self, chat_id, text):
+        """Admin new-order alert: sent right away when quiet, folded into digests in a spike"""
+        if chat_id in self._digest_tasks:
+            self._digests.setdefault(chat_id, []).append(text)
+            return
+        self.send(chat_id, text)
+        self._digest_tasks[chat_id] = asyncio.get_running_loop().create_task(self._digest_window(chat_id))
+
+    async def _digest_window(self, chat_id):
+        try:
+            while True:
+                await asyncio.sleep(DIGEST_WINDOW)
+                lines = self._digests.pop(chat_id, [])
+                if not lines:
+                    return
+                if len(lines) == 1:
+                    self.send(chat_id, lines[0])
+                    continue
+                shown = [line.replace("\n", " | ") for line in lines[:DIGEST_MAX_LINES]]
+                more = len(lines) - len(shown)
+                self.send(chat_id, f"🆕 {len(lines)} new orders in the last {DIGEST_WINDOW}s:\n\n"
+                          + "\n".join(shown) + (f"\n… and {more} more" if more else ""))
+        finally:
+            self._digest_tasks.pop(chat_id, None)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10_000:
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.idle()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return bucket
+
+    async def _drain(self, chat_id):
+        queue = self._queues[chat_id]
+        while queue:
+            message = queue[0]
+            await self._chat_bucket(chat_id).acquire()
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self._global.acquire()
+            text, parse_mode, attempts, row_id = message
+            if row_id is None:
+                row_id = message[3] = await self._outbox(_add_outbox, chat_id, text, parse_mode, self.worker)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+            except RetryAfter as e:
+                # Flood control applies to the whole bot; hold every chat back
+                self._paused_until = max(self._paused_until, time.monotonic() + _seconds(e.retry_after))
+                self.retried += 1
+                continue
+            except (Forbidden, BadRequest) as e:
+                # Blocked by the user or malformed: retrying won't help
+                log.warning("Dropping message: %s", e, extra={"to_chat_id": chat_id})
+                self.failed += 1
+            except NetworkError as e:
+                attempts = message[2] = attempts + 1
+                if row_id is not None:
+                    await self._outbox(_update_outbox, row_id, attempts, str(e))
+                # The stored count carries over restarts; each run gets MAX_ATTEMPTS more tries
+                if attempts % MAX_ATTEMPTS:
+                    self.retried += 1
+                    await asyncio.sleep(BASE_BACKOFF * 2 ** (attempts % MAX_ATTEMPTS - 1))
+                    continue
+                log.warning("Giving up on message after %d attempts: %s", attempts, e, extra={"to_chat_id": chat_id})
+                self.failed += 1
+                queue.popleft()
+                if row_id is None:
+                    await self._outbox(_save_outbox, [(chat_id, text, parse_mode, attempts, str(e), self.worker)])
+                continue  # its row stays for the next start
+            except TelegramError as e:
+                log.warning("Dropping message: %s", e, extra={"to_chat_id": chat_id})
+                self.failed += 1
+            except Exception:
+                log.exception("Dropping message after an unexpected error", extra={"to_chat_id": chat_id})
+                self.failed += 1
+            else:
+                self.sent += 1
+            queue.popleft()
+            if row_id is not None:
+                await self._outbox(_delete_outbox, row_id)
+        del self._queues[chat_id]
+        self._drainers.pop(chat_id, None)
+
+    async def _outbox(self, fn, *args):
+        """Outbox write that never stops delivery: failures are logged and the message goes out anyway"""
+        try:
+            return await self.repository.run_write(fn, *args)
+        except Exception:
+            log.exception("Outbox write failed")
+
+    async def close(self, grace=STOP_GRACE):
+        """Give queued messages a moment to go out, then save the ones without an outbox row yet"""
+        for task in list(self._digest_tasks.values()):
+            task.cancel()
+        digests, self._digests = self._digests, {}
+        for chat_id, lines in digests.items():
+            for line in lines:
+                self.send(chat_id, line)
+
+        drainers = [task for task in self._drainers.values() if not task.done()]
+        if drainers:
+            await asyncio.wait(drainers, timeout=grace)
+        for task in drainers:
+            task.cancel()
+        await asyncio.gather(*drainers, return_exceptions=True)
+
+        leftovers = [(chat_id, text, parse_mode, attempts, None, self.worker)
+                     for chat_id, queue in self._queues.items()
+                     for text, parse_mode, attempts, row_id in queue if row_id is None]
+        self._queues.clear()
+        self._drainers.clear()
+        if leftovers:
+            await self.repository.run_write(_save_outbox, leftovers)
+            log.info("Saved %d undelivered messages to the outbox", len(leftovers))
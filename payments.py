@@ -0,0 +1,215 @@
+# payments.py
+"""On-chain payment verification for Solana Pay transfers.
+
+Every order gets a random Solana Pay ``reference`` key that the customer's
+wallet attaches to the transfer. A background job polls the RPC node for all
+open references at once (JSON-RPC batches of ``getSignaturesForAddress``),
+confirms the amount with a batched ``getTransaction`` and approves the order.
+Orders that haven't been paid yet back off exponentially, so a long tail of
+abandoned checkouts doesn't cost an RPC call every tick.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from decimal import Decimal
+
+import httpx
+
+from catalog import LAMPORTS_PER_SOL
+from config import SOLANA_ADDRESS, SOLANA_RPC_URL
+
+RPC_BATCH_SIZE = 50
+MIN_BACKOFF = 5      # seconds before re-checking an order that wasn't paid yet
+MAX_BACKOFF = 300
+
+log = logging.getLogger(__name__)
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def b58encode(data: bytes) -> str:
+    n = int.from_bytes(data, "big")
+    out = ""
+    while n:
+        n, rem = divmod(n, 58)
+        out = B58_ALPHABET[rem] + out
+    leading_zeros = len(data) - len(data.lstrip(b"\0"))
+    return "1" * leading_zeros + out
+
+
+def new_reference() -> str:
+    """A fresh 32-byte Solana Pay reference key, base58 encoded like a public key"""
+    return b58encode(os.urandom(32))
+
+
+def to_lamports(sol_amount) -> int:
+    return int(Decimal(str(sol_amount)) * LAMPORTS_PER_SOL)
+
+
+class RpcError(Exception):
+    pass
+
+
+class SolanaRpc:
+    """Minimal JSON-RPC client that sends calls as batches"""
+
+    def __init__(self, url, transport=None, timeout=10.0):
+        self.url = url
+        self._client = httpx.AsyncClient(transport=transport, timeout=timeout)
+
+    @classmethod
+    def from_config(cls, url=SOLANA_RPC_URL):
+        if url == "stub":
+            return cls("http://stub.invalid", transport=stub_transport())
+        return cls(url)
+
+    async def batch(self, calls):
+        """Send ``[(method, params), ...]`` in one request; results come back in order"""
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        response = await self._client.post(self.url, json=payload)
+        if response.status_code == 429:
+            raise RpcError("RPC rate limited")
+        response.raise_for_status()
+        body = response.json()
+        if not isinstance(body, list):
+            # Nodes answer a rate-limited or rejected batch with a single error object
+            error = body.get("error") if isinstance(body, dict) else None
+            raise RpcError(f"RPC batch failed: {error or body!r}")
+        by_id = {item.get("id"): item for item in body if isinstance(item, dict)}
+        return [by_id.get(i, {}).get("result") for i in range(len(calls))]
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def received_lamports(tx, recipient):
+    """Lamports ``recipient`` gained in a successful transaction; 0 for a missing or malformed one"""
+    try:
+        meta = tx["meta"]
+        if meta.get("err") is not None:
+            return 0
+        keys = [key if isinstance(key, str) else key["pubkey"]
+                for key in tx["transaction"]["message"]["accountKeys"]]
+        loaded = meta.get("loadedAddresses") or {}
+        keys += loaded.get("writable", []) + loaded.get("readonly", [])
+        i = keys.index(recipient)
+        return meta["postBalances"][i] - meta["preBalances"][i]
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError):
+        # null (not found yet), a shape we don't know, or no transfer to the recipient
+        return 0
+
+
+class PaymentVerifier:
+    """Finds Solana Pay transfers for pending orders and approves them"""
+
+    def __init__(self, repository, rpc, recipient=SOLANA_ADDRESS):
+        self.repository = repository
+        self.rpc = rpc
+        self.recipient = recipient
+        self._next_check = {}  # order_id -> (monotonic due time, current delay)
+        self._rpc_delay = 0
+        self._rpc_paused_until = 0.0
+
+    def _defer(self, order_id, now):
+        _, delay = self._next_check.get(order_id, (0, 0))
+        delay = min(max(delay * 2, MIN_BACKOFF), MAX_BACKOFF)
+        self._next_check[order_id] = (now + delay, delay)
+
+    async def poll(self):
+        """Check every due order once; returns the orders approved by this poll"""
+        now = time.monotonic()
+        if now < self._rpc_paused_until:
+            return []
+
+        orders = await self.repository.get_awaiting_payment()
+        open_ids = {order.id for order in orders}
+        for order_id in list(self._next_check):
+            if order_id not in open_ids:
+                del self._next_check[order_id]
+        due = [o for o in orders if self._next_check.get(o.id, (0, 0))[0] <= now]
+
+        paid = []
+        try:
+            for start in range(0, len(due), RPC_BATCH_SIZE):
+                paid += await self._check(due[start:start + RPC_BATCH_SIZE], now)
+        except (httpx.HTTPError, RpcError, ValueError) as e:
+            # Back off the whole poller, not just one order, when the node struggles
+            self._rpc_delay = min(max(self._rpc_delay * 2, MIN_BACKOFF), MAX_BACKOFF)
+            self._rpc_paused_until = now + self._rpc_delay
+            log.warning("Payment RPC error, pausing %ds: %s", self._rpc_delay, e)
+        else:
+            self._rpc_delay = 0
+        return paid
+
+    async def _check(self, orders, now):
+        signatures = await self.rpc.batch([
+            ("getSignaturesForAddress", [order.payment_reference, {"limit": 5, "commitment": "confirmed"}])
+            for order in orders
+        ])
+        candidates = []
+        for order, found in zip(orders, signatures):
+            found = found if isinstance(found, list) else []
+            signature = next((s.get("signature") for s in found if isinstance(s, dict) and s.get("err") is None), None)
+            if signature:
+                candidates.append((order, signature))
+            else:
+                self._defer(order.id, now)
+        if not candidates:
+            return []
+
+        transactions = await self.rpc.batch([
+            ("getTransaction", [signature, {"encoding": "json", "commitment": "confirmed",
+                                            "maxSupportedTransactionVersion": 0}])
+            for _, signature in candidates
+        ])
+        confirmed = []
+        for (order, signature), tx in zip(candidates, transactions):
+            if received_lamports(tx, self.recipient) >= to_lamports(order.sol_amount):
+                confirmed.append((order, signature))
+            else:
+                self._defer(order.id, now)
+
+        # Issued together so the group-commit writer approves them in one
+        # transaction; an order approved or expired meanwhile comes back None
+        approved = await asyncio.gather(*(
+            self.repository.mark_order_paid(order.id, f"MLW-{order.id:04d}", signature)
+            for order, signature in confirmed
+        ))
+        return [order for order in approved if order]
+
+
+def stub_transport(payments=None):
+    """httpx transport that answers like an RPC node, for local runs without a cluster.
+
+    ``payments`` maps reference -> lamports paid to SOLANA_ADDRESS. With the
+    default of ``None`` every reference reads as paid in full.
+    """
+    def lamports_for(reference):
+        if payments is None:
+            return 1000 * LAMPORTS_PER_SOL
+        return payments.get(reference)
+
+    def handler(request):
+        results = []
+        for call in json.loads(request.content):
+            method, params = call["method"], call["params"]
+            result = None
+            if method == "getSignaturesForAddress":
+                paid = lamports_for(params[0]) is not None
+                result = [{"signature": f"stub-{params[0]}", "err": None,
+                           "confirmationStatus": "finalized"}] if paid else []
+            elif method == "getTransaction":
+                lamports = lamports_for(params[0][len("stub-"):]) or 0
+                result = {
+                    "meta": {"err": None, "preBalances": [lamports, 0], "postBalances": [0, lamports]},
+                    "transaction": {"message": {"accountKeys": ["StubPayer1111111111111111111111111111111111", SOLANA_ADDRESS]}},
+                }
+            results.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        return httpx.Response(200, json=results)
+
+    return httpx.MockTransport(handler)
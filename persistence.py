@@ -0,0 +1,134 @@
+# persistence.py
+"""SQLite-backed persistence for python-telegram-bot.
+
+Keeps ``user_data`` and ConversationHandler states in orders.db so a restart
+doesn't drop customers halfway through checkout. Unlike PicklePersistence,
+which re-dumps everything on every save, this only writes the rows PTB marks
+dirty: updates are buffered briefly and flushed as one transaction through
+the repository's group-commit writer. Empty user_data (the common case once
+an order is placed) is deleted rather than stored, so startup only loads
+users who are actually mid-flow, and conversation states are only loaded
+when their handler asks for them.
+"""
+import asyncio
+import json
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+PERSISTENCE_INTERVAL = 5  # seconds between PTB handing us dirty data
+FLUSH_DELAY = 1.0         # gather everything from one PTB run into a single commit
+
+SELECT_KIND = "SELECT key, data FROM bot_persistence WHERE kind = ? AND name = ?"
+UPSERT = '''INSERT INTO bot_persistence (kind, name, key, data) VALUES (?, ?, ?, ?)
+                ON CONFLICT (kind, name, key) DO UPDATE SET data = excluded.data'''
+DELETE = "DELETE FROM bot_persistence WHERE kind = ? AND name = ? AND key = ?"
+
+
+def _load(conn, kind, name=""):
+    return [(key, pickle.loads(data)) for key, data in conn.execute(SELECT_KIND, (kind, name))]
+
+
+def _store(conn, pending):
+    for (kind, name, key), value in pending:
+        if value is None:
+            conn.execute(DELETE, (kind, name, key))
+        else:
+            conn.execute(UPSERT, (kind, name, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+
+class SQLitePersistence(BasePersistence):
+    """Incremental, debounced persistence stored next to the orders"""
+
+    def __init__(self, repository, update_interval=PERSISTENCE_INTERVAL, flush_delay=FLUSH_DELAY,
+                 store_data=None):
+        super().__init__(
+            store_data=store_data or PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.repository = repository
+        self.flush_delay = flush_delay
+        self._pending = {}  # (kind, name, key) -> value, or None to delete the row
+        self._flush_task = None
+        self._writing = False   # the flush task has taken a batch out of _pending
+        self._closing = False
+
+    def _mark(self, kind, key, value, name=""):
+        self._pending[(kind, name, str(key))] = value
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # _mark doesn't start another task while this one runs, so keep going
+        # until nothing marked during a write is left behind
+        while self._pending and not self._closing:
+            await asyncio.sleep(self.flush_delay)
+            self._writing = True
+            try:
+                await self._write_pending()
+            finally:
+                self._writing = False
+
+    async def _write_pending(self):
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self.repository.run_write(_store, list(pending.items()))
+
+    async def get_user_data(self):
+        return {int(key): data for key, data in await self.repository.run_read(_load, "user")}
+
+    async def get_chat_data(self):
+        return {int(key): data for key, data in await self.repository.run_read(_load, "chat")}
+
+    async def get_bot_data(self):
+        rows = await self.repository.run_read(_load, "bot")
+        return rows[0][1] if rows else {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = await self.repository.run_read(_load, "conversation", name)
+        return {tuple(json.loads(key)): state for key, state in rows}
+
+    async def update_conversation(self, name, key, new_state):
+        self._mark("conversation", json.dumps(list(key)), new_state, name=name)
+
+    async def update_user_data(self, user_id, data):
+        self._mark("user", user_id, data or None)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark("chat", chat_id, data or None)
+
+    async def update_bot_data(self, data):
+        self._mark("bot", "", data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id):
+        self._mark("user", user_id, None)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark("chat", chat_id, None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write whatever is still buffered; PTB calls this on shutdown"""
+        self._closing = True
+        task = self._flush_task
+        if task is not None and not task.done():
+            if self._writing:
+                # Its batch is no longer in _pending: let that write finish
+                await asyncio.shield(task)
+            else:
+                task.cancel()
+        await self._write_pending()
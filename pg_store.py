@@ -0,0 +1,649 @@
+# pg_store.py
+"""PostgreSQL order store on asyncpg, selected with DATABASE_URL=postgresql://...
+
+Same behaviour as OrderRepository in database.py, but on a connection pool,
+so writes from many handlers (and many workers, see cluster.py) run
+concurrently instead of queueing behind SQLite's single writer. asyncpg
+prepares each statement server-side the first time a connection runs it and
+keeps it in a per-connection cache, so the SQL constants below are parsed
+once per connection. The admin "take next order" claim and the deadline
+sweeps pick rows with ``FOR UPDATE SKIP LOCKED``, so admins and workers
+running them at the same time get different orders instead of waiting on
+each other's row locks.
+
+The schema mirrors migrations.py at its latest version and is created
+idempotently (under an advisory lock) when the store starts. Helpers that
+other modules hand to ``run_read``/``run_write`` are mapped to their async
+ports in PORTS at the bottom of this file.
+"""
+import asyncio
+import logging
+import pickle
+import queue
+from datetime import datetime, time, timedelta, timezone
+
+import admins
+import analytics
+import leader
+import notifier
+import persistence
+import search
+from cache import TTLCache
+from catalog import LAMPORTS_PER_SOL
+from config import COMPLETION_SLA_HOURS, ORDER_CACHE_TTL, ORDER_CLAIM_MINUTES, PAYMENT_WINDOW_HOURS
+from database import PAGE_SIZE, STREAM_CHUNK, SWEEP_LIMIT, cancelled_from, shape_page
+from export import COLUMNS, FETCH_SIZE, write_chunks
+from lifecycle import APPROVED, CANCELLED, COMPLETED, EXPIRED, sql_sources
+from metrics import DB_SECONDS
+from models import ORDER_COLUMNS, Order, format_timestamp, parse_timestamp
+from storage import Storage
+
+try:
+    import asyncpg
+except ImportError:  # optional: only needed for DATABASE_URL=postgresql://...
+    asyncpg = None
+
+POOL_MIN, POOL_MAX = 2, 20
+EXPORT_QUEUE = 4  # chunks buffered between the database and the export file
+SCHEMA_LOCK = 0x6d6f6f6e  # pg_advisory_xact_lock key held while creating the schema
+
+log = logging.getLogger(__name__)
+
+NOW = "date_trunc('second', now())"  # second precision, like SQLite's CURRENT_TIMESTAMP
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS orders
+            (id BIGSERIAL PRIMARY KEY,
+             user_id BIGINT NOT NULL,
+             package TEXT NOT NULL,
+             coin_details TEXT NOT NULL,
+             status TEXT DEFAULT 'pending',
+             website_id TEXT,
+             website_link TEXT,
+             sol_amount DOUBLE PRECISION,
+             created_at TIMESTAMPTZ DEFAULT date_trunc('second', now()),
+             updated_at TIMESTAMPTZ,
+             payment_reference TEXT,
+             tx_signature TEXT,
+             approved_at TIMESTAMPTZ,
+             completed_at TIMESTAMPTZ,
+             expired_at TIMESTAMPTZ,
+             cancelled_at TIMESTAMPTZ,
+             payment_due_at TIMESTAMPTZ,
+             due_at TIMESTAMPTZ,
+             sla_pinged_at TIMESTAMPTZ,
+             claimed_by BIGINT,
+             claimed_at TIMESTAMPTZ)''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders (status, created_at, id)",
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_payment_reference
+            ON orders (payment_reference) WHERE payment_reference IS NOT NULL''',
+    '''CREATE INDEX IF NOT EXISTS idx_orders_awaiting_payment
+            ON orders (id) WHERE status = 'pending' AND payment_reference IS NOT NULL''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_payment_due ON orders (payment_due_at) WHERE status = 'pending'",
+    '''CREATE INDEX IF NOT EXISTS idx_orders_sla_due
+            ON orders (due_at) WHERE status = 'approved' AND sla_pinged_at IS NULL''',
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS coin_name TEXT",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS coin_key TEXT",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS contract TEXT",
+    "ALTER TABLE orders ADD COLUMN IF NOT EXISTS checkout_id TEXT",
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_checkout
+            ON orders (checkout_id) WHERE checkout_id IS NOT NULL''',
+    # Full-text search (search.py): the coin name and contract weigh more than the rest;
+    # punctuation is split off first so links index their words, as in the SQLite index
+    '''ALTER TABLE orders ADD COLUMN IF NOT EXISTS search TSVECTOR GENERATED ALWAYS AS
+            (setweight(to_tsvector('simple', coalesce(coin_name, '') || ' ' || coalesce(contract, '')), 'A')
+             || to_tsvector('simple', regexp_replace(coin_details, '\\W+', ' ', 'g'))) STORED''',
+    "CREATE INDEX IF NOT EXISTS idx_orders_search ON orders USING gin (search)",
+    "CREATE INDEX IF NOT EXISTS idx_orders_coin_key ON orders (coin_key) WHERE coin_key IS NOT NULL",
+    "CREATE INDEX IF NOT EXISTS idx_orders_contract ON orders (contract) WHERE contract IS NOT NULL",
+    '''CREATE TABLE IF NOT EXISTS bot_persistence
+            (kind TEXT NOT NULL,
+             name TEXT NOT NULL DEFAULT '',
+             key TEXT NOT NULL,
+             data BYTEA NOT NULL,
+             PRIMARY KEY (kind, name, key))''',
+    '''CREATE TABLE IF NOT EXISTS outbox
+            (id BIGSERIAL PRIMARY KEY,
+             chat_id BIGINT NOT NULL,
+             text TEXT NOT NULL,
+             parse_mode TEXT,
+             attempts INTEGER NOT NULL DEFAULT 0,
+             last_error TEXT,
+             created_at TIMESTAMPTZ DEFAULT now(),
+             worker INTEGER)''',
+    "ALTER TABLE outbox ADD COLUMN IF NOT EXISTS worker INTEGER",
+    '''CREATE TABLE IF NOT EXISTS stats_daily_package
+            (day TEXT NOT NULL,
+             package TEXT NOT NULL,
+             orders INTEGER NOT NULL DEFAULT 0,
+             approved INTEGER NOT NULL DEFAULT 0,
+             completed INTEGER NOT NULL DEFAULT 0,
+             revenue_lamports BIGINT NOT NULL DEFAULT 0,
+             PRIMARY KEY (day, package))''',
+    '''CREATE TABLE IF NOT EXISTS stats_funnel
+            (day TEXT NOT NULL,
+             step TEXT NOT NULL,
+             count INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (day, step))''',
+    '''CREATE TABLE IF NOT EXISTS stats_latency
+            (metric TEXT NOT NULL,
+             le BIGINT NOT NULL,
+             count INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (metric, le))''',
+    '''CREATE TABLE IF NOT EXISTS admins
+            (user_id BIGINT PRIMARY KEY,
+             role TEXT NOT NULL DEFAULT 'admin',
+             added_by BIGINT,
+             added_at TIMESTAMPTZ DEFAULT now())''',
+    '''CREATE TABLE IF NOT EXISTS leases
+            (name TEXT PRIMARY KEY,
+             holder TEXT NOT NULL,
+             expires_at TIMESTAMPTZ NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS job_cursors
+            (name TEXT PRIMARY KEY,
+             position BIGINT NOT NULL)''',
+]
+
+INSERT_ORDER = f'''INSERT INTO orders
+                (user_id, package, coin_details, sol_amount, status, payment_reference, payment_due_at,
+                 coin_name, coin_key, contract, checkout_id)
+                VALUES ($1, $2, $3, $4, $5, $6, {NOW} + make_interval(secs => $7), $8, $9, $10, $11)
+                ON CONFLICT (checkout_id) WHERE checkout_id IS NOT NULL DO NOTHING
+                RETURNING id, created_at'''
+SELECT_CHECKOUT = "SELECT id FROM orders WHERE checkout_id = $1"
+SELECT_ORDER = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = $1"
+SELECT_PENDING = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' ORDER BY created_at DESC, id DESC"
+SELECT_PENDING_FIRST = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending'
+                ORDER BY created_at DESC, id DESC LIMIT $1'''
+SELECT_PENDING_OLDER = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' AND (created_at, id) < ($1, $2)
+                ORDER BY created_at DESC, id DESC LIMIT $3'''
+SELECT_PENDING_NEWER = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'pending' AND (created_at, id) > ($1, $2)
+                ORDER BY created_at ASC, id ASC LIMIT $3'''
+SELECT_ORDERS_AFTER = f"SELECT {ORDER_COLUMNS} FROM orders WHERE id > $1 ORDER BY id LIMIT $2"
+SELECT_ORDERS_AFTER_BY_STATUS = f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = $3 AND id > $1 ORDER BY id LIMIT $2"
+# $1 order id, $2 acting admin (NULL for the verifier and sweeps), $3 claim lifetime in seconds;
+# see CLAIM_GUARD in database.py
+CLAIM_GUARD = f"($2::bigint IS NULL OR claimed_by IS NULL OR claimed_by = $2 OR claimed_at <= {NOW} - make_interval(secs => $3))"
+CLAIM_SET = f"claimed_by = COALESCE($2, claimed_by), claimed_at = CASE WHEN $2::bigint IS NULL THEN claimed_at ELSE {NOW} END"
+TRANSITION_TO = {
+    APPROVED: f'''UPDATE orders SET status = 'approved', website_id = COALESCE($4, website_id),
+                tx_signature = COALESCE($5, tx_signature), approved_at = {NOW},
+                due_at = {NOW} + make_interval(secs => $6), updated_at = {NOW}, {CLAIM_SET}
+                WHERE id = $1 AND status IN ({sql_sources(APPROVED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    COMPLETED: f'''UPDATE orders SET status = 'completed', website_link = $4, completed_at = {NOW},
+                updated_at = {NOW}, {CLAIM_SET}
+                WHERE id = $1 AND status IN ({sql_sources(COMPLETED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    EXPIRED: f'''UPDATE orders SET status = 'expired', expired_at = {NOW}, updated_at = {NOW}, {CLAIM_SET}
+                WHERE id = $1 AND status IN ({sql_sources(EXPIRED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+    CANCELLED: f'''UPDATE orders SET status = 'cancelled', cancelled_at = {NOW}, updated_at = {NOW}, {CLAIM_SET}
+                WHERE id = $1 AND status IN ({sql_sources(CANCELLED)}) AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}''',
+}
+CLAIM_ORDER = f'''UPDATE orders SET claimed_by = $2, claimed_at = {NOW}
+                WHERE id = $1 AND status IN ('pending', 'approved') AND {CLAIM_GUARD}
+                RETURNING {ORDER_COLUMNS}'''
+CLAIM_NEXT_ORDER = f'''UPDATE orders SET claimed_by = $1, claimed_at = {NOW}
+                WHERE id = (SELECT id FROM orders WHERE status = 'pending'
+                            AND (claimed_by IS NULL OR claimed_at <= {NOW} - make_interval(secs => $2))
+                            ORDER BY created_at, id LIMIT 1 FOR UPDATE SKIP LOCKED)
+                RETURNING {ORDER_COLUMNS}'''
+RELEASE_ORDER = f'''UPDATE orders SET claimed_by = NULL, claimed_at = NULL
+                WHERE id = $1 AND claimed_by = $2 RETURNING {ORDER_COLUMNS}'''
+EXPIRE_OVERDUE = f'''UPDATE orders SET status = 'expired', expired_at = {NOW}, updated_at = {NOW}
+                WHERE id IN (SELECT id FROM orders WHERE status = 'pending' AND payment_due_at <= {NOW}
+                             AND payment_reference IS NOT NULL ORDER BY payment_due_at LIMIT $1 FOR UPDATE SKIP LOCKED)
+                RETURNING {ORDER_COLUMNS}'''
+CLAIM_SLA_WARNINGS = f'''UPDATE orders SET sla_pinged_at = {NOW}
+                WHERE id IN (SELECT id FROM orders WHERE status = 'approved' AND sla_pinged_at IS NULL
+                             AND due_at <= {NOW} + make_interval(secs => $1)
+                             ORDER BY due_at LIMIT $2 FOR UPDATE SKIP LOCKED)
+                RETURNING {ORDER_COLUMNS}'''
+INIT_CURSOR = '''INSERT INTO job_cursors (name, position) SELECT $1, COALESCE(MAX(id), 0) FROM orders
+                ON CONFLICT (name) DO NOTHING'''
+SELECT_CURSOR = "SELECT position FROM job_cursors WHERE name = $1 FOR UPDATE"
+UPDATE_CURSOR = "UPDATE job_cursors SET position = $1 WHERE name = $2"
+SELECT_USER_ID = "SELECT user_id FROM orders WHERE id = $1"
+SEARCH = f'''SELECT {ORDER_COLUMNS} FROM orders WHERE search @@ to_tsquery('simple', $1)
+                ORDER BY ts_rank(search, to_tsquery('simple', $1)) DESC, id DESC LIMIT $2'''
+DUPLICATES = '''SELECT o.id FROM orders o JOIN orders this ON this.id = $1
+                WHERE (o.coin_key = this.coin_key OR o.contract = this.contract) AND o.id != this.id
+                AND o.status NOT IN ('cancelled', 'expired')
+                ORDER BY o.id LIMIT 5'''
+SELECT_AWAITING_PAYMENT = f'''SELECT {ORDER_COLUMNS} FROM orders
+                WHERE status = 'pending' AND payment_reference IS NOT NULL'''
+
+BUMP_DAILY = '''INSERT INTO stats_daily_package AS s (day, package, orders, approved, completed, revenue_lamports)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                ON CONFLICT (day, package) DO UPDATE SET
+                    orders = s.orders + excluded.orders,
+                    approved = s.approved + excluded.approved,
+                    completed = s.completed + excluded.completed,
+                    revenue_lamports = s.revenue_lamports + excluded.revenue_lamports'''
+BUMP_FUNNEL = '''INSERT INTO stats_funnel AS s (day, step, count) VALUES (current_date::text, $1, 1)
+                ON CONFLICT (day, step) DO UPDATE SET count = s.count + 1'''
+BUMP_LATENCY = '''INSERT INTO stats_latency AS s (metric, le, count) VALUES ($1, $2, 1)
+                ON CONFLICT (metric, le) DO UPDATE SET count = s.count + 1'''
+SELECT_DAILY = '''SELECT day, package, orders, approved, completed, revenue_lamports FROM stats_daily_package
+                WHERE day >= (current_date - $1::int)::text ORDER BY day DESC, package'''
+SELECT_FUNNEL = "SELECT step, SUM(count) FROM stats_funnel WHERE day >= (current_date - $1::int)::text GROUP BY step"
+SELECT_LATENCY = "SELECT metric, le, count FROM stats_latency ORDER BY metric, le"
+
+
+def _order(row):
+    return Order.from_row(row) if row else None
+
+
+def _claim_ttl():
+    return ORDER_CLAIM_MINUTES * 60.0
+
+
+async def _record_approved(conn, order):
+    lamports = round((order.sol_amount or 0) * LAMPORTS_PER_SOL)
+    await conn.execute(BUMP_DAILY, analytics.day_of(order.created_at), order.package, 0, 1, 0, lamports)
+    await conn.execute(BUMP_LATENCY, "approval", analytics.latency_bucket(order.created_at, order.approved_at))
+
+
+async def _record_completed(conn, order):
+    await conn.execute(BUMP_DAILY, analytics.day_of(order.created_at), order.package, 0, 0, 1, 0)
+    if order.approved_at:
+        await conn.execute(BUMP_LATENCY, "completion", analytics.latency_bucket(order.approved_at, order.completed_at))
+
+
+async def _record_cancelled(conn, order, from_status):
+    if from_status == APPROVED:
+        lamports = round((order.sol_amount or 0) * LAMPORTS_PER_SOL)
+        await conn.execute(BUMP_DAILY, analytics.day_of(order.created_at), order.package, 0, -1, 0, -lamports)
+
+
+def _export_query(since=None, until=None, status=None):
+    """Same selection as export.build_query, with Postgres placeholders and typed bounds"""
+    clauses, params = [], []
+    if status:
+        params.append(status)
+        clauses.append(f"status = ${len(params)}")
+    if since:
+        params.append(datetime.combine(since, time(), timezone.utc))
+        clauses.append(f"created_at >= ${len(params)}")
+    if until:
+        params.append(datetime.combine(until, time(), timezone.utc) + timedelta(days=1))
+        clauses.append(f"created_at < ${len(params)}")
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"SELECT {', '.join(COLUMNS)} FROM orders{where} ORDER BY created_at, id", params
+
+
+def _export_row(row):
+    return tuple(format_timestamp(value) if isinstance(value, datetime) else value for value in row)
+
+
+class PostgresRepository(Storage):
+    """Async access to the orders (and the bot's other tables) in PostgreSQL"""
+
+    def __init__(self, url, min_size=POOL_MIN, max_size=POOL_MAX, cache_ttl=ORDER_CACHE_TTL):
+        if asyncpg is None:
+            raise RuntimeError("DATABASE_URL points at PostgreSQL, which needs asyncpg (pip install asyncpg)")
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+        self._starting = asyncio.Lock()
+        self._background = set()
+        self.cache = TTLCache(ttl=cache_ttl)
+
+    async def start(self):
+        async with self._starting:
+            if self._pool is not None:
+                return
+            # Sessions run in UTC so current_date matches the day keys SQLite uses
+            pool = await asyncpg.create_pool(
+                self.url, min_size=self.min_size, max_size=self.max_size,
+                server_settings={"timezone": "UTC", "application_name": "moonbuilder-bot"})
+            async with pool.acquire() as conn, conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", SCHEMA_LOCK)
+                for statement in SCHEMA:
+                    await conn.execute(statement)
+            self._pool = pool
+
+    async def _connection(self):
+        # PTB loads persistence in Application.initialize(), before post_init runs start()
+        if self._pool is None:
+            await self.start()
+        return self._pool.acquire()
+
+    async def shutdown(self):
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._pool is not None:
+            await self._pool.close()
+
+    async def _read(self, name, fn, *args):
+        with DB_SECONDS.time(name, "read"):
+            async with await self._connection() as conn:
+                return await fn(conn, *args)
+
+    async def _write(self, name, fn, *args):
+        with DB_SECONDS.time(name, "write"):
+            async with await self._connection() as conn, conn.transaction():
+                return await fn(conn, *args)
+
+    def _port(self, fn):
+        port = PORTS.get(fn)
+        if port is None:
+            raise NotImplementedError(f"No PostgreSQL port of {fn.__module__}.{fn.__qualname__}")
+        return port
+
+    async def run_read(self, fn, *args):
+        """Run the Postgres port of the SQLite helper ``fn``"""
+        return await self._read(fn.__name__.lstrip("_"), self._port(fn), *args)
+
+    async def run_write(self, fn, *args):
+        """Run the Postgres port of the SQLite helper ``fn`` in its own transaction"""
+        return await self._write(fn.__name__.lstrip("_"), self._port(fn), *args)
+
+    async def save_order(self, user_id, package, details, sol_amount, status="pending", payment_reference=None,
+                         checkout_id=None):
+        async def save(conn):
+            row = await conn.fetchrow(
+                INSERT_ORDER, user_id, package, details, sol_amount, status, payment_reference,
+                PAYMENT_WINDOW_HOURS * 3600.0 if payment_reference else None, *search.coin_columns(details),
+                checkout_id)
+            if row is None:
+                return await conn.fetchval(SELECT_CHECKOUT, checkout_id)
+            order_id, created_at = row
+            await conn.execute(BUMP_DAILY, analytics.day_of(created_at), package, 1, 0, 0, 0)
+            return order_id
+        return await self._write("save_order", save)
+
+    async def get_checkout_order_id(self, checkout_id):
+        return await self._read("get_checkout_order_id", lambda conn: conn.fetchval(SELECT_CHECKOUT, checkout_id))
+
+    async def get_order_by_id(self, order_id, fresh=False):
+        order_id = int(order_id)
+        order = None if fresh else self.cache.get(order_id)
+        if order is None:
+            version = self.cache.version
+            order = _order(await self._read("get_order_by_id", lambda conn: conn.fetchrow(SELECT_ORDER, order_id)))
+            if order is not None:
+                self.cache.put(order_id, order, version)
+        return order
+
+    async def _write_order(self, order_id, name, fn):
+        order = await self._write(name, fn)
+        self.cache.invalidate(order_id)
+        if order is not None:
+            self.cache.put(order_id, order)
+        return order
+
+    async def transition(self, order_id, status, actor=None, **fields):
+        """Guarded status change (see lifecycle.py); returns the updated Order, or
+        None when the order doesn't exist, can't move to ``status`` from where it
+        is, or is claimed by an admin other than ``actor``"""
+        order_id = int(order_id)
+        actor = int(actor) if actor is not None else None
+        if status == APPROVED:
+            extra = (fields.get("website_id"), fields.get("tx_signature"), COMPLETION_SLA_HOURS * 3600.0)
+        elif status == COMPLETED:
+            extra = (fields.get("website_link"),)
+        elif status in (EXPIRED, CANCELLED):
+            extra = ()
+        else:
+            raise ValueError(f"Unknown order status {status!r}")
+
+        async def change(conn):
+            order = _order(await conn.fetchrow(TRANSITION_TO[status], order_id, actor, _claim_ttl(), *extra))
+            if order is not None and status == APPROVED:
+                await _record_approved(conn, order)
+            elif order is not None and status == COMPLETED:
+                await _record_completed(conn, order)
+            elif order is not None and status == CANCELLED:
+                await _record_cancelled(conn, order, cancelled_from(order))
+            return order
+        return await self._write_order(order_id, "transition", change)
+
+    async def claim_order(self, order_id, admin_id):
+        order_id = int(order_id)
+        return await self._write_order(order_id, "claim_order", lambda conn: _fetch_order(
+            conn, CLAIM_ORDER, order_id, int(admin_id), _claim_ttl()))
+
+    async def claim_next_order(self, admin_id):
+        """Claim the oldest pending order nobody is working on; concurrent callers skip each other's rows"""
+        order = await self._write("claim_next_order", lambda conn: _fetch_order(
+            conn, CLAIM_NEXT_ORDER, int(admin_id), _claim_ttl()))
+        if order is not None:
+            self.cache.invalidate(order.id)
+            self.cache.put(order.id, order)
+        return order
+
+    async def release_order(self, order_id, admin_id):
+        order_id = int(order_id)
+        return await self._write_order(order_id, "release_order", lambda conn: _fetch_order(
+            conn, RELEASE_ORDER, order_id, int(admin_id)))
+
+    async def get_all_pending_orders(self):
+        return await self._read("get_all_pending_orders", _fetch_orders, SELECT_PENDING)
+
+    async def get_pending_orders_page(self, cursor=None, direction="next", limit=PAGE_SIZE):
+        """Keyset pages of pending orders, as OrderRepository.get_pending_orders_page"""
+        if cursor is None:
+            query, args = SELECT_PENDING_FIRST, (limit + 1,)
+        else:
+            position = (parse_timestamp(cursor[0]), int(cursor[1]))
+            query = SELECT_PENDING_OLDER if direction == "next" else SELECT_PENDING_NEWER
+            args = (*position, limit + 1)
+        rows = await self._read("get_pending_orders_page", lambda conn: conn.fetch(query, *args))
+        return shape_page(rows, cursor, direction, limit)
+
+    async def iter_orders(self, status=None, chunk_size=STREAM_CHUNK):
+        after_id = 0
+        while True:
+            if status is None:
+                chunk = await self._read("get_orders_after", _fetch_orders, SELECT_ORDERS_AFTER, after_id, chunk_size)
+            else:
+                chunk = await self._read("get_orders_after", _fetch_orders, SELECT_ORDERS_AFTER_BY_STATUS,
+                                         after_id, chunk_size, status)
+            for order in chunk:
+                yield order
+            if len(chunk) < chunk_size:
+                return
+            after_id = chunk[-1].id
+
+    async def get_awaiting_payment(self):
+        return await self._read("get_awaiting_payment", _fetch_orders, SELECT_AWAITING_PAYMENT)
+
+    async def _sweep(self, name, query, *args):
+        orders = await self._write(name, _fetch_orders, query, *args)
+        for order in orders:
+            self.cache.invalidate(order.id)
+        return orders
+
+    async def expire_overdue(self, limit=SWEEP_LIMIT):
+        return await self._sweep("expire_overdue", EXPIRE_OVERDUE, limit)
+
+    async def claim_sla_warnings(self, within_hours, limit=SWEEP_LIMIT):
+        return await self._sweep("claim_sla_warnings", CLAIM_SLA_WARNINGS, within_hours * 3600.0, limit)
+
+    async def take_new_orders(self, name, limit=SWEEP_LIMIT):
+        async def take(conn):
+            await conn.execute(INIT_CURSOR, name)
+            position = await conn.fetchval(SELECT_CURSOR, name)
+            orders = await _fetch_orders(conn, SELECT_ORDERS_AFTER, position, limit)
+            if orders:
+                await conn.execute(UPDATE_CURSOR, orders[-1].id, name)
+            return orders
+        return await self._write("take_new_orders", take)
+
+    async def get_stats(self, days=analytics.REPORT_DAYS):
+        async def report(conn):
+            return analytics.build_report(days, await conn.fetch(SELECT_DAILY, days - 1),
+                                          await conn.fetch(SELECT_FUNNEL, days - 1), await conn.fetch(SELECT_LATENCY))
+        return await self._read("read_report", report)
+
+    def count_funnel_step(self, step):
+        """Count a checkout step for the funnel; fire-and-forget"""
+        task = asyncio.get_running_loop().create_task(
+            self._write("record_funnel", lambda conn: conn.execute(BUMP_FUNNEL, step)))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        task.add_done_callback(_log_failed_write)
+
+    async def get_user_id_by_order_id(self, order_id):
+        return await self._read("get_user_id_by_order_id", lambda conn: conn.fetchval(SELECT_USER_ID, int(order_id)))
+
+    async def search_orders(self, text, limit=search.SEARCH_LIMIT):
+        """Orders whose coin details contain every word of ``text`` (as prefixes), best match first"""
+        terms = search.TERM.findall(text)[:search.MAX_TERMS]
+        if not terms:
+            return []
+        query = " & ".join(f"{term}:*" for term in terms)
+        return await self._read("search", _fetch_orders, SEARCH, query, limit)
+
+    async def find_duplicates(self, order_id):
+        rows = await self._read("duplicates", lambda conn: conn.fetch(DUPLICATES, int(order_id)))
+        return [row[0] for row in rows]
+
+    async def export(self, path, fmt="csv", since=None, until=None, status=None, compress=False):
+        """Stream the selected orders to ``path``: a server-side cursor feeds a
+        bounded queue that export.write_chunks drains on a worker thread"""
+        chunks = queue.Queue(maxsize=EXPORT_QUEUE)
+        writer = asyncio.ensure_future(asyncio.to_thread(write_chunks, iter(chunks.get, None), path, fmt, compress))
+
+        async def offer(item):
+            # put without blocking the event loop; gives up once the writer has stopped
+            while not writer.done():
+                try:
+                    chunks.put_nowait(item)
+                    return True
+                except queue.Full:
+                    await asyncio.sleep(0.01)
+            return False
+
+        query, params = _export_query(since, until, status)
+        try:
+            async with await self._connection() as conn, conn.transaction():
+                cursor = await conn.cursor(query, *params)
+                while rows := await cursor.fetch(FETCH_SIZE):
+                    if not await offer([_export_row(row) for row in rows]):
+                        break
+        finally:
+            await offer(None)
+        return await writer
+
+    def stats(self):
+        """Pool occupancy and order cache hits/misses"""
+        stats = {f"cache_{key}": value for key, value in self.cache.stats().items()}
+        if self._pool is not None and not self._pool.is_closing():
+            stats.update(pool_size=self._pool.get_size(), pool_idle=self._pool.get_idle_size())
+        return stats
+
+
+async def _fetch_order(conn, query, *args):
+    return _order(await conn.fetchrow(query, *args))
+
+
+async def _fetch_orders(conn, query, *args):
+    return [Order.from_row(row) for row in await conn.fetch(query, *args)]
+
+
+def _log_failed_write(task):
+    if not task.cancelled() and task.exception() is not None:
+        log.error("Background write failed", exc_info=task.exception())
+
+
+# Async ports of the SQLite helpers other modules pass to run_read/run_write
+
+async def _load_persistence(conn, kind, name=""):
+    rows = await conn.fetch("SELECT key, data FROM bot_persistence WHERE kind = $1 AND name = $2", kind, name)
+    return [(key, pickle.loads(data)) for key, data in rows]
+
+
+async def _store_persistence(conn, pending):
+    upserts, deletes = [], []
+    for (kind, name, key), value in pending:
+        if value is None:
+            deletes.append((kind, name, key))
+        else:
+            upserts.append((kind, name, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+    if deletes:
+        await conn.executemany("DELETE FROM bot_persistence WHERE kind = $1 AND name = $2 AND key = $3", deletes)
+    if upserts:
+        await conn.executemany('''INSERT INTO bot_persistence (kind, name, key, data) VALUES ($1, $2, $3, $4)
+                ON CONFLICT (kind, name, key) DO UPDATE SET data = excluded.data''', upserts)
+
+
+async def _load_outbox(conn, worker, workers):
+    await conn.execute("UPDATE outbox SET worker = $1 WHERE worker IS NULL OR worker >= $2", worker, workers)
+    rows = await conn.fetch('''SELECT id, chat_id, text, parse_mode, attempts FROM outbox
+                WHERE worker = $1 ORDER BY id''', worker)
+    return [tuple(row) for row in rows]
+
+
+INSERT_OUTBOX = '''INSERT INTO outbox (chat_id, text, parse_mode, attempts, last_error, worker)
+                VALUES ($1, $2, $3, $4, $5, $6)'''
+
+
+async def _add_outbox(conn, chat_id, text, parse_mode, worker):
+    return await conn.fetchval(INSERT_OUTBOX + " RETURNING id", chat_id, text, parse_mode, 0, None, worker)
+
+
+async def _save_outbox(conn, messages):
+    await conn.executemany(INSERT_OUTBOX, messages)
+
+
+async def _update_outbox(conn, row_id, attempts, error):
+    await conn.execute("UPDATE outbox SET attempts = $1, last_error = $2 WHERE id = $3", attempts, error, row_id)
+
+
+async def _delete_outbox(conn, row_id):
+    await conn.execute("DELETE FROM outbox WHERE id = $1", row_id)
+
+
+async def _load_admins(conn):
+    return {user_id: role for user_id, role in await conn.fetch("SELECT user_id, role FROM admins")}
+
+
+UPSERT_ADMIN = '''INSERT INTO admins (user_id, role, added_by) VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO UPDATE SET role = excluded.role'''
+
+
+async def _seed_admins(conn, owners):
+    await conn.executemany(UPSERT_ADMIN, [(user_id, admins.OWNER, None) for user_id in owners])
+
+
+async def _add_admin(conn, user_id, role, added_by):
+    await conn.execute(UPSERT_ADMIN, user_id, role, added_by)
+
+
+async def _remove_admin(conn, user_id):
+    return await conn.execute("DELETE FROM admins WHERE user_id = $1 AND role != 'owner'", user_id) != "DELETE 0"
+
+
+async def _acquire_lease(conn, name, holder, seconds):
+    row = await conn.fetchrow('''INSERT INTO leases AS l (name, holder, expires_at)
+                VALUES ($1, $2, now() + make_interval(secs => $3))
+                ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE l.holder = excluded.holder OR l.expires_at <= now()
+                RETURNING holder''', name, holder, float(seconds))
+    return row is not None
+
+
+async def _release_lease(conn, name, holder):
+    await conn.execute("DELETE FROM leases WHERE name = $1 AND holder = $2", name, holder)
+
+
+PORTS = {
+    persistence._load: _load_persistence,
+    persistence._store: _store_persistence,
+    notifier._load_outbox: _load_outbox,
+    notifier._add_outbox: _add_outbox,
+    notifier._save_outbox: _save_outbox,
+    notifier._update_outbox: _update_outbox,
+    notifier._delete_outbox: _delete_outbox,
+    admins._load: _load_admins,
+    admins._seed: _seed_admins,
+    admins._add: _add_admin,
+    admins._remove: _remove_admin,
+    leader._acquire: _acquire_lease,
+    leader._release: _release_lease,
+}
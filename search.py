@@ -0,0 +1,118 @@
+# search.py
+"""Structured coin details and full-text order search for admins.
+
+Customers send the details as free text following DETAILS_TEMPLATE in
+main.py ("Coin Name: ...", "Pump.fun link ...", "Twitter: ..."). The write
+helpers in database.py parse it once when the order is saved:
+
+* ``orders.coin_name`` / ``orders.coin_key`` - the name as given and
+  normalized (case, spacing, ``$`` and punctuation dropped), and
+* ``orders.contract`` - the token mint, from the pump.fun link or any
+  Solana address in the text,
+
+and index the order in ``orders_fts``, a contentless FTS5 table keyed by
+order id, so /search is an index lookup however many orders there are.
+``coin_key`` and ``contract`` are indexed too: an order whose coin matches
+an earlier open or completed order is flagged to admins as a duplicate.
+"""
+import re
+
+from models import ORDER_COLUMNS, Order
+
+SEARCH_LIMIT = 10
+MAX_TERMS = 8
+
+# Template label (lowercase prefix) -> field; first match wins, so longer labels go first
+LABELS = (
+    ("coin name", "name"), ("token name", "name"), ("name", "name"),
+    ("ticker", "ticker"), ("symbol", "ticker"),
+    ("coin tokenomics", "tokenomics"), ("tokenomics", "tokenomics"),
+    ("pump.fun", "pump_fun"), ("contract", "contract"), ("ca", "contract"), ("mint", "contract"),
+    ("twitter", "twitter"), ("x", "twitter"),
+    ("discord", "discord"),
+    ("telegram", "telegram"),
+    ("website", "website"), ("other relevant links", "other"), ("other", "other"),
+)
+SOLANA_ADDRESS = re.compile(r"(?<![1-9A-HJ-NP-Za-km-z])[1-9A-HJ-NP-Za-km-z]{32,44}(?![1-9A-HJ-NP-Za-km-z])")
+PUMP_FUN_URL = re.compile(r"(?:https?://)?(?:www\.)?pump\.fun/\S+", re.IGNORECASE)
+TERM = re.compile(r"\w+")
+LEADING_MARKS = re.compile(r"^\W+")  # bullets, emoji, markdown before a label
+
+INDEX_ORDER = "INSERT INTO orders_fts (rowid, name, contract, details) VALUES (?, ?, ?, ?)"
+# bm25 weights: a hit in the coin name or contract ranks above one in the rest of the text
+SEARCH = f'''SELECT {ORDER_COLUMNS} FROM orders JOIN
+                    (SELECT rowid, bm25(orders_fts, 10.0, 10.0, 1.0) AS rank FROM orders_fts
+                     WHERE orders_fts MATCH ? ORDER BY rank, rowid DESC LIMIT ?) AS hits
+                ON orders.id = hits.rowid ORDER BY hits.rank, orders.id DESC'''
+DUPLICATES = '''SELECT id FROM orders
+                WHERE (coin_key = :coin_key OR contract = :contract) AND id != :id
+                AND status NOT IN ('cancelled', 'expired')
+                ORDER BY id LIMIT 5'''
+
+
+def parse_details(text):
+    """Known ``Label: value`` lines of a details message, as ``{field: value}``; empty values are left out"""
+    fields = {}
+    for line in text.splitlines():
+        label, colon, value = line.partition(":")
+        label = LEADING_MARKS.sub("", label).strip().lower()
+        value = value.strip()
+        if colon and value and not value.startswith("//"):
+            field = next((field for prefix, field in LABELS
+                          if label == prefix or (len(prefix) > 2 and label.startswith(prefix))), None)
+            if field and field not in fields:
+                fields[field] = value
+                continue
+        # "Pump.fun link" has no colon in the template, so links are often pasted straight after it
+        if "pump_fun" not in fields and (link := PUMP_FUN_URL.search(line)):
+            fields["pump_fun"] = link.group(0)
+    contract = find_contract(fields.get("contract", "")) or find_contract(fields.get("pump_fun", "")) \
+        or find_contract(text)
+    if contract:
+        fields["contract"] = contract
+    else:
+        fields.pop("contract", None)
+    return fields
+
+
+def find_contract(text):
+    """The first Solana address (a token mint, for pump.fun coins) in ``text``"""
+    match = SOLANA_ADDRESS.search(text)
+    return match.group(0) if match else None
+
+
+def coin_key(name):
+    """``$MOON Coin`` and ``moon-coin`` both become ``mooncoin``; None when nothing is left"""
+    key = "".join(TERM.findall((name or "").casefold())).replace("_", "")
+    return key or None
+
+
+def coin_columns(details):
+    """``(coin_name, coin_key, contract)`` stored on the order row"""
+    fields = parse_details(details)
+    name = fields.get("name") or fields.get("ticker")
+    return name, coin_key(name), fields.get("contract")
+
+
+def match_query(text):
+    """FTS5 query matching orders that contain every word of ``text`` (as a prefix); None if it has no words"""
+    terms = TERM.findall(text)[:MAX_TERMS]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+
+def index_order(conn, order_id, coin_name, contract, details):
+    conn.execute(INDEX_ORDER, (order_id, coin_name or "", contract or "", details))
+
+
+def search_orders(conn, query, limit=SEARCH_LIMIT):
+    """Orders matching the FTS5 ``query`` (see match_query), best match first"""
+    return [Order.from_row(row) for row in conn.execute(SEARCH, (query, limit))]
+
+
+def duplicates(conn, order_id):
+    """Ids of other open or completed orders with the same coin key or contract"""
+    row = conn.execute("SELECT coin_key, contract FROM orders WHERE id = ?", (order_id,)).fetchone()
+    if row is None or row == (None, None):
+        return []
+    params = {"coin_key": row[0], "contract": row[1], "id": order_id}
+    return [duplicate for duplicate, in conn.execute(DUPLICATES, params)]
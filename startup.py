@@ -0,0 +1,78 @@
+# startup.py
+"""Startup pipeline and its time breakdown.
+
+main.py imports this module first, so STARTED is close to process start.
+From there, startup has these stages:
+
+* imports    - loading main.py's modules. Rendering dependencies (qrcode,
+  Pillow) are not among them: utils.py imports them on first use.
+* schema     - SQLite migrations. These must land before PTB loads
+  persistence in Application.initialize().
+* initialize - PTB's initialize: getMe and the persistence load.
+* warm-up    - post_init. Everything updates depend on runs concurrently,
+  and the bot serves updates as soon as that is done.
+* deferred   - work updates don't wait for (command menu, QR pre-rendering
+  in manual-approval mode), left running in the background.
+
+``StartupTimer.ready()`` logs the breakdown once updates can be served;
+each deferred step logs its own time when it finishes.
+"""
+import asyncio
+import logging
+import time
+
+STARTED = time.perf_counter()
+
+log = logging.getLogger(__name__)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class StartupTimer:
+    def __init__(self, started=STARTED):
+        self.started = started
+        self.steps = {}  # step -> seconds
+        self._mark = started
+        self._deferred_tasks = set()
+
+    def mark(self, step):
+        """Record the time since the previous mark as ``step``"""
+        now = time.perf_counter()
+        self.steps[step] = now - self._mark
+        self._mark = now
+
+    async def _timed(self, step, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.steps[step] = time.perf_counter() - started
+
+    async def gather(self, steps):
+        """Await ``{step: awaitable}`` concurrently, timing each; the first failure is raised"""
+        await asyncio.gather(*(self._timed(step, awaitable) for step, awaitable in steps.items()))
+        self.mark("warm-up")
+
+    def defer(self, steps):
+        """Run ``{step: awaitable}`` in the background; failures are logged, not raised"""
+        # Plain asyncio tasks: post_init runs before the Application is running
+        for step, awaitable in steps.items():
+            task = asyncio.get_running_loop().create_task(self._deferred(step, awaitable), name=f"startup:{step}")
+            self._deferred_tasks.add(task)
+            task.add_done_callback(self._deferred_tasks.discard)
+
+    async def _deferred(self, step, awaitable):
+        try:
+            await self._timed(step, awaitable)
+        except Exception:
+            log.exception("Startup step %s failed", step)
+        else:
+            log.info("Startup step %s done in %.0f ms", step, self.steps[step] * 1000)
+
+    def ready(self):
+        total = time.perf_counter() - self.started
+        log.info("Ready to serve updates in %.0f ms", total * 1000,
+                 extra={"startup_ms": {step: _ms(seconds) for step, seconds in self.steps.items()}})
+        return total
@@ -0,0 +1,124 @@
+# storage.py
+"""The order store interface and the factory that picks a backend.
+
+``DATABASE_URL`` selects the backend: unset (or ``sqlite:///path``) keeps
+the SQLite store in database.py; ``postgresql://...`` uses the asyncpg
+store in pg_store.py, which lifts SQLite's single-writer limit when several
+workers or hosts share the orders.
+
+Both implement every method below. The other modules that keep their own
+tables (persistence, notifier outbox, admins, leases, analytics) hand small
+``fn(conn, ...)`` helpers to ``run_read``/``run_write``; the SQLite store
+runs them directly and the Postgres store runs its async port of each one.
+"""
+from abc import ABC, abstractmethod
+
+from config import DATABASE_NAME, DATABASE_URL
+from lifecycle import APPROVED, COMPLETED
+
+
+class Storage(ABC):
+    @abstractmethod
+    async def start(self):
+        """Connect and make sure the schema is current; called before the bot starts"""
+
+    @abstractmethod
+    async def shutdown(self):
+        """Wait for queued writes and close every connection"""
+
+    @abstractmethod
+    async def run_read(self, fn, *args): ...
+
+    @abstractmethod
+    async def run_write(self, fn, *args): ...
+
+    @abstractmethod
+    async def save_order(self, user_id, package, details, sol_amount, status="pending", payment_reference=None,
+                         checkout_id=None): ...
+
+    @abstractmethod
+    async def get_checkout_order_id(self, checkout_id): ...
+
+    @abstractmethod
+    async def get_order_by_id(self, order_id, fresh=False): ...
+
+    @abstractmethod
+    async def transition(self, order_id, status, actor=None, **fields): ...
+
+    @abstractmethod
+    async def claim_order(self, order_id, admin_id): ...
+
+    @abstractmethod
+    async def claim_next_order(self, admin_id): ...
+
+    @abstractmethod
+    async def release_order(self, order_id, admin_id): ...
+
+    @abstractmethod
+    async def get_all_pending_orders(self): ...
+
+    @abstractmethod
+    async def get_pending_orders_page(self, cursor=None, direction="next", limit=None): ...
+
+    @abstractmethod
+    def iter_orders(self, status=None, chunk_size=None): ...
+
+    @abstractmethod
+    async def get_awaiting_payment(self): ...
+
+    @abstractmethod
+    async def expire_overdue(self, limit=None): ...
+
+    @abstractmethod
+    async def claim_sla_warnings(self, within_hours, limit=None): ...
+
+    @abstractmethod
+    async def take_new_orders(self, name, limit=None): ...
+
+    @abstractmethod
+    async def get_stats(self, days=None): ...
+
+    @abstractmethod
+    def count_funnel_step(self, step): ...
+
+    @abstractmethod
+    async def get_user_id_by_order_id(self, order_id): ...
+
+    @abstractmethod
+    async def search_orders(self, text, limit=None): ...
+
+    @abstractmethod
+    async def find_duplicates(self, order_id): ...
+
+    @abstractmethod
+    async def export(self, path, fmt="csv", since=None, until=None, status=None, compress=False):
+        """Write the selected orders to ``path`` (see export.py); returns the row count"""
+
+    @abstractmethod
+    def stats(self): ...
+
+    async def update_order_status(self, order_id, status, website_id=None, actor=None):
+        """Update order status and website ID; returns the updated Order or None"""
+        return await self.transition(order_id, status, actor, website_id=website_id)
+
+    async def complete_order(self, order_id: int, website_url: str, actor=None):
+        """Mark an approved order as completed with website URL; returns the updated order or None"""
+        return await self.transition(order_id, COMPLETED, actor, website_link=website_url)
+
+    async def mark_order_paid(self, order_id: int, website_id: str, signature: str):
+        """Approve a still-pending order whose payment was found on-chain; returns it or None"""
+        return await self.transition(order_id, APPROVED, website_id=website_id, tx_signature=signature)
+
+    async def get_order(self, order_id):
+        return await self.get_order_by_id(order_id)
+
+
+def open_storage(url=DATABASE_URL):
+    """The store ``url`` points at (SQLite at DATABASE_NAME when unset)"""
+    if url and url.startswith(("postgres://", "postgresql://")):
+        from pg_store import PostgresRepository
+        return PostgresRepository(url)
+    from database import OrderRepository
+    if url and url.startswith("sqlite:///"):
+        return OrderRepository(url[len("sqlite:///"):])
+    return OrderRepository(DATABASE_NAME)
@@ -0,0 +1,48 @@
+import asyncio
+
+from telegram import Update
+
+from concurrency import PerUserUpdateProcessor
+
+
+def update(update_id, user_id):
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": "hi",
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "User"}}}, None)
+
+
+async def handler(log, name, delay=0.0):
+    log.append(f"{name} start")
+    await asyncio.sleep(delay)
+    log.append(f"{name} end")
+
+
+def test_one_users_updates_run_in_order_while_others_overtake():
+    async def scenario():
+        processor = PerUserUpdateProcessor(4)
+        log = []
+        await asyncio.gather(
+            processor.do_process_update(update(1, 1), handler(log, "a1", 0.05)),
+            processor.do_process_update(update(2, 1), handler(log, "a2")),
+            processor.do_process_update(update(3, 2), handler(log, "b1")),
+        )
+        assert log.index("a1 end") < log.index("a2 start")
+        assert log.index("b1 end") < log.index("a1 end")
+        assert processor.stats()["processed"] == 3 and processor.stats()["active_keys"] == 0
+    asyncio.run(scenario())
+
+
+def test_running_handlers_are_capped():
+    async def scenario():
+        processor = PerUserUpdateProcessor(2)
+        running = []
+
+        async def busy():
+            running.append(processor.running)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(processor.do_process_update(update(i, i), busy()) for i in range(6)))
+        assert max(running) == 2
+        assert processor.stats()["running"] == processor.stats()["waiting"] == 0
+    asyncio.run(scenario())
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from database import OrderRepository, init_db
+from export import COLUMNS, parquet_schema
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_schema_follows_order_columns():
+    schema = parquet_schema(pa)
+    assert schema.names == list(COLUMNS)
+    assert schema.field("id").type == pa.int64() and schema.field("claimed_by").type == pa.int64()
+    assert schema.field("sol_amount").type == pa.float64()
+    assert pa.types.is_timestamp(schema.field("created_at").type)
+    assert schema.field("website_id").type == pa.string()
+
+
+def test_parquet_export(tmp_path):
+    path = str(tmp_path / "orders.db")
+    init_db(path)
+
+    async def scenario():
+        store = OrderRepository(path)
+        await store.start()
+        try:
+            ids = [await store.save_order(1, "basic", f"coin {i}", 0.5) for i in range(3)]
+            assert await store.export(str(tmp_path / "orders.parquet"), "parquet") == 3
+        finally:
+            await store.shutdown()
+        return ids
+
+    ids = asyncio.run(scenario())
+    table = pq.read_table(tmp_path / "orders.parquet")
+    assert table.column("id").to_pylist() == ids
+    assert table.column("created_at").null_count == 0
@@ -0,0 +1,68 @@
+import asyncio
+import sqlite3
+
+from database import OrderRepository, init_db
+from migrations import MIGRATIONS, migrate, schema_version
+
+# orders.db as the bot created it before migrations existed (user_version 0)
+ORIGINAL_SCHEMA = '''CREATE TABLE IF NOT EXISTS orders
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 user_id INTEGER NOT NULL,
+                 package TEXT NOT NULL,
+                 coin_details TEXT NOT NULL,
+                 status TEXT DEFAULT 'pending',
+                 website_id TEXT,
+                 website_link TEXT,
+                 sol_amount REAL,
+                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'''
+
+
+def old_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute(ORIGINAL_SCHEMA)
+    conn.execute("INSERT INTO orders (user_id, package, coin_details, status, sol_amount) "
+                 "VALUES (1, 'basic', 'Coin Name: Moon Coin', 'pending', 0.5)")
+    conn.execute("INSERT INTO orders (user_id, package, coin_details, status, website_id, sol_amount) "
+                 "VALUES (2, 'pro', 'Ticker: SUN', 'approved', 'MLW-0002', 1.0)")
+    conn.commit()
+    conn.close()
+
+
+def test_old_database_migrates_to_the_latest_version(tmp_path):
+    path = str(tmp_path / "orders.db")
+    old_database(path)
+    init_db(path)
+
+    conn = sqlite3.connect(path)
+    assert schema_version(conn) == MIGRATIONS[-1][0]
+    assert migrate(conn) == []  # already current
+    assert conn.execute("SELECT coin_key FROM orders ORDER BY id").fetchall() == [("mooncoin",), ("sun",)]
+    # Only orders waiting for an on-chain payment get a payment deadline
+    assert conn.execute("SELECT COUNT(*) FROM orders WHERE payment_due_at IS NOT NULL").fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM orders WHERE due_at IS NOT NULL").fetchone() == (1,)
+    conn.close()
+
+    async def scenario():
+        store = OrderRepository(path)
+        await store.start()
+        try:
+            old = await store.get_order_by_id(1)
+            assert (old.user_id, old.status, old.sol_amount) == (1, "pending", 0.5)
+            assert [order.id for order in await store.search_orders("moon")] == [1]
+            assert await store.save_order(3, "basic", "Coin Name: moon coin", 0.5) == 3
+            assert await store.find_duplicates(3) == [1]
+            report = await store.get_stats()
+            assert sum(row[2] for row in report["daily"]) == 3
+        finally:
+            await store.shutdown()
+    asyncio.run(scenario())
+
+
+def test_migrations_tolerate_hand_added_columns(tmp_path):
+    path = str(tmp_path / "orders.db")
+    old_database(path)
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE orders ADD COLUMN updated_at TIMESTAMP")
+    conn.commit()
+    assert MIGRATIONS[-1][0] in migrate(conn)
+    conn.close()
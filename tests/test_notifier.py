@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from telegram.error import Forbidden, NetworkError, RetryAfter
+
+import notifier
+from database import OrderRepository, init_db
+from notifier import MAX_ATTEMPTS, Notifier, TokenBucket
+
+
+class Bot:
+    def __init__(self, *errors):
+        self.errors = list(errors)  # raised by the first sends, in order
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(notifier, "BASE_BACKOFF", 0.001)
+    path = str(tmp_path / "orders.db")
+    init_db(path)
+    return lambda: OrderRepository(path)
+
+
+def run_with(open_store, scenario):
+    async def main():
+        repository = open_store()
+        await repository.start()
+        try:
+            await scenario(repository)
+        finally:
+            await repository.shutdown()
+    asyncio.run(main())
+
+
+async def settle(notifier_):
+    while notifier_._drainers:
+        await asyncio.sleep(0.01)
+
+
+async def outbox(repository):
+    return await repository.run_read(lambda conn: conn.execute("SELECT text, attempts FROM outbox").fetchall())
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_retry_after_pauses_and_retries(store):
+    async def scenario(repository):
+        bot = Bot(RetryAfter(1))
+        n = Notifier(repository, 100)
+        await n.start(bot)
+        started = asyncio.get_running_loop().time()
+        n.send(1, "hello")
+        await settle(n)
+        assert asyncio.get_running_loop().time() - started >= 0.9
+        assert bot.sent == [(1, "hello")]
+        assert n.stats() == {"sent": 1, "retried": 1, "failed": 0, "pending": 0}
+        assert await outbox(repository) == []
+    run_with(store, scenario)
+
+
+def test_permanent_errors_drop_the_message(store):
+    async def scenario(repository):
+        n = Notifier(repository, 100)
+        await n.start(Bot(Forbidden("blocked"), ValueError("unexpected")))
+        n.send(1, "blocked")
+        n.send(1, "odd")
+        n.send(1, "fine")
+        await settle(n)
+        assert n.stats() == {"sent": 1, "retried": 0, "failed": 2, "pending": 0}
+        assert await outbox(repository) == []
+    run_with(store, scenario)
+
+
+def test_undelivered_messages_are_restored_with_their_attempts(store):
+    async def scenario(repository):
+        n = Notifier(repository, 100)
+        await n.start(Bot(*[NetworkError("down")] * MAX_ATTEMPTS))
+        n.send(1, "later")
+        await settle(n)
+        assert await outbox(repository) == [("later", MAX_ATTEMPTS)]
+
+        bot = Bot()
+        restarted = Notifier(repository, 100)
+        await restarted.start(bot)
+        await settle(restarted)
+        assert bot.sent == [(1, "later")]
+        assert await outbox(repository) == []
+    run_with(store, scenario)
+
+
+def test_message_in_flight_survives_a_crash(store):
+    async def scenario(repository):
+        class Hanging:
+            async def send_message(self, **kwargs):
+                await asyncio.Event().wait()
+
+        crashed = Notifier(repository, 100)
+        await crashed.start(Hanging())
+        crashed.send(1, "in flight")
+        await asyncio.sleep(0.05)
+        for task in crashed._drainers.values():
+            task.cancel()  # the process dies without close()
+        assert await outbox(repository) == [("in flight", 0)]
+
+        bot = Bot()
+        restarted = Notifier(repository, 100)
+        await restarted.start(bot)
+        await settle(restarted)
+        assert bot.sent == [(1, "in flight")]
+    run_with(store, scenario)
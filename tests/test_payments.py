@@ -0,0 +1,85 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import payments
+from payments import PaymentVerifier, RpcError, SolanaRpc, received_lamports
+
+RECIPIENT = "Recipient1111111111111111111111111111111111"
+PAID = {"meta": {"err": None, "preBalances": [5, 0], "postBalances": [0, 5]},
+        "transaction": {"message": {"accountKeys": ["Payer", RECIPIENT]}}}
+
+
+def rpc(handler):
+    return SolanaRpc("http://rpc.invalid", transport=httpx.MockTransport(handler))
+
+
+def answer(results):
+    """Handler replying to a batch with ``results[method]`` for each call"""
+    def handler(request):
+        return httpx.Response(200, json=[{"jsonrpc": "2.0", "id": call["id"], "result": results[call["method"]]}
+                                         for call in json.loads(request.content)])
+    return handler
+
+
+class Orders:
+    def __init__(self, *orders):
+        self.orders = list(orders)
+        self.paid = []
+
+    async def get_awaiting_payment(self):
+        return self.orders
+
+    async def mark_order_paid(self, order_id, website_id, signature):
+        self.paid.append(order_id)
+        return SimpleNamespace(id=order_id)
+
+
+def order(order_id=1, sol_amount=0.000000005):
+    return SimpleNamespace(id=order_id, payment_reference=f"ref{order_id}", sol_amount=sol_amount)
+
+
+def test_received_lamports():
+    assert received_lamports(PAID, RECIPIENT) == 5
+    assert received_lamports(PAID, "Someone else") == 0
+    assert received_lamports(None, RECIPIENT) == 0
+    assert received_lamports({"meta": None, "transaction": None}, RECIPIENT) == 0
+    assert received_lamports({"meta": {"err": None}, "transaction": {"message": None}}, RECIPIENT) == 0
+    assert received_lamports({**PAID, "meta": {**PAID["meta"], "err": {"InstructionError": []}}}, RECIPIENT) == 0
+
+
+def test_batch_rejects_a_single_error_object():
+    def handler(request):
+        return httpx.Response(200, json={"jsonrpc": "2.0", "id": None,
+                                         "error": {"code": -32005, "message": "Too many requests"}})
+
+    with pytest.raises(RpcError, match="Too many requests"):
+        asyncio.run(rpc(handler).batch([("getSlot", [])]))
+
+
+def test_poll_pauses_on_an_error_object():
+    def handler(request):
+        return httpx.Response(200, json={"error": {"code": -32005, "message": "Too many requests"}})
+
+    verifier = PaymentVerifier(Orders(order()), rpc(handler), RECIPIENT)
+    assert asyncio.run(verifier.poll()) == []
+    assert verifier._rpc_delay == payments.MIN_BACKOFF
+
+
+def test_poll_defers_a_null_transaction():
+    signatures = [{"signature": "sig", "err": None}]
+    orders = Orders(order())
+    verifier = PaymentVerifier(orders, rpc(answer({"getSignaturesForAddress": signatures,
+                                                    "getTransaction": None})), RECIPIENT)
+    assert asyncio.run(verifier.poll()) == []
+    assert orders.paid == [] and 1 in verifier._next_check and verifier._rpc_delay == 0
+
+
+def test_poll_approves_a_full_payment():
+    orders = Orders(order())
+    verifier = PaymentVerifier(orders, rpc(answer({"getSignaturesForAddress": [{"signature": "sig", "err": None}],
+                                                    "getTransaction": PAID})), RECIPIENT)
+    assert [paid.id for paid in asyncio.run(verifier.poll())] == [1]
@@ -0,0 +1,67 @@
+import asyncio
+
+from database import OrderRepository, init_db
+from persistence import SQLitePersistence, _store
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "orders.db")
+    init_db(path)
+
+    async def scenario():
+        store = OrderRepository(path)
+        await store.start()
+        try:
+            persistence = SQLitePersistence(store, flush_delay=0.01)
+            await persistence.update_user_data(1, {"package": {"key": "basic"}})
+            await persistence.update_user_data(2, {"coin_details": {"text": "x"}})
+            await persistence.update_conversation("checkout", (1, 1), 3)
+            await persistence.flush()
+            # Emptied user_data is deleted rather than stored
+            await persistence.update_user_data(2, {})
+            await persistence.update_conversation("checkout", (5, 5), None)
+            await persistence.flush()
+
+            loaded = SQLitePersistence(store)
+            assert await loaded.get_user_data() == {1: {"package": {"key": "basic"}}}
+            assert await loaded.get_conversations("checkout") == {(1, 1): 3}
+            assert await loaded.get_conversations("other") == {}
+        finally:
+            await store.shutdown()
+    asyncio.run(scenario())
+
+
+class SlowRepository:
+    """Stands in for the group-commit writer with a write that takes a while"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def run_write(self, fn, pending):
+        assert fn is _store
+        await asyncio.sleep(0.05)
+        self.rows.update(pending)
+
+
+def test_updates_marked_during_a_write_are_flushed():
+    async def scenario():
+        repository = SlowRepository()
+        persistence = SQLitePersistence(repository, flush_delay=0.01)
+        await persistence.update_user_data(1, {"a": 1})
+        await asyncio.sleep(0.03)  # first batch is being written
+        await persistence.update_user_data(2, {"b": 2})
+        await asyncio.sleep(0.2)
+        assert ("user", "", "2") in repository.rows
+    asyncio.run(scenario())
+
+
+def test_flush_waits_for_a_write_in_flight():
+    async def scenario():
+        repository = SlowRepository()
+        persistence = SQLitePersistence(repository, flush_delay=0.01)
+        await persistence.update_user_data(1, {"a": 1})
+        await asyncio.sleep(0.03)  # first batch is being written
+        await persistence.update_user_data(2, {"b": 2})
+        await persistence.flush()
+        assert {("user", "", "1"), ("user", "", "2")} <= set(repository.rows)
+    asyncio.run(scenario())
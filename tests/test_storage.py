@@ -0,0 +1,249 @@
+"""Storage contract, run against every backend.
+
+SQLite always runs. Postgres runs when TEST_POSTGRES_URL (or DATABASE_URL)
+points at a server; each test gets its own throwaway schema there.
+"""
+import asyncio
+import csv
+import gzip
+import json
+import os
+import sys
+import uuid
+
+import pytest
+
+import admins
+import database
+import leader
+import notifier
+import persistence
+from database import OrderRepository, init_db
+from lifecycle import APPROVED, CANCELLED, COMPLETED, EXPIRED
+
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL") or os.getenv("DATABASE_URL")
+if POSTGRES_URL and not POSTGRES_URL.startswith(("postgres://", "postgresql://")):
+    POSTGRES_URL = None
+
+DETAILS = "Coin Name: Moon Coin\nTicker: $MOON\nTwitter: https://x.com/mooncoin"
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def open_store(request, tmp_path):
+    """Factory for a store on a fresh database of the requested backend"""
+    if request.param == "sqlite":
+        path = str(tmp_path / "orders.db")
+        init_db(path)
+        return lambda: OrderRepository(path)
+
+    if not POSTGRES_URL:
+        pytest.skip("set TEST_POSTGRES_URL to run the Postgres backend")
+    asyncpg = pytest.importorskip("asyncpg")
+    import pg_store
+
+    schema = f"bot_test_{uuid.uuid4().hex[:12]}"
+
+    async def execute(statement):
+        conn = await asyncpg.connect(POSTGRES_URL)
+        try:
+            await conn.execute(statement)
+        finally:
+            await conn.close()
+
+    asyncio.run(execute(f"CREATE SCHEMA {schema}"))
+    request.addfinalizer(lambda: asyncio.run(execute(f"DROP SCHEMA {schema} CASCADE")))
+    # asyncpg passes unknown DSN parameters on as server settings
+    url = POSTGRES_URL + ("&" if "?" in POSTGRES_URL else "?") + f"search_path={schema}"
+    return lambda: pg_store.PostgresRepository(url)
+
+
+def run(open_store, scenario):
+    async def main():
+        store = open_store()
+        await store.start()
+        try:
+            await scenario(store)
+        finally:
+            await store.shutdown()
+    asyncio.run(main())
+
+
+async def save_orders(store, count):
+    return [await store.save_order(100 + i, "basic", f"coin {i}", 0.5) for i in range(count)]
+
+
+def test_save_and_checkout_dedupe(open_store):
+    async def scenario(store):
+        first = await store.save_order(1, "basic", DETAILS, 0.5, checkout_id="c1")
+        again = await store.save_order(1, "basic", DETAILS, 0.5, checkout_id="c1")
+        other = await store.save_order(1, "basic", DETAILS, 0.5, checkout_id="c2")
+        assert again == first and other != first
+        assert await store.get_checkout_order_id("c1") == first
+        assert await store.get_checkout_order_id("missing") is None
+        order = await store.get_order_by_id(first)
+        assert (order.user_id, order.status) == (1, "pending")
+        assert await store.get_user_id_by_order_id(first) == 1
+    run(open_store, scenario)
+
+
+def test_fresh_reads_see_other_workers_changes(open_store):
+    async def scenario(store):
+        other = open_store()
+        await other.start()
+        try:
+            order_id, = await save_orders(store, 1)
+            assert (await store.get_order_by_id(order_id)).status == "pending"  # now cached
+            await other.transition(order_id, APPROVED, website_id="W")
+            assert (await store.get_order_by_id(order_id)).status == "pending"
+            assert (await store.get_order_by_id(order_id, fresh=True)).status == APPROVED
+            assert (await store.get_order_by_id(order_id)).status == APPROVED
+        finally:
+            await other.shutdown()
+    run(open_store, scenario)
+
+
+def test_guarded_transitions(open_store):
+    async def scenario(store):
+        order_id, = await save_orders(store, 1)
+        order = await store.claim_order(order_id, 7)
+        assert order.claimed_by == 7
+        # Another admin can't act on a claimed order
+        assert await store.transition(order_id, APPROVED, 8, website_id="W") is None
+        results = await asyncio.gather(*(store.transition(order_id, APPROVED, 7, website_id="W") for _ in range(5)))
+        assert sum(result is not None for result in results) == 1
+        assert (await store.complete_order(order_id, "https://site", actor=7)).status == COMPLETED
+        # No way back from a final state
+        assert await store.transition(order_id, APPROVED, 7) is None
+        with pytest.raises(ValueError):
+            await store.transition(order_id, "bogus", 7)
+    run(open_store, scenario)
+
+
+def test_cancelling_an_approved_order_takes_back_its_revenue(open_store):
+    async def scenario(store):
+        approved = await store.save_order(1, "basic", "coin", 1.5)
+        pending = await store.save_order(2, "basic", "coin", 2.0)
+        await store.transition(approved, APPROVED, website_id="W")
+        [(_, _, orders, paid, _, lamports)] = (await store.get_stats())["daily"]
+        assert (orders, paid, lamports) == (2, 1, 1_500_000_000)
+
+        await store.transition(approved, CANCELLED)
+        await store.transition(pending, CANCELLED)
+        [(_, _, orders, paid, _, lamports)] = (await store.get_stats())["daily"]
+        assert (orders, paid, lamports) == (2, 0, 0)
+    run(open_store, scenario)
+
+
+def test_claims_skip_orders_taken_by_others(open_store):
+    async def scenario(store):
+        order_ids = await save_orders(store, 5)
+        claimed = await asyncio.gather(*(store.claim_next_order(900 + admin) for admin in range(4)))
+        claimed_ids = {order.id for order in claimed}
+        assert len(claimed_ids) == 4
+        assert await store.release_order(claimed[0].id, 999) is None
+        assert await store.release_order(claimed[0].id, claimed[0].claimed_by) is not None
+        unclaimed = set(order_ids) - claimed_ids | {claimed[0].id}
+        assert {(await store.claim_next_order(1)).id, (await store.claim_next_order(2)).id} == unclaimed
+        assert await store.claim_next_order(3) is None
+    run(open_store, scenario)
+
+
+def test_paging(open_store):
+    async def scenario(store):
+        await save_orders(store, 5)
+        page, has_prev, has_next = await store.get_pending_orders_page(limit=2)
+        assert len(page) == 2 and not has_prev and has_next
+        page2, has_prev, _ = await store.get_pending_orders_page(page[-1].cursor, "next", 2)
+        assert has_prev and page2[0].id not in {order.id for order in page}
+        back, _, _ = await store.get_pending_orders_page(page2[0].cursor, "prev", 2)
+        assert [order.id for order in back] == [order.id for order in page]
+        assert len([order async for order in store.iter_orders(chunk_size=2)]) == 5
+        assert len(await store.get_all_pending_orders()) == 5
+    run(open_store, scenario)
+
+
+def test_sweeps(open_store, monkeypatch):
+    async def scenario(store):
+        for module in (database, sys.modules.get("pg_store")):
+            if module is not None:
+                monkeypatch.setattr(module, "PAYMENT_WINDOW_HOURS", 0)
+        overdue = await store.save_order(1, "basic", "late", 0.5, payment_reference="ref1")
+        # Without a reference the customer already pressed "Payment Done": only an admin can close it
+        manual = await store.save_order(1, "basic", "awaiting an admin", 0.5)
+        await asyncio.sleep(1.1)  # SQLite timestamps have one-second resolution
+        assert [order.id for order in await store.expire_overdue()] == [overdue]
+        assert (await store.get_order_by_id(overdue)).status == EXPIRED
+        assert (await store.get_order_by_id(manual)).status == "pending"
+        assert await store.expire_overdue() == []
+
+        order_id = await store.save_order(2, "basic", "on time", 0.5)
+        await store.transition(order_id, APPROVED, website_id="W")
+        assert [order.id for order in await store.claim_sla_warnings(10_000)] == [order_id]
+        assert await store.claim_sla_warnings(10_000) == []
+
+        # A new job's cursor starts at the newest order
+        assert await store.take_new_orders("job") == []
+        newest = await store.save_order(3, "basic", "new", 0.5, payment_reference="ref3")
+        assert [order.id for order in await store.take_new_orders("job")] == [newest]
+        assert [order.id for order in await store.get_awaiting_payment()] == [newest]
+    run(open_store, scenario)
+
+
+def test_search_and_duplicates(open_store):
+    async def scenario(store):
+        first = await store.save_order(1, "basic", DETAILS, 0.5)
+        await store.save_order(2, "basic", "Coin Name: Sun Token", 0.5)
+        second = await store.save_order(3, "basic", "Coin Name: moon-coin", 0.5)
+        assert {order.id for order in await store.search_orders("moo")} == {first, second}
+        assert await store.search_orders("!!") == []
+        assert await store.find_duplicates(second) == [first]
+    run(open_store, scenario)
+
+
+def test_ports(open_store):
+    async def scenario(store):
+        await store.run_write(persistence._store, [(("user", "", "5"), {"a": 1}), (("chat", "", "6"), None)])
+        assert await store.run_read(persistence._load, "user") == [("5", {"a": 1})]
+        await store.run_write(persistence._store, [(("user", "", "5"), None)])
+        assert await store.run_read(persistence._load, "user") == []
+
+        row_id = await store.run_write(notifier._add_outbox, 5, "hi", None, 0)
+        await store.run_write(notifier._update_outbox, row_id, 2, "timed out")
+        await store.run_write(notifier._save_outbox, [(6, "left over", None, 1, None, None)])
+        rows = await store.run_write(notifier._load_outbox, 0, 1)
+        assert [tuple(row) for row in rows] == [(row_id, 5, "hi", None, 2), (row_id + 1, 6, "left over", None, 1)]
+        assert await store.run_write(notifier._load_outbox, 1, 2) == []
+        await store.run_write(notifier._delete_outbox, row_id)
+        assert len(await store.run_write(notifier._load_outbox, 0, 1)) == 1
+
+        directory = admins.AdminDirectory(store)
+        directory._owners = {7}
+        await directory.start()
+        await directory.add(8, 7)
+        assert directory.is_owner(7) and directory.is_admin(8)
+        assert await directory.remove(8) and not await directory.remove(7)
+
+        first, second = leader.LeaderLease(store, "jobs", 15), leader.LeaderLease(store, "jobs", 15)
+        assert await first.renew() and not await second.renew()
+        await first.release()
+        assert await second.renew()
+    run(open_store, scenario)
+
+
+def test_export(open_store, tmp_path):
+    async def scenario(store):
+        order_ids = await save_orders(store, 3)
+        await store.claim_order(order_ids[0], 7)
+        await store.transition(order_ids[0], APPROVED, 7, website_id="W")
+
+        path = str(tmp_path / "pending.csv")
+        assert await store.export(path, "csv", status="pending") == 2
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [int(row["id"]) for row in rows] == order_ids[1:]
+
+        path = str(tmp_path / "all.jsonl.gz")
+        assert await store.export(path, "jsonl", compress=True) == 3
+        with gzip.open(path, "rt") as f:
+            assert [json.loads(line)["status"] for line in f] == [APPROVED, "pending", "pending"]
+    run(open_store, scenario)
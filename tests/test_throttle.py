@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+import main
+from cache import TTLCache
+from database import OrderRepository, init_db
+from throttle import SLOW_DOWN, SlidingWindowLimiter, Throttle
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text):
+        self.replies.append(text)
+
+
+def update(user_id, message):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), callback_query=None,
+                           effective_message=message)
+
+
+def test_sliding_window_limiter():
+    clock = Clock()
+    limiter = SlidingWindowLimiter(2, 10, clock)
+    assert limiter.hit(1)
+    clock.now = 5.0
+    assert [limiter.hit(1), limiter.hit(1)] == [True, False]
+    assert limiter.hit(2)
+    clock.now = 9.9
+    assert not limiter.hit(1)
+    clock.now = 10.0
+    assert limiter.hit(1) and not limiter.hit(1)
+    clock.now = 30.0  # past the next sweep
+    limiter.hit(3)
+    assert len(limiter) == 1  # idle users are swept
+
+
+def test_throttle_drops_updates_and_warns_once_per_window():
+    async def scenario():
+        clock = Clock()
+        throttle = Throttle(SlidingWindowLimiter(1, 10, clock), exempt=lambda user_id: user_id == 99)
+        message = Message()
+        await throttle(update(1, message), None)
+        for _ in range(3):
+            with pytest.raises(ApplicationHandlerStop):
+                await throttle(update(1, message), None)
+        assert message.replies == [SLOW_DOWN]
+        for _ in range(3):
+            await throttle(update(99, message), None)
+        clock.now = 10.0
+        await throttle(update(1, message), None)
+        with pytest.raises(ApplicationHandlerStop):
+            await throttle(update(1, message), None)
+        assert message.replies == [SLOW_DOWN, SLOW_DOWN]
+    asyncio.run(scenario())
+
+
+class Query:
+    def __init__(self, checkout_id):
+        self.data = f"payment_done_{checkout_id}"
+        self.from_user = SimpleNamespace(id=7, username="buyer", first_name="Buyer")
+        self.message = Message()
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text=None, **kwargs):
+        self.answers.append(text)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+def test_repeated_payment_done_creates_one_order(tmp_path, monkeypatch):
+    path = str(tmp_path / "orders.db")
+    init_db(path)
+    alerts = []
+    monkeypatch.setattr(main, "recent_checkouts", TTLCache())
+    monkeypatch.setattr(main, "notify_new_order", alerts.append)
+
+    async def scenario():
+        store = OrderRepository(path)
+        monkeypatch.setattr(main, "orders", store)
+        await store.start()
+        try:
+            context = SimpleNamespace(user_data={"package": {"key": "basic"},
+                                                 "coin_details": {"text": "Coin Name: Moon"}})
+            first, second = Query("c1"), Query("c1")
+            await main.payment_confirmation(SimpleNamespace(callback_query=first), context)
+            await main.payment_confirmation(SimpleNamespace(callback_query=second), context)
+            assert first.edits == ["📦 Order #1 Received!\nStatus: Pending Approval\nWe'll notify you once approved!"]
+            assert second.answers == ["📦 Order #1 was already received."] and second.edits == []
+
+            # After a restart the memory is gone but the checkout id is in the database
+            monkeypatch.setattr(main, "recent_checkouts", TTLCache())
+            context.user_data.clear()
+            third = Query("c1")
+            await main.payment_confirmation(SimpleNamespace(callback_query=third), context)
+            assert third.answers == ["📦 Order #1 was already received."]
+            assert await store.get_checkout_order_id("c1") == 1
+            assert len(await store.search_orders("moon")) == 1
+            assert len(alerts) == 1
+        finally:
+            await store.shutdown()
+    asyncio.run(scenario())
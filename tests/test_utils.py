@@ -0,0 +1,35 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import utils
+
+pytest.importorskip("qrcode")
+
+
+class Message:
+    def __init__(self):
+        self.photos = []
+
+    async def reply_photo(self, photo, **kwargs):
+        self.photos.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{len(self.photos)}")])
+
+
+def test_reference_less_qr_reuses_the_uploaded_file_id():
+    utils._qr_file_ids.clear()
+    message = Message()
+    for _ in range(2):
+        asyncio.run(utils.send_payment_qr(message, "NEW", 0.5))
+    assert isinstance(message.photos[0], bytes) and message.photos[1] == "file-1"
+
+
+def test_qr_with_a_reference_bypasses_the_caches():
+    utils._qr_file_ids.clear()
+    utils.render_qr_png.cache_clear()
+    message = Message()
+    for _ in range(2):
+        asyncio.run(utils.send_payment_qr(message, "NEW", 0.5, reference="ref"))
+    assert all(isinstance(photo, bytes) for photo in message.photos)
+    assert not utils._qr_file_ids and utils.render_qr_png.cache_info().currsize == 0
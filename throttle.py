@@ -0,0 +1,80 @@
+# throttle.py
+"""Per-user anti-spam throttling in front of every handler.
+
+``Throttle`` is registered as a TypeHandler in group -1, so it sees each
+update before the conversation and command handlers do. A user may send
+RATE_LIMIT updates in any RATE_LIMIT_WINDOW seconds; anything over that is
+dropped with ApplicationHandlerStop, so hammering /start, re-sending details
+or double-tapping buttons costs neither database writes nor Bot API calls.
+The user is told to slow down once per window, not once per dropped update.
+
+Counts live in memory. In cluster mode the router sends all of a user's
+updates to the same worker (see cluster.py), so each worker's counts are the
+user's real totals and no shared store is needed.
+"""
+import time
+from collections import deque
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, CallbackContext
+
+from config import RATE_LIMIT, RATE_LIMIT_WINDOW
+from metrics import REGISTRY
+
+SLOW_DOWN = "⏳ You're going too fast. Please wait a few seconds and try again."
+
+THROTTLED = REGISTRY.counter("bot_throttled_updates_total", "Updates dropped by the per-user rate limit")
+
+
+class SlidingWindowLimiter:
+    """At most ``limit`` events per ``window`` seconds for each key"""
+
+    def __init__(self, limit=RATE_LIMIT, window=RATE_LIMIT_WINDOW, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self._events = {}  # key -> deque of the last ``limit`` allowed event times
+        self._next_sweep = clock() + window
+
+    def hit(self, key):
+        """Record an event for ``key``; False (and nothing recorded) when it is over the limit"""
+        now = self.clock()
+        if now >= self._next_sweep:
+            self._sweep(now)
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque(maxlen=self.limit)
+        elif len(events) == self.limit and now - events[0] < self.window:
+            return False
+        events.append(now)
+        return True
+
+    def _sweep(self, now):
+        # Forget keys with nothing inside the window so idle users don't pile up
+        self._events = {key: events for key, events in self._events.items() if now - events[-1] < self.window}
+        self._next_sweep = now + self.window
+
+    def __len__(self):
+        return len(self._events)
+
+
+class Throttle:
+    """TypeHandler callback that drops a user's updates once they exceed the limiter"""
+
+    def __init__(self, limiter, exempt=lambda user_id: False):
+        self.limiter = limiter
+        self.exempt = exempt
+        self._warned = SlidingWindowLimiter(1, limiter.window, limiter.clock)
+        self.__name__ = "throttle"
+
+    async def __call__(self, update: Update, context: CallbackContext):
+        user = update.effective_user
+        if user is None or self.exempt(user.id) or self.limiter.hit(user.id):
+            return
+        THROTTLED.inc()
+        if self._warned.hit(user.id):
+            if update.callback_query:
+                await update.callback_query.answer(SLOW_DOWN, show_alert=True)
+            elif update.effective_message:
+                await update.effective_message.reply_text(SLOW_DOWN)
+        raise ApplicationHandlerStop
@@ -1,12 +1,82 @@
-import qrcode
+import asyncio
+from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
+
+from telegram.error import BadRequest
+
 from config import SOLANA_ADDRESS
 
-def generate_payment_qr(order_id, amount):
-    # Generate QR code for Solana payment
-    payment_string = f"solana:{SOLANA_ADDRESS}?amount={amount}&label=Order_{order_id}"
-    qr = qrcode.make(payment_string)
+QR_CACHE_SIZE = 128
+
+# Telegram file_ids of QR codes we've already uploaded, keyed by payload,
+# so repeat payment screens re-send the stored photo instead of the PNG.
+# Only reference-less payloads (manual approval) are cached: with the payment
+# verifier on, each checkout's reference makes its QR unique.
+_qr_file_ids = OrderedDict()
+
+
+def payment_payload(order_id, amount, reference=None):
+    if reference:
+        return f"solana:{SOLANA_ADDRESS}?amount={amount}&reference={reference}&label=Order_{order_id}"
+    return f"solana:{SOLANA_ADDRESS}?amount={amount}&label=Order_{order_id}"
+
+
+def _render_qr_png(payload: str) -> bytes:
+    import qrcode  # with Pillow, the slowest import at startup; paid on first render instead
+
+    qr = qrcode.make(payload)
     bio = BytesIO()
     qr.save(bio, format='PNG')
-    bio.seek(0)
-    return bio
\ No newline at end of file
+    return bio.getvalue()
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr_png(payload: str) -> bytes:
+    """Render a reference-less payload to PNG bytes; cached, as those only vary by amount"""
+    return _render_qr_png(payload)
+
+
+def prewarm_qr(amounts, order_id="NEW"):
+    """Render the reference-less payment QR for each amount before the first customer needs one"""
+    for amount in amounts:
+        render_qr_png(payment_payload(order_id, amount))
+
+
+def generate_payment_qr(order_id, amount):
+    # Generate QR code for Solana payment
+    return BytesIO(render_qr_png(payment_payload(order_id, amount)))
+
+
+def _remember_file_id(payload, message):
+    if message and message.photo:
+        _qr_file_ids[payload] = message.photo[-1].file_id
+        _qr_file_ids.move_to_end(payload)
+        while len(_qr_file_ids) > QR_CACHE_SIZE:
+            _qr_file_ids.popitem(last=False)
+
+
+async def send_payment_qr(message, order_id, amount, reference=None, **kwargs):
+    """Reply to ``message`` with the payment QR, reusing an uploaded file_id when we have one.
+
+    A QR carrying a Solana Pay ``reference`` is unique to its checkout, so it is
+    rendered and uploaded each time without going through either cache.
+    """
+    payload = payment_payload(order_id, amount, reference)
+    if reference:
+        png = await asyncio.get_running_loop().run_in_executor(None, _render_qr_png, payload)
+        return await message.reply_photo(photo=png, **kwargs)
+
+    file_id = _qr_file_ids.get(payload)
+    if file_id:
+        try:
+            return await message.reply_photo(photo=file_id, **kwargs)
+        except BadRequest:
+            # file_ids are per bot; a stale one just means uploading again
+            _qr_file_ids.pop(payload, None)
+
+    # Rendering is CPU-bound, keep it off the event loop on a cache miss
+    png = await asyncio.get_running_loop().run_in_executor(None, render_qr_png, payload)
+    sent = await message.reply_photo(photo=png, **kwargs)
+    _remember_file_id(payload, sent)
+    return sent